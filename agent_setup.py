@@ -1,185 +1,380 @@
 import os
 from pathlib import Path
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 
-from agno.agent import Agent
-from agno.db.in_memory import InMemoryDb
-from agno.models.deepseek import DeepSeek
-from agno.models.openai.like import OpenAILike
-from agno.tools.pandas import PandasTools
-from agno.tools.python import PythonTools
-from agno.tools.reasoning import ReasoningTools
+from config import (
+    LLM_RUN_RETRIES,
+    PROVIDERS,
+    SANDBOX_ENABLED,
+    SESSION_HISTORY_RUNS,
+    SESSION_MAX_HISTORY_TOOL_CALLS,
+)
+from export import export_table
+from large_data import LargeTableInfo, table_var_name
+from llm_pool import llm_pool
+from profiling import get_profile
+from session_store import build_compaction, get_session_db
+from sql_tools import SqlTools
+from schema_context import SchemaTools, build_data_context, df_var_name
+from snapshot import snapshot_dataframes
 
-from config import CHART_DIR, CHART_DIR_ABS, UPLOAD_DIR_ABS, PROVIDERS
+# agno 的 Agent / 模型 / 工具和 plotly.express 导入较慢，创建 Agent 时才导入，
+# 服务启动后由 warmup 在后台预热，不拖慢启动
+if TYPE_CHECKING:
+    from agno.models.base import Model
 
 
-def create_agent(
-    provider_name: str,
-    api_key: str,
-    model_id: str,
-    base_url: str,
-    dataframes: Dict[str, pd.DataFrame],
-) -> Optional[Agent]:
-    if not api_key:
-        return None
+_INSTRUCTIONS_HEAD = [
+    "你是一位专业的数据分析师，请始终用中文回答用户的问题。",
+    "",
+    "## 核心原则：只做用户要求的事",
+    "- 严格按照用户的请求执行，不要自作主张添加额外操作",
+    "- 用户要求删除一列 → 只删除该列，展示结果，结束",
+    "- 用户要求做透视表 → 只生成透视表，展示结果，结束",
+    "- 用户要求合并表 → 只合并，展示结果，结束",
+    "- **绝对不要**在用户没有要求的情况下生成图表、生成报告、导出文件",
+    "- 只有当用户明确提到「可视化/画图/图表/报告/导出」等关键词时，才执行对应操作",
+    "",
+    "你有四类工具可以使用：",
+    "1. **PandasTools**: 仅用于快速查看数据概况（如 describe、head、shape、info）。通过 DataFrame 名称引用数据。",
+    "2. **PythonTools**: 用于所有数据处理、分析计算和可视化。优先使用此工具，因为你可以完全控制代码逻辑。",
+    "3. **SchemaTools**: 当「当前可用的数据」因篇幅省略了部分列或 DataFrame 时，用 `describe_columns` / `list_dataframes` 按需查看完整信息。",
+    "4. **SqlTools**: 用 DuckDB SQL 直接查询 DataFrame（表名即 PandasTools 中的 DataFrame 名称，用双引号引用），适合多表关联（VLOOKUP）、分组聚合、透视等，对大表比 pandas 更快、更省内存。结果只返回预览，需要继续处理时传入 `save_as` 保存为新的 DataFrame（使用新名称，不要覆盖用户上传的表）。",
+    "- 简单查看数据 → PandasTools；多表关联、分组聚合 → SqlTools（数据量大时优先）或 PythonTools；其他操作（清洗、可视化、导出）→ PythonTools",
+    "- 每次 PythonTools 调用只做一件事：先查看数据，再处理数据，再生成图表，分步执行，不要在一次调用中写过长的代码",
+    "",
+    "## 当前可用的数据",
+]
+
+_INSTRUCTIONS_TAIL = [
+    "",
+    "## 数据预检规范",
+    "- 「当前可用的数据」已列出每列的类型、缺失数、唯一值数、取值范围和示例值，直接据此判断数据类型和缺失情况，不要再调用 `df.dtypes`、`df.head()`、`isna().sum()` 重复检查；只有对数据做过修改后才需要重新确认",
+    "- **标识符列保护（极其重要）**：卡号、身份证号、手机号、工号、编号等标识符列必须保持字符串类型，不能参与数值计算。上传的数据中这些列已自动转为字符串（「当前可用的数据」中标注为 [标识符]）；对合并、计算后新得到的标识符列，或类型仍不是字符串的，先转换：`df['列名'] = df['列名'].astype(str).str.split('.').str[0]`。判断依据：列名中包含'号'、'编号'、'ID'、'id'、'证件'、'手机'、'电话'、'卡'等关键词，或列值为超过8位的纯数字",
+    "- 上传时已做类型规整：低基数的文本列为 category 类型，整数列可能是 int8/int16/int32 等窄类型。给 category 列赋新值前先 `.astype(str)`；窄整数列做求和等可能溢出的计算前先 `.astype('int64')`",
+    "- 日期列如果是 object 类型，先用 `pd.to_datetime(df['列名'], errors='coerce')` 转换",
+    "- 数值列如果是 object 类型，先用 `pd.to_numeric(df['列名'], errors='coerce')` 转换，但不要对标识符列执行此操作",
+    "- 注意缺失值：参考「当前可用的数据」中的缺失数，必要时用 dropna() 或 fillna() 处理，并在回答中告知用户缺失情况",
+    "",
+    "## 多表操作规范",
+    "- **操作意图判断**：首先判断用户是要【追加数据（按行拼接，类似Excel把表B贴在表A下面）】还是【匹配数据（按列关联，类似Excel的VLOOKUP）】",
+    "- **追加数据（concat）**：如果是按行拼接，使用 `pd.concat([df_a, df_b], ignore_index=True)`。注意检查列名是否对齐。",
+    "- **匹配数据（merge）**：如果是 VLOOKUP 类的操作，先检查两个 DataFrame 的关联列（列名和数据类型是否一致）",
+    "  - **极度重要：合并基准必须非常明确。**如果两个表的关联列名完全一致，可直接合并；",
+    "  - **如果列名不一致但你猜测它们可能是关联列，绝对不要盲目自作主张进行合并！** 你必须先向用户确认：“这两个表是否通过 X 和 Y 关联？如果是，请确认，我将进行合并。”",
+    "  - 必须等待用户明确给出肯定答复后，再执行合并操作。",
+    "  - 合并使用 `pd.merge(df_a, df_b, left_on='列A', right_on='列B', how='left')` 并在回答中说明合并方式和结果行数",
+    "  - 无论是 concat 还是 merge，操作后务必检查是否产生了意外的重复行（`df.duplicated().sum()`）",
+    "",
+    "## 可视化规范",
+    "- 使用 plotly.express (px) 或 plotly.graph_objects (go) 创建图表",
+    "- 图表保存方式（用于页面内嵌显示）: `import plotly.io as pio; pio.write_json(fig, os.path.join(CHART_DIR, '描述性名称.plotly.json'))`",
+    "- **注意**: 文件名必须以 `.plotly.json` 结尾（不是 `.json`），这样页面才能自动内嵌显示交互式图表",
+    "- 数据点很多的折线图、散点图、直方图和箱线图可直接用完整数据绘制，页面展示时会自动降采样或聚合，无需手动抽样",
+    "- 如果用户要求下载/导出图表，则额外保存一份 HTML: `fig.write_html(os.path.join(CHART_DIR, '描述性名称.html'))`",
+    "- CHART_DIR 变量已预定义，直接使用即可，不要自己定义路径",
+    "- 绝对不要调用 `fig.show()`",
+    "- 确保图表有中文标题和轴标签",
+    "",
+    "## 文件导出规范",
+    "- 当用户需要导出数据时，使用预定义的 `export_table` 函数，不要调用 `df.to_excel` / `df.to_csv`：`result = export_table(df, os.path.join(CHART_DIR, '描述性名称.xlsx'))`，并以 `variable_to_return='result'` 获取导出行数和耗时",
+    "- 按扩展名选择格式：`.xlsx`（Excel）、`.csv`、`.parquet`；多个表导出到同一个 Excel 时传入字典：`export_table({'表名1': df1, '表名2': df2}, path)`",
+    "- `export_table` 会自动把标识符列（卡号、身份证号、手机号等）写为文本，无需手动转换；超出 Excel 行数上限时自动拆分到多个工作表",
+    "- 始终使用 os.path.join(CHART_DIR, '文件名') 构建保存路径",
+    "- 文件保存后页面上会自动出现下载按钮供用户下载",
+    "",
+    "## 报告生成规范",
+    "- 当用户要求生成报告时，创建一个自包含的 HTML 报告文件",
+    "- 报告中使用内嵌的 Plotly 图表（通过 fig.to_html(full_html=False, include_plotlyjs='cdn') 获取图表 HTML 片段）",
+    "- 报告应包含：标题、数据概述、图表可视化、数据表格、文字分析和结论",
+    "- 报告文件名必须为 `数据分析报告.html`",
+    "- 保存方式: `with open(os.path.join(CHART_DIR, '数据分析报告.html'), 'w', encoding='utf-8') as f: f.write(html_content)`",
+    "",
+    "## 回答规范",
+    "- 对于简单的数据操作（删列、改名、筛选、透视、合并等），直接执行并用表格展示结果即可，不需要额外的分析或可视化",
+    "- 只有用户提出分析需求时，才先分析数据再给出结论",
+    "- 只有用户明确要求可视化时，才生成图表",
+    "- 数值结果请给出具体数字",
+    "",
+    "## 客观性规范",
+    "- 所有分析结论必须严格基于数据，不得添加任何没有数据支撑的推测或假设",
+    "- 不要对数据趋势做主观预测，除非用户明确要求",
+    "- 如果数据不足以得出某个结论，请明确说明数据的局限性，而不是猜测",
+    "- 描述数据时使用精确的数值和比例，避免模糊的形容词（如'大幅增长'应改为'增长了15.3%'）",
+    "- 区分'数据显示'和'可能的原因'，对于原因分析必须标注为推测并说明依据",
+    "",
+    "## 错误处理规范",
+    "- 当工具调用返回错误时，你必须分析错误信息，修正参数或换一种方法重试，绝对不要停下来",
+    "- 如果 PandasTools 报错，改用 PythonTools 直接写 pandas 代码实现同样的操作",
+    "- 如果某个方法不可用，尝试等价的替代方法",
+    "- 最多重试 3 次不同的方案，如果仍然失败，向用户说明原因并给出建议",
+]
+
+
+def build_instructions(df_info: str) -> List[str]:
+    """拼接完整指令，只有「当前可用的数据」一节随数据变化。"""
+    return [*_INSTRUCTIONS_HEAD, df_info, *_INSTRUCTIONS_TAIL]
+
+
+def build_model(provider_name: str, api_key: str, model_id: str, base_url: str) -> "Model":
+    """模型对象很轻，HTTP 客户端从连接池中复用。"""
+    from agno.models.deepseek import DeepSeek
+    from agno.models.openai.like import OpenAILike
 
     provider = PROVIDERS[provider_name]
+    # Base URL 设置仅用于 OpenAI Like 供应商
+    if provider.provider_type == "deepseek" or not base_url:
+        base_url = provider.base_url
+    client = llm_pool.get_client(provider_name, base_url, api_key)
 
-    # Build model
     if provider.provider_type == "deepseek":
-        model = DeepSeek(id=model_id, api_key=api_key)
-    else:
-        model = OpenAILike(
-            id=model_id,
-            api_key=api_key,
-            base_url=base_url or provider.base_url,
-            name=provider.name,
-            provider=provider.name,
+        return DeepSeek(id=model_id, api_key=api_key, base_url=base_url, client=client)
+    return OpenAILike(
+        id=model_id,
+        api_key=api_key,
+        base_url=base_url,
+        name=provider.name,
+        provider=provider.name,
+        client=client,
+    )
+
+
+class AgentManager:
+    """管理单个会话的 Agent，在原地增量更新数据和模型。
+
+    上传新数据时只注册新增（或被替换）的 sheet 并重算「当前可用的数据」一节，
+    修改设置时只在模型配置真正变化时替换模型，对话历史始终保留。
+    """
+
+    def __init__(
+        self,
+        provider_name: str,
+        api_key: str,
+        model_id: str,
+        base_url: str,
+        dataframes: Dict[str, pd.DataFrame],
+        chart_dir: str,
+        upload_dir: str,
+        large_tables: Optional[Dict[str, LargeTableInfo]] = None,
+        session_id: str = "app_session",
+        user_id: Optional[str] = None,
+    ):
+        import plotly.express as px
+        import plotly.graph_objects as go
+        from agno.agent import Agent
+        from agno.tools.pandas import PandasTools
+        from agno.tools.python import PythonTools
+        from agno.tools.reasoning import ReasoningTools
+
+        from sandbox_tools import SandboxPythonTools
+
+        self._model_key: Optional[Tuple[str, str, str, str]] = None
+        # sheet 名称 -> 注册时的原始 DataFrame，用于识别重新上传的同名 sheet
+        self._sources: Dict[str, pd.DataFrame] = {}
+        self._df_alias: Optional[pd.DataFrame] = None
+        # PythonTools 变量名 -> PandasTools 中的 DataFrame 名称，用于同步沙箱中修改过的数据
+        self._var_names: Dict[str, str] = {}
+        # 大文件模式的表：数据保留在磁盘，PythonTools 中以 LazyTable 访问
+        self._large_tables: Dict[str, LargeTableInfo] = {}
+
+        # Configure PandasTools
+        self.pandas_tools = PandasTools()
+        self.pandas_tools.dataframes = {}
+
+        # Configure PythonTools with the session's own directories
+        os.makedirs(chart_dir, exist_ok=True)
+
+        safe_globals = {
+            "pd": pd,
+            "np": np,
+            "px": px,
+            "go": go,
+            "Path": Path,
+            "os": os,
+            "export_table": export_table,
+            "__builtins__": __builtins__,
+        }
+        safe_locals = {
+           "CHART_DIR": chart_dir,
+           "UPLOAD_DIR": upload_dir,
+        }
+        # Agent code runs in a sandboxed worker process unless disabled
+        python_tools_cls = SandboxPythonTools if SANDBOX_ENABLED else PythonTools
+        self.python_tools = python_tools_cls(
+            base_dir=Path(chart_dir),
+            safe_globals=safe_globals,
+            safe_locals=safe_locals,
         )
 
-    # Deep copy DataFrames to prevent agent exec() from mutating originals
-    dataframes_copy = {name: df.copy(deep=True) for name, df in dataframes.items()}
-
-    # Configure PandasTools
-    pandas_tools = PandasTools()
-    pandas_tools.dataframes = dataframes_copy
-
-    # Configure PythonTools
-    chart_dir = Path(CHART_DIR)
-    chart_dir.mkdir(exist_ok=True)
-
-    safe_globals = {
-        "pd": pd,
-        "np": np,
-        "px": px,
-        "go": go,
-        "Path": Path,
-        "os": os,
-        "__builtins__": __builtins__,
-    }
-    safe_locals = {
-       "CHART_DIR": CHART_DIR_ABS,
-       "UPLOAD_DIR": UPLOAD_DIR_ABS,
-    }
-    for sheet_name, df in dataframes_copy.items():
-        var_name = f"df_{sheet_name}".replace(" ", "_").replace("-", "_")
-        safe_locals[var_name] = df
-    # Also provide a simple "df" alias when there's only one sheet
-    if len(dataframes_copy) == 1:
-        safe_locals["df"] = list(dataframes_copy.values())[0]
-
-    python_tools = PythonTools(
-        base_dir=chart_dir,
-        safe_globals=safe_globals,
-        safe_locals=safe_locals,
-    )
+        if SANDBOX_ENABLED:
+            self.python_tools.on_frames_changed = self._adopt_frames
 
-    # Build DataFrame info for instructions
-    df_info_lines = []
-    for sheet_name, df in dataframes.items():
-        var_name = f"df_{sheet_name}".replace(" ", "_").replace("-", "_")
-        cols = ", ".join([f"{c}({df[c].dtype})" for c in df.columns])
-        df_info_lines.append(
-            f"  - PandasTools 中的 DataFrame 名称: '{sheet_name}', "
-            f"PythonTools 中的变量名: `{var_name}`, "
-            f"行数: {len(df)}, 列: [{cols}]"
+        self.sql_tools = SqlTools(self.pandas_tools.dataframes, self._large_tables, self._materialize)
+
+        self.agent = Agent(
+            model=build_model(provider_name, api_key, model_id, base_url),
+            tools=[
+                self.pandas_tools,
+                self.python_tools,
+                SchemaTools(self.pandas_tools.dataframes, self._large_tables),
+                self.sql_tools,
+                ReasoningTools(add_instructions=True),
+            ],
+            instructions=build_instructions(build_data_context({})),
+            markdown=True,
+            db=get_session_db(),
+            session_id=session_id,
+            user_id=user_id,
+            add_history_to_context=True,
+            num_history_runs=SESSION_HISTORY_RUNS,
+            max_tool_calls_from_history=SESSION_MAX_HISTORY_TOOL_CALLS,
+            compaction=build_compaction(),
+            retries=LLM_RUN_RETRIES,
+            exponential_backoff=True,
         )
-    df_info = "\n".join(df_info_lines) if df_info_lines else "  暂无数据"
-
-    instructions = [
-        "你是一位专业的数据分析师，请始终用中文回答用户的问题。",
-        "",
-        "## 核心原则：只做用户要求的事",
-        "- 严格按照用户的请求执行，不要自作主张添加额外操作",
-        "- 用户要求删除一列 → 只删除该列，展示结果，结束",
-        "- 用户要求做透视表 → 只生成透视表，展示结果，结束",
-        "- 用户要求合并表 → 只合并，展示结果，结束",
-        "- **绝对不要**在用户没有要求的情况下生成图表、生成报告、导出文件",
-        "- 只有当用户明确提到「可视化/画图/图表/报告/导出」等关键词时，才执行对应操作",
-        "",
-        "你有两类工具可以使用：",
-        "1. **PandasTools**: 仅用于快速查看数据概况（如 describe、head、shape、info）。通过 DataFrame 名称引用数据。",
-        "2. **PythonTools**: 用于所有数据处理、分析计算和可视化。优先使用此工具，因为你可以完全控制代码逻辑。",
-        "- 简单查看数据 → PandasTools；其他所有操作（筛选、聚合、合并、可视化、导出）→ PythonTools",
-        "- 每次 PythonTools 调用只做一件事：先查看数据，再处理数据，再生成图表，分步执行，不要在一次调用中写过长的代码",
-        "",
-        "## 当前可用的数据",
-        df_info,
-        "",
-        "## 数据预检规范",
-        "- 在对任何列做计算之前，先用 `df.dtypes` 和 `df.head()` 确认数据类型",
-        "- **标识符列保护（极其重要）**：卡号、身份证号、手机号、工号、编号等标识符列，不管当前是什么类型，在任何处理之前必须先转为字符串：`df['列名'] = df['列名'].astype(str).str.split('.').str[0]`。判断依据：列名中包含'号'、'编号'、'ID'、'id'、'证件'、'手机'、'电话'、'卡'等关键词，或列值为超过8位的纯数字",
-        "- 日期列如果是 object 类型，先用 `pd.to_datetime(df['列名'], errors='coerce')` 转换",
-        "- 数值列如果是 object 类型，先用 `pd.to_numeric(df['列名'], errors='coerce')` 转换，但不要对标识符列执行此操作",
-        "- 注意检查缺失值：用 `df['列名'].isna().sum()` 查看，必要时用 dropna() 或 fillna() 处理，并在回答中告知用户缺失情况",
-        "",
-        "## 多表操作规范",
-        "- **操作意图判断**：首先判断用户是要【追加数据（按行拼接，类似Excel把表B贴在表A下面）】还是【匹配数据（按列关联，类似Excel的VLOOKUP）】",
-        "- **追加数据（concat）**：如果是按行拼接，使用 `pd.concat([df_a, df_b], ignore_index=True)`。注意检查列名是否对齐。",
-        "- **匹配数据（merge）**：如果是 VLOOKUP 类的操作，先检查两个 DataFrame 的关联列（列名和数据类型是否一致）",
-        "  - **极度重要：合并基准必须非常明确。**如果两个表的关联列名完全一致，可直接合并；",
-        "  - **如果列名不一致但你猜测它们可能是关联列，绝对不要盲目自作主张进行合并！** 你必须先向用户确认：“这两个表是否通过 X 和 Y 关联？如果是，请确认，我将进行合并。”",
-        "  - 必须等待用户明确给出肯定答复后，再执行合并操作。",
-        "  - 合并使用 `pd.merge(df_a, df_b, left_on='列A', right_on='列B', how='left')` 并在回答中说明合并方式和结果行数",
-        "  - 无论是 concat 还是 merge，操作后务必检查是否产生了意外的重复行（`df.duplicated().sum()`）",
-        "",
-        "## 可视化规范",
-        "- 使用 plotly.express (px) 或 plotly.graph_objects (go) 创建图表",
-        "- 图表保存方式（用于页面内嵌显示）: `import plotly.io as pio; pio.write_json(fig, os.path.join(CHART_DIR, '描述性名称.plotly.json'))`",
-        "- **注意**: 文件名必须以 `.plotly.json` 结尾（不是 `.json`），这样页面才能自动内嵌显示交互式图表",
-        "- 如果用户要求下载/导出图表，则额外保存一份 HTML: `fig.write_html(os.path.join(CHART_DIR, '描述性名称.html'))`",
-        "- CHART_DIR 变量已预定义，直接使用即可，不要自己定义路径",
-        "- 绝对不要调用 `fig.show()`",
-        "- 确保图表有中文标题和轴标签",
-        "",
-        "## 文件导出规范",
-        "- 当用户需要导出数据时，使用 `df.to_excel(os.path.join(CHART_DIR, '描述性名称.xlsx'), index=False)` 或 `df.to_csv(os.path.join(CHART_DIR, '描述性名称.csv'), index=False)` 保存文件",
-        "- 始终使用 os.path.join(CHART_DIR, '文件名') 构建保存路径",
-        "- 文件保存后页面上会自动出现下载按钮供用户下载",
-        "- 导出 Excel 前，将所有标识符列（卡号、身份证号、手机号等）转为字符串类型，防止 Excel 用科学计数法显示",
-        "",
-        "## 报告生成规范",
-        "- 当用户要求生成报告时，创建一个自包含的 HTML 报告文件",
-        "- 报告中使用内嵌的 Plotly 图表（通过 fig.to_html(full_html=False, include_plotlyjs='cdn') 获取图表 HTML 片段）",
-        "- 报告应包含：标题、数据概述、图表可视化、数据表格、文字分析和结论",
-        "- 报告文件名必须为 `数据分析报告.html`",
-        "- 保存方式: `with open(os.path.join(CHART_DIR, '数据分析报告.html'), 'w', encoding='utf-8') as f: f.write(html_content)`",
-        "",
-        "## 回答规范",
-        "- 对于简单的数据操作（删列、改名、筛选、透视、合并等），直接执行并用表格展示结果即可，不需要额外的分析或可视化",
-        "- 只有用户提出分析需求时，才先分析数据再给出结论",
-        "- 只有用户明确要求可视化时，才生成图表",
-        "- 数值结果请给出具体数字",
-        "",
-        "## 客观性规范",
-        "- 所有分析结论必须严格基于数据，不得添加任何没有数据支撑的推测或假设",
-        "- 不要对数据趋势做主观预测，除非用户明确要求",
-        "- 如果数据不足以得出某个结论，请明确说明数据的局限性，而不是猜测",
-        "- 描述数据时使用精确的数值和比例，避免模糊的形容词（如'大幅增长'应改为'增长了15.3%'）",
-        "- 区分'数据显示'和'可能的原因'，对于原因分析必须标注为推测并说明依据",
-        "",
-        "## 错误处理规范",
-        "- 当工具调用返回错误时，你必须分析错误信息，修正参数或换一种方法重试，绝对不要停下来",
-        "- 如果 PandasTools 报错，改用 PythonTools 直接写 pandas 代码实现同样的操作",
-        "- 如果某个方法不可用，尝试等价的替代方法",
-        "- 最多重试 3 次不同的方案，如果仍然失败，向用户说明原因并给出建议",
-    ]
-
-    agent = Agent(
-        model=model,
-        tools=[pandas_tools, python_tools, ReasoningTools(add_instructions=True)],
-        instructions=instructions,
-        markdown=True,
-        db=InMemoryDb(),
-        session_id="app_session",
-        add_history_to_context=True,
-        num_history_runs=8,
-        retries=5,
-    )
+        self._model_key = (provider_name, api_key, model_id, base_url)
+        self.add_large_tables(large_tables or {})
+        self.add_dataframes(dataframes)
+
+    @property
+    def provider_name(self) -> str:
+        return self._model_key[0]
 
-    return agent
+    @property
+    def model_id(self) -> str:
+        return self._model_key[2]
+
+    def note_replayed_answer(self, query: str, answer: str):
+        """缓存回放的回答没有经过 Agent，写入附加上下文，使后续追问能看到这段结论。"""
+        self.agent.additional_context = (
+            "## 已从缓存回放的分析结论\n"
+            "以下回答直接回放自缓存，本会话中没有执行对应的工具调用，其中提到的中间变量并不存在，"
+            "需要时请重新计算。\n\n"
+            f"问题：{query}\n\n回答：{answer}"
+        )
+
+    def data_fingerprints(self) -> Dict[str, str]:
+        """当前已注册数据的内容指纹，用于识别数据版本。"""
+        fingerprints = {name: get_profile(df).fingerprint for name, df in self._sources.items()}
+        fingerprints.update({f"large:{name}": info.fingerprint for name, info in self._large_tables.items()})
+        return fingerprints
+
+    def update_model(self, provider_name: str, api_key: str, model_id: str, base_url: str) -> bool:
+        """仅在供应商/模型配置变化时替换模型，返回是否发生了替换。"""
+        model_key = (provider_name, api_key, model_id, base_url)
+        if model_key == self._model_key:
+            return False
+        self.agent.model = build_model(provider_name, api_key, model_id, base_url)
+        if self.agent.compaction:
+            # 对话摘要也改用新模型生成
+            self.agent.compaction.model = self.agent.model
+        self._model_key = model_key
+        return True
+
+    def cancel_run(self, run_id: str):
+        """停止运行（可在任意线程调用）：标记 Agent 运行为已取消，并中断正在执行的代码和 SQL 查询。"""
+        self.agent.cancel_run(run_id)
+        cancel_code = getattr(self.python_tools, "cancel", None)
+        if cancel_code is not None:
+            cancel_code()
+        self.sql_tools.interrupt()
+
+    def add_dataframes(self, dataframes: Dict[str, pd.DataFrame]) -> List[str]:
+        """注册新增或被替换的 DataFrame，返回本次注册的名称列表。"""
+        changed = {
+            name: df for name, df in dataframes.items()
+            if self._sources.get(name) is not df
+        }
+        if not changed:
+            return []
+
+        safe_locals = self.python_tools.safe_locals
+        # Copy-on-write snapshots prevent agent exec() from mutating originals
+        for sheet_name, df_copy in snapshot_dataframes(changed).items():
+            self.pandas_tools.dataframes[sheet_name] = df_copy
+            safe_locals[df_var_name(sheet_name)] = df_copy
+            self._var_names[df_var_name(sheet_name)] = sheet_name
+            self._sources[sheet_name] = changed[sheet_name]
+
+        # Also provide a simple "df" alias when there's only one sheet
+        # (an alias the agent has since reassigned is left alone)
+        if len(self._sources) == 1:
+            self._df_alias = next(iter(self.pandas_tools.dataframes.values()))
+            safe_locals["df"] = self._df_alias
+        elif self._df_alias is not None:
+            if safe_locals.get("df") is self._df_alias:
+                safe_locals.pop("df")
+            self._df_alias = None
+
+        self._refresh_instructions()
+        return list(changed)
+
+    def _materialize(self, name: str, df: pd.DataFrame) -> str:
+        """SqlTools 保存的查询结果，注册到 PandasTools 和 PythonTools，返回 PythonTools 变量名。"""
+        self.pandas_tools.dataframes[name] = df
+        var_name = df_var_name(name)
+        self.python_tools.safe_locals[var_name] = df
+        self._var_names[var_name] = name
+        return var_name
+
+    def _adopt_frames(self, frames: Dict[str, pd.DataFrame]):
+        """沙箱代码修改或重新赋值的 DataFrame 同步到 PandasTools、SqlTools、SchemaTools 和导出按钮。
+
+        df 别名被重新赋值（如 df = df.groupby(...)）不代表替换数据，只有原地修改时
+        才会连同对应的变量一起传回。
+        """
+        adopted = []
+        for var_name, df in frames.items():
+            name = self._var_names.get(var_name)
+            if name is not None:
+                self.pandas_tools.dataframes[name] = df
+                adopted.append(df)
+        if self._df_alias is not None and any(frames.get("df") is df for df in adopted):
+            self._df_alias = frames["df"]
+        if adopted:
+            self._refresh_instructions()
+
+    def current_dataframes(self) -> Dict[str, pd.DataFrame]:
+        """上传的各个 sheet 的当前版本（包含 Agent 代码所做的修改）。"""
+        return {name: self.pandas_tools.dataframes.get(name, df) for name, df in self._sources.items()}
+
+    def add_large_tables(self, large_tables: Dict[str, LargeTableInfo]) -> List[str]:
+        """注册新增或被替换的大表，返回本次注册的名称列表。"""
+        changed = {
+            name: info for name, info in large_tables.items()
+            if self._large_tables.get(name) is not info
+        }
+        if not changed:
+            return []
+        for name, info in changed.items():
+            self.python_tools.safe_locals[table_var_name(name)] = info.table
+            self._large_tables[name] = info
+        self._refresh_instructions()
+        return list(changed)
+
+    def _refresh_instructions(self):
+        data_context = build_data_context(self.current_dataframes(), large_tables=self._large_tables)
+        self.agent.instructions = build_instructions(data_context)
+
+
+def create_agent_manager(
+    provider_name: str,
+    api_key: str,
+    model_id: str,
+    base_url: str,
+    dataframes: Dict[str, pd.DataFrame],
+    chart_dir: str,
+    upload_dir: str,
+    large_tables: Optional[Dict[str, LargeTableInfo]] = None,
+    session_id: str = "app_session",
+    user_id: Optional[str] = None,
+) -> Optional[AgentManager]:
+    if not api_key:
+        return None
+    return AgentManager(
+        provider_name, api_key, model_id, base_url, dataframes, chart_dir, upload_dir, large_tables,
+        session_id=session_id, user_id=user_id,
+    )
@@ -1,20 +1,101 @@
 import asyncio
+import hmac
 import os
-import shutil
-import pandas as pd
+import threading
+import time
+import uuid
+from typing import Optional
 import chainlit as cl
-import json
-import plotly.io as pio
+from chainlit.element import Element
 from chainlit.input_widget import Select, TextInput
-
-from config import PROVIDERS, CHART_DIR_ABS, UPLOAD_DIR_ABS
-from agent_setup import create_agent
+from pydantic.dataclasses import dataclass
+
+from config import (
+    PROVIDERS, ARTIFACT_POLL_INTERVAL, METRICS_PATH, METRICS_TOKEN, PREWARM, SANDBOX_ENABLED, SHOW_RUN_TIMING,
+)
+from warmup import start_prewarm, startup
+from agent_setup import create_agent_manager
+from artifacts import ArtifactTracker
+from charts import load_chart
+from export import export_table
+from dtype_optimize import memory_bytes
+from ingest import ingest_file, ingest_large_file, is_large_file
+from llm_pool import llm_pool
+from sandbox import sandbox_pool
+from scheduler import RunCancelled, RunTicket, SchedulerFull, run_scheduler
+from session_store import prune_stale_sessions, session_id_for
+from settings_store import settings_store
+from streaming import EventChannel, StreamMetrics, TokenBuffer
+from telemetry import RunTrace, add_stage_time, render_prometheus, timed
+from tool_render import render_value, spill_result
+from query_cache import CachedResult, make_key, query_cache
+from quick_analysis import analyze_all, build_narrative_prompt
+from upload_cache import parse_cache
+from workspace import SessionWorkspace, prune_stale_workspaces
 
 
 # Get admin credentials from environment or use default
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin")
 
+
+def _register_metrics_route(path: str, token: str = "", server=None):
+    """在 Chainlit 的 FastAPI 应用上暴露 Prometheus 指标；设置了 token 时校验 Bearer 令牌。"""
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    if server is None:
+        from chainlit.server import app as server
+
+    expected = f"Bearer {token}".encode("utf-8")
+
+    async def metrics(request: Request):
+        if token and not hmac.compare_digest(request.headers.get("authorization", "").encode("utf-8"), expected):
+            return PlainTextResponse("unauthorized", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    server.add_api_route(path, metrics, methods=["GET"], include_in_schema=False)
+    # Chainlit 的前端兜底路由 /{full_path:path} 已先注册，新路由需移到它前面才能匹配
+    server.router.routes.insert(0, server.router.routes.pop())
+
+
+# 指标默认不暴露，设置 METRICS_PATH 后开启
+if METRICS_PATH:
+    _register_metrics_route(METRICS_PATH, METRICS_TOKEN)
+
+
+@cl.on_app_startup
+def on_app_startup():
+    print(f"[启动] 应用就绪 {startup.mark('ready'):.2f}s")
+    # 预热沙箱执行进程，首次执行代码时无需等待 pandas/plotly 导入
+    if SANDBOX_ENABLED:
+        sandbox_pool.warm()
+    threading.Thread(target=prune_stale_sessions, daemon=True).start()
+    # 重量级依赖在服务开始监听后于后台导入，不阻塞启动
+    if PREWARM:
+        from chainlit.config import config
+
+        start_prewarm(config.run.host, config.run.port)
+
+
+@cl.on_app_shutdown
+def on_app_shutdown():
+    sandbox_pool.shutdown()
+    run_scheduler.shutdown()
+    settings_store.close()
+    llm_pool.close()
+
+
+def _agent_session_kwargs() -> dict:
+    """Agent 对话历史按用户 + 对话线程存储，重连或服务重启后可继续同一对话。"""
+    user = cl.user_session.get("user")
+    user_id = user.identifier if user else None
+    return {
+        "session_id": session_id_for(user_id, cl.context.session.thread_id),
+        "user_id": user_id,
+    }
+
+
 @cl.password_auth_callback
 def auth(username, password):
     if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
@@ -22,49 +103,120 @@ def auth(username, password):
     return None
 
 
-async def _run_agent_query(query: str):
+async def _run_agent_query(query: str, cacheable: bool = False, use_cache: bool = True):
     """Reusable helper: run agent query with streaming, nested tool steps, and file scanning.
 
     Agent 在后台线程中以同步模式运行，防止 PythonTools exec() 阻塞事件循环
     导致 WebSocket 超时断连。文件扫描在 finally 中始终执行。
+    Agent 代码通过 CHART_DIR 变量写入会话目录，不修改进程级工作目录，
+    因此不同会话可以并行执行。运行期间新生成的文件会被轮询并立即推送。
+    cacheable 的请求（内容完全由数据决定，如一键分析的解读）会按问题、数据、模型和用户缓存，
+    再次请求时直接回放；自由提问依赖对话历史，不缓存。
+    各阶段耗时记录在 RunTrace 中，结束后计入指标并按需显示耗时明细。
+    运行由调度器限流排队，等待期间显示排队位置；点击停止可取消排队或终止运行。
     """
-    agent = cl.user_session.get("agent", None)
-    if not agent:
+    agent_manager = cl.user_session.get("agent_manager", None)
+    if not agent_manager:
         await cl.Message(content="⚠️ Agent 未就绪，请检查配置和数据文件。").send()
         return
+    agent = agent_manager.agent
+    workspace: SessionWorkspace = cl.user_session.get("workspace")
+    workspace.touch()
+    tracker: ArtifactTracker = cl.user_session.get("artifact_tracker")
+
+    cache_key = None
+    if cacheable:
+        user = cl.user_session.get("user")
+        cache_key = make_key(
+            query,
+            agent_manager.data_fingerprints(),
+            agent_manager.provider_name,
+            agent_manager.model_id,
+            scope=user.identifier if user else cl.context.session.id,
+        )
+    if cache_key and use_cache:
+        cached = await asyncio.to_thread(query_cache.get, cache_key)
+        if cached:
+            await _replay_cached_result(cached)
+            agent_manager.note_replayed_answer(query, cached.answer)
+            return
+    steps = []
+    sent_artifacts = []
 
     ui_message = cl.Message(content="")
     await ui_message.send()
 
-    os.makedirs(CHART_DIR_ABS, exist_ok=True)
-    event_queue = asyncio.Queue()
+    trace = RunTrace(agent_manager.provider_name, agent_manager.model_id)
+    submitted = trace.now()
+
+    async def _show_position(position: int):
+        ui_message.content = f"⏳ 排队中（第 {position} 位），轮到后自动开始分析…"
+        await ui_message.update()
+
+    ticket = await _acquire_run_slot(_show_position)
+    if ticket is None:
+        await ui_message.remove()
+        return
+    if ui_message.content:
+        ui_message.content = ""
+        await ui_message.update()
+
+    run_id = str(uuid.uuid4())
+    ticket.add_cancel_callback(lambda: agent_manager.cancel_run(run_id))
+
+    os.makedirs(workspace.chart_dir, exist_ok=True)
     loop = asyncio.get_running_loop()
+    metrics = StreamMetrics()
+    channel = EventChannel(loop, metrics)
+
+    async def _stream_token(text: str):
+        started = time.perf_counter()
+        await ui_message.stream_token(text)
+        trace.add_time("ws_send", time.perf_counter() - started)
 
-    def _agent_worker():
-        """在独立线程中同步运行 Agent，通过队列传递流式事件。"""
-        saved_cwd = os.getcwd()
+    token_buffer = TokenBuffer(_stream_token, metrics)
+
+    def _agent_worker(submitted: float):
+        """在独立线程中同步运行 Agent，通过有界通道传递流式事件。"""
+        trace.record("queue_wait", trace.now() - submitted, submitted)
         try:
-            os.chdir(CHART_DIR_ABS)
-            print(f"[Agent] 开始执行, CWD={os.getcwd()}, CHART_DIR={CHART_DIR_ABS}")
-            for ev in agent.run(query, stream=True, stream_events=True):
-                loop.call_soon_threadsafe(event_queue.put_nowait, ("event", ev))
+            print(f"[Agent] 开始执行, CHART_DIR={workspace.chart_dir}")
+            for ev in agent.run(query, stream=True, stream_events=True, run_id=run_id):
+                trace.on_event(ev)
+                channel.put(("event", ev))
         except Exception as exc:
             print(f"[Agent] 执行出错: {exc}")
-            loop.call_soon_threadsafe(event_queue.put_nowait, ("error", exc))
+            channel.put(("error", exc))
         finally:
-            os.chdir(saved_cwd)
-            loop.call_soon_threadsafe(event_queue.put_nowait, ("done", None))
+            channel.put(("done", None))
+
+    # 在调度器的线程池中启动 Agent
+    thread_future = loop.run_in_executor(run_scheduler.executor, _agent_worker, submitted)
+
+    # 运行期间轮询产物目录，文件写完即推送
+    stop_watching = asyncio.Event()
 
-    # 在后台线程启动 Agent
-    thread_future = loop.run_in_executor(None, _agent_worker)
+    async def _watch_artifacts():
+        while not stop_watching.is_set():
+            try:
+                await asyncio.wait_for(stop_watching.wait(), timeout=ARTIFACT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                sent_artifacts.extend(await _scan_and_send_files(tracker, settle=True, trace=trace))
+
+    watcher = asyncio.create_task(_watch_artifacts())
 
     # 在主事件循环中消费事件（WebSocket 保持活跃）
     agent_error = None
     try:
         while True:
-            msg_type, data = await event_queue.get()
+            try:
+                msg_type, data = await channel.get(timeout=token_buffer.time_to_flush())
+            except asyncio.TimeoutError:
+                await token_buffer.flush()
+                continue
 
             if msg_type == "done":
+                await token_buffer.flush()
                 break
             elif msg_type == "error":
                 agent_error = data
@@ -77,82 +229,247 @@ async def _run_agent_query(query: str):
                 if event_type in ("RunContent", "RunIntermediateContent", "TeamRunContentEvent", "StepOutputEvent"):
                     content = getattr(data, "content", None)
                     if content:
-                        await ui_message.stream_token(str(content))
+                        await token_buffer.add(str(content))
 
                 # Tool Execution — nested under response message, collapsed
                 elif event_type == "ToolCallCompleted":
+                    # 先发出已缓冲的文本，保持文本与工具步骤的先后顺序
+                    await token_buffer.flush()
                     tool_exec = getattr(data, "tool", None)
                     if tool_exec:
-                        tool_name = getattr(tool_exec, "tool_name", "unknown")
-                        tool_args = str(getattr(tool_exec, "tool_args", ""))
-                        tool_result = str(getattr(tool_exec, "result", ""))[:2000]
-
-                        step = cl.Step(
-                            name=tool_name,
-                            type="tool",
-                            show_input=False,
-                        )
-                        step.input = tool_args
-                        step.output = tool_result
-                        await step.send()
+                        started = time.perf_counter()
+                        steps.append(await _send_tool_step(tool_exec, workspace))
+                        trace.add_time("ws_send", time.perf_counter() - started)
+    except asyncio.CancelledError:
+        # 用户点击停止：终止 Agent 与正在执行的代码，清理完成后继续向上抛出
+        ticket.cancel()
+        raise
     except Exception as e:
         agent_error = e
 
     finally:
+        # 停止消费后关闭通道，避免 Agent 线程阻塞在已满的队列上
+        channel.close()
+
         # 等待后台线程彻底完成（确保所有文件已写入磁盘）
         try:
             await thread_future
         except Exception:
             pass
+        stop_watching.set()
+        await watcher
 
         try:
+            await token_buffer.flush()
             await ui_message.update()
         except Exception:
             pass
 
-        if agent_error:
+        if ticket.cancelled:
+            await cl.Message(content="⏹ 已停止本次分析。").send()
+        elif agent_error:
             await cl.Message(content=f"❌ 分析时出错: {str(agent_error)}").send()
 
-        # 文件扫描始终执行（无论 Agent 是否出错）
-        await _scan_and_send_files()
+        # 最终扫描始终执行（无论 Agent 是否出错），发送剩余的新文件
+        sent_artifacts.extend(await _scan_and_send_files(tracker, trace=trace))
 
+        _release_run_slot(ticket)
 
-async def _scan_and_send_files():
-    """扫描 CHART_DIR_ABS 中生成的文件，发送为 Chainlit 元素。"""
-    if not os.path.exists(CHART_DIR_ABS):
-        return
+        if cache_key and not agent_error and not ticket.cancelled:
+            result = CachedResult(query=query, answer=ui_message.content, steps=steps, artifacts=sent_artifacts)
+            with trace.span("cache_save"):
+                await asyncio.to_thread(query_cache.put, cache_key, result)
+
+        trace.finish("cancelled" if ticket.cancelled else "error" if agent_error else "ok")
+        startup.first_query(trace.total)
+        print(f"[耗时] {trace.summary()}")
+        print(f"[流式输出] {metrics.summary()}")
+        if SHOW_RUN_TIMING:
+            await _send_timing_step(trace)
+
+
+async def _acquire_run_slot(on_position) -> Optional[RunTicket]:
+    """向调度器登记一次运行并等待放行。排队已满或排队中被取消时提示用户并返回 None。"""
+    # 按会话计数：应用只有一个共用的登录账号，按用户计数会让所有会话串行
+    try:
+        ticket = run_scheduler.submit(cl.context.session.id)
+    except SchedulerFull as e:
+        await cl.Message(content=f"⚠️ {e}").send()
+        return None
+
+    active_runs = cl.user_session.get("active_runs")
+    if active_runs is None:
+        active_runs = set()
+        cl.user_session.set("active_runs", active_runs)
+    active_runs.add(ticket)
+    try:
+        await ticket.wait(on_position)
+    except RunCancelled:
+        active_runs.discard(ticket)
+        await cl.Message(content="⏹ 已取消排队中的任务。").send()
+        return None
+    except BaseException:
+        # 等待期间任务被取消（如会话断开），释放排队位置
+        _release_run_slot(ticket)
+        raise
+    return ticket
+
+
+def _release_run_slot(ticket: RunTicket):
+    run_scheduler.release(ticket)
+    active_runs = cl.user_session.get("active_runs")
+    if active_runs:
+        active_runs.discard(ticket)
+
+
+@cl.on_chat_end
+async def on_chat_end():
+    """会话断开：工作目录不再视为存活，过期后由新会话启动时清理。"""
+    workspace: Optional[SessionWorkspace] = cl.user_session.get("workspace")
+    if workspace is not None:
+        workspace.release()
+
+
+@cl.on_stop
+async def on_stop():
+    """停止按钮：取消本会话排队中的任务，终止运行中的 Agent 及其正在执行的代码。"""
+    for ticket in list(cl.user_session.get("active_runs") or ()):
+        ticket.cancel()
+
+
+async def _send_timing_step(trace: RunTrace):
+    """以折叠步骤显示本轮各阶段耗时。"""
+    step = cl.Step(name="耗时明细", type="tool", show_input=False)
+    step.output = trace.to_markdown()
+    await step.send()
+
+
+async def _replay_cached_result(result: CachedResult):
+    """回放缓存的回答、工具步骤和产物，并提供「重新运行」按钮绕过缓存。"""
+    ui_message = cl.Message(
+        content=f"⚡ *以下结果来自缓存（数据与模型未变化）*\n\n{result.answer}",
+        actions=[
+            cl.Action(
+                name="rerun_query",
+                payload={"query": result.query},
+                label="重新运行",
+                tooltip="忽略缓存，重新调用模型分析",
+            ),
+        ],
+    )
+    await ui_message.send()
+    for step in result.steps:
+        await _send_step(step)
+    await _send_artifacts(result.artifacts)
 
+
+async def _send_tool_step(tool_exec, workspace: SessionWorkspace) -> dict:
+    """以有限开销渲染工具调用；结果过长时附上完整结果文件供按需打开。返回步骤记录。"""
+    tool_name = getattr(tool_exec, "tool_name", "unknown")
+    tool_args, _ = render_value(getattr(tool_exec, "tool_args", None))
+    tool_result = getattr(tool_exec, "result", None)
+    output, truncated = render_value(tool_result)
+
+    attachment = None
+    if truncated:
+        attachment = await asyncio.to_thread(spill_result, tool_result, workspace.spill_dir, tool_name)
+        output += "\n\n（结果过长已截断，完整内容见附件）"
+
+    step = {"name": tool_name, "input": tool_args, "output": output, "attachment": attachment}
+    await _send_step(step)
+    return step
+
+
+async def _send_step(step: dict):
     elements = []
+    if step["attachment"]:
+        elements.append(cl.File(name=os.path.basename(step["attachment"]), path=step["attachment"], display="inline"))
+
+    cl_step = cl.Step(
+        name=step["name"],
+        type="tool",
+        show_input=False,
+        elements=elements,
+    )
+    cl_step.input = step["input"]
+    cl_step.output = step["output"]
+    await cl_step.send()
+
+
+@dataclass
+class PlotlyJson(cl.Plotly):
+    """直接发送已序列化的图表 JSON，跳过 cl.Plotly 的 Figure 校验与重新序列化。"""
+
+    def __post_init__(self) -> None:
+        self.mime = "application/json"
+        Element.__post_init__(self)
+
+
+async def _scan_and_send_files(
+    tracker: ArtifactTracker, settle: bool = False, trace: Optional[RunTrace] = None
+) -> list:
+    """扫描会话 CHART_DIR 中新增或修改的文件，发送为 Chainlit 元素，返回已发送的文件。
+
+    已发送过的文件不会重复发送。扫描与发送耗时计入 trace（运行之外直接计入指标）。
+    """
+    if not os.path.exists(tracker.root):
+        return []
+
+    started = time.perf_counter()
     try:
-        all_files = []
-        for root, _dirs, filenames in os.walk(CHART_DIR_ABS):
-            for fname in filenames:
-                all_files.append(os.path.join(root, fname))
+        new_files = await asyncio.to_thread(tracker.scan, settle)
+    except Exception as e:
+        print(f"[文件扫描] 扫描出错: {e}")
+        return []
+    finally:
+        add_stage_time(trace, "artifact_scan", time.perf_counter() - started)
+    if not new_files:
+        return []
+
+    print(f"[文件扫描] CHART_DIR: {tracker.root}, 新增 {len(new_files)} 个文件: {new_files}")
+    started = time.perf_counter()
+    try:
+        return await _send_artifacts(new_files)
+    finally:
+        add_stage_time(trace, "artifact_send", time.perf_counter() - started)
+
 
-        print(f"[文件扫描] CHART_DIR: {CHART_DIR_ABS}, 找到 {len(all_files)} 个文件: {all_files}")
+async def _send_artifacts(file_paths: list) -> list:
+    """把文件发送为 Chainlit 元素，返回可显示（已发送）的文件。
 
-        for file_path in all_files:
+    Plotly JSON 在线程中精简（降采样、类型数组编码）后直接转发，不阻塞事件循环。
+    """
+    elements = []
+    sent = []
+    notes = []
+    try:
+        for file_path in file_paths:
             fname = os.path.basename(file_path)
             ext = os.path.splitext(fname)[1].lower()
 
             if fname.endswith(".plotly.json"):
                 try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        fig = pio.from_json(f.read())
+                    content, chart_notes = await asyncio.to_thread(load_chart, file_path)
                     display_name = fname.replace(".plotly.json", "")
-                    elements.append(cl.Plotly(name=display_name, figure=fig, display="inline"))
+                    elements.append(PlotlyJson(name=display_name, content=content, display="inline"))
+                    notes.extend(chart_notes)
+                    sent.append(file_path)
                     print(f"[文件扫描] Plotly 图表: {fname}")
                 except Exception as e:
                     print(f"[文件扫描] Plotly 解析失败 {fname}: {e}, 改为文件下载")
                     elements.append(cl.File(name=fname, path=file_path, display="inline"))
+                    sent.append(file_path)
             elif ext in [".png", ".jpg", ".jpeg"]:
                 elements.append(cl.Image(name=fname, path=file_path, display="inline"))
+                sent.append(file_path)
                 print(f"[文件扫描] 图片: {fname}")
             elif ext == ".html":
                 elements.append(cl.File(name=fname, path=file_path, display="inline"))
+                sent.append(file_path)
                 print(f"[文件扫描] HTML 文件: {fname}")
             elif ext in [".xlsx", ".xls", ".csv"]:
                 elements.append(cl.File(name=fname, path=file_path, display="inline"))
+                sent.append(file_path)
                 print(f"[文件扫描] 数据文件: {fname}")
             elif ext == ".py":
                 pass  # 跳过 PythonTools 生成的 .py 脚本文件
@@ -164,30 +481,36 @@ async def _scan_and_send_files():
 
     if elements:
         print(f"[文件扫描] 发送 {len(elements)} 个元素")
+        content = "📊 生成的文件和图表："
+        if notes:
+            content += "\n\n" + "\n".join(f"- *{note}*" for note in notes)
         await cl.Message(
-            content="📊 生成的文件和图表：",
+            content=content,
             elements=elements
         ).send()
     else:
-        print("[文件扫描] 没有找到可显示的文件")
-
+        print("[文件扫描] 没有新的可显示文件")
+    return sent
 
 
 @cl.on_chat_start
 async def on_chat_start():
-    # 仅在真正的新会话时清空临时目录（非重连）
+    # 每个会话使用独立的临时目录，仅在真正的新会话时清空（非重连）
     # 重连时 user_session 可能已有数据，此时不应清空
+    workspace = SessionWorkspace.for_session(cl.context.session.id)
     existing_dataframes = cl.user_session.get("dataframes", None)
     if existing_dataframes is None:
-        # 全新会话，安全清空临时目录
-        for d in (CHART_DIR_ABS, UPLOAD_DIR_ABS):
-            if os.path.exists(d):
-                shutil.rmtree(d, ignore_errors=True)
-            os.makedirs(d, exist_ok=True)
+        # 全新会话，清空本会话目录，并清理已结束会话遗留的过期目录
+        workspace.reset()
+        workspace.touch()
+        await asyncio.to_thread(prune_stale_workspaces)
     else:
         # 重连场景，仅确保目录存在
-        for d in (CHART_DIR_ABS, UPLOAD_DIR_ABS):
-            os.makedirs(d, exist_ok=True)
+        workspace.ensure()
+        workspace.touch()
+    cl.user_session.set("workspace", workspace)
+    if existing_dataframes is None or not cl.user_session.get("artifact_tracker"):
+        cl.user_session.set("artifact_tracker", ArtifactTracker(workspace.chart_dir))
 
     # Setup ChatSettings to replace the Streamlit sidebar
     provider_options = list(PROVIDERS.keys())
@@ -201,11 +524,9 @@ async def on_chat_start():
     # Load user preferences if available
     user = cl.user_session.get("user")
     user_settings = {}
-    if user and os.path.exists("user_settings.json"):
+    if user:
         try:
-            with open("user_settings.json", "r", encoding="utf-8") as f:
-                all_settings = json.load(f)
-                user_settings = all_settings.get(user.identifier, {})
+            user_settings = await settings_store.get(user.identifier)
         except Exception as e:
             print(f"Error loading user settings: {e}")
 
@@ -247,7 +568,8 @@ async def on_chat_start():
     # Store settings
     cl.user_session.set("settings", settings)
     cl.user_session.set("dataframes", {})
-    cl.user_session.set("agent", None)
+    cl.user_session.set("large_tables", {})
+    cl.user_session.set("agent_manager", None)
 
     # 根据 API Key 状态显示不同的欢迎信息
     api_key = settings.get("api_key", "")
@@ -271,15 +593,7 @@ async def on_settings_update(settings):
     user = cl.user_session.get("user")
     if user:
         try:
-            all_settings = {}
-            if os.path.exists("user_settings.json"):
-                with open("user_settings.json", "r", encoding="utf-8") as f:
-                    all_settings = json.load(f)
-
-            all_settings[user.identifier] = settings
-
-            with open("user_settings.json", "w", encoding="utf-8") as f:
-                json.dump(all_settings, f, ensure_ascii=False, indent=4)
+            await settings_store.set(user.identifier, settings)
         except Exception as e:
             print(f"Error saving user settings: {e}")
 
@@ -291,25 +605,41 @@ async def on_settings_update(settings):
     if not current_model or current_model not in provider.models:
          settings["model_id"] = provider.default_model
 
-    # Initialize or recreate the agent if API key is provided and data is available
+    # Initialize the agent, or only swap its model so conversation history survives
     api_key = settings["api_key"]
     dataframes = cl.user_session.get("dataframes", {})
+    large_tables = cl.user_session.get("large_tables", {})
+    agent_manager = cl.user_session.get("agent_manager", None)
 
     if api_key:
         try:
-            agent = create_agent(
-                provider_name=provider_name,
-                api_key=api_key,
-                model_id=settings["model_id"],
-                base_url=settings["base_url"],
-                dataframes=dataframes,
-            )
-            cl.user_session.set("agent", agent)
+            if agent_manager:
+                agent_manager.update_model(
+                    provider_name=provider_name,
+                    api_key=api_key,
+                    model_id=settings["model_id"],
+                    base_url=settings["base_url"],
+                )
+            else:
+                workspace: SessionWorkspace = cl.user_session.get("workspace")
+                with timed("create_agent"):
+                    agent_manager = create_agent_manager(
+                        provider_name=provider_name,
+                        api_key=api_key,
+                        model_id=settings["model_id"],
+                        base_url=settings["base_url"],
+                        dataframes=dataframes,
+                        chart_dir=workspace.chart_dir,
+                        upload_dir=workspace.upload_dir,
+                        large_tables=large_tables,
+                        **_agent_session_kwargs(),
+                    )
+                cl.user_session.set("agent_manager", agent_manager)
             await cl.Message(content=f"已更新配置，当前供应商为 **{provider_name}**，模型为 **{settings['model_id']}**。").send()
         except Exception as e:
             await cl.Message(content=f"❌ 创建 Agent 失败：{str(e)}").send()
     else:
-         cl.user_session.set("agent", None)
+         cl.user_session.set("agent_manager", None)
          await cl.Message(content="⚠️ 请在设置中配置 API Key。").send()
 
 
@@ -317,18 +647,204 @@ async def on_settings_update(settings):
 
 @cl.action_callback("one_click_analyze")
 async def on_one_click_analyze(action: cl.Action):
+    """统计量和图表由内置分析引擎确定性地计算，LLM 只负责撰写结论。"""
     dataframes = cl.user_session.get("dataframes", {})
-    df_names = ", ".join(dataframes.keys())
-    query = f"请对以下数据进行全面分析，包括数据概览、描述统计、异常值检测，并生成可视化图表：{df_names}"
-    await _run_agent_query(query)
+    if not dataframes and cl.user_session.get("large_tables"):
+        await cl.Message(content="⚠️ 大文件模式的数据表不参与一键分析，请直接提问，Agent 会按需查询。").send()
+        return
+    if not cl.user_session.get("agent_manager", None) or not dataframes:
+        await cl.Message(content="⚠️ Agent 未就绪，请检查配置和数据文件。").send()
+        return
+    workspace: SessionWorkspace = cl.user_session.get("workspace")
+    tracker: ArtifactTracker = cl.user_session.get("artifact_tracker")
+
+    async with cl.Step(name="一键分析：计算统计量与图表", type="tool") as step:
+        async def _show_position(position: int):
+            step.output = f"⏳ 排队中（第 {position} 位）…"
+            await step.update()
+
+        # 统计计算同样占用 CPU，与 Agent 运行共用调度名额
+        ticket = await _acquire_run_slot(_show_position)
+        if ticket is None:
+            step.output = "已取消"
+            return
+        try:
+            reports = await analyze_all(dataframes, workspace.chart_dir)
+        finally:
+            _release_run_slot(ticket)
+        chart_count = sum(len(report.charts) for report in reports)
+        step.output = f"已完成 {len(reports)} 个数据表的概览、描述统计和异常值检测，生成 {chart_count} 张图表"
+
+    await _scan_and_send_files(tracker)
+    await _run_agent_query(build_narrative_prompt(reports), cacheable=True)
 
 
 @cl.action_callback("export_results")
 async def on_export_results(action: cl.Action):
+    """由导出服务直接流式写出 Excel，不经过 LLM；导出期间在步骤中显示进度。
+
+    大文件模式的表由 DuckDB 直接导出为 CSV。
+    """
     dataframes = cl.user_session.get("dataframes", {})
-    df_names = ", ".join(dataframes.keys())
-    query = f"请将以下数据导出为 Excel 文件：{df_names}"
-    await _run_agent_query(query)
+    large_tables = cl.user_session.get("large_tables", {})
+    if not dataframes and not large_tables:
+        await cl.Message(content="⚠️ 暂无可导出的数据，请先上传数据文件。").send()
+        return
+    agent_manager = cl.user_session.get("agent_manager", None)
+    if agent_manager is not None and dataframes:
+        # 导出 Agent 代码修改后的当前数据
+        dataframes = {**dataframes, **agent_manager.current_dataframes()}
+    workspace: SessionWorkspace = cl.user_session.get("workspace")
+    tracker: ArtifactTracker = cl.user_session.get("artifact_tracker")
+    path = os.path.join(workspace.chart_dir, "导出数据.xlsx")
+    progress = {"written": 0, "total": sum(len(df) for df in dataframes.values())}
+
+    def _on_progress(written: int, total: int):
+        progress["written"], progress["total"] = written, total
+
+    async with cl.Step(name="导出数据", type="tool") as step:
+        summaries = []
+        try:
+            if dataframes:
+                task = asyncio.create_task(asyncio.to_thread(export_table, dict(dataframes), path, _on_progress))
+                while not task.done():
+                    await asyncio.wait({task}, timeout=1.0)
+                    if not task.done():
+                        step.output = f"已写入 {progress['written']:,} / {progress['total']:,} 行"
+                        await step.update()
+                summaries.append(task.result().summary())
+            for name, info in large_tables.items():
+                step.output = f"正在导出大表 {name}（{info.table.rows:,} 行）…"
+                await step.update()
+                started = time.perf_counter()
+                csv_path = os.path.join(workspace.chart_dir, f"{name}.csv")
+                await asyncio.to_thread(info.table.export, csv_path)
+                summaries.append(
+                    f"已导出 {info.table.rows:,} 行到 {os.path.basename(csv_path)}，"
+                    f"用时 {time.perf_counter() - started:.1f} 秒"
+                )
+        except Exception as e:
+            print(f"[导出] 导出失败: {e}")
+            step.output = "\n".join(summaries + [f"导出失败: {e}"])
+            step.is_error = True
+            return
+        step.output = "\n".join(summaries)
+
+    print(f"[导出] {'; '.join(summaries)}")
+    await _scan_and_send_files(tracker)
+
+
+SPREADSHEET_MIMES = [
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.ms-excel",
+    "text/csv",
+]
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def _memory_note(current: int, original: Optional[int]) -> str:
+    """上传摘要中的内存占用说明，类型规整节省了内存时给出前后对比。"""
+    if not original or original <= current:
+        return f"内存 {_format_bytes(current)}"
+    return (
+        f"内存 {_format_bytes(original)} → {_format_bytes(current)}"
+        f"（节省 {_format_bytes(original - current)}，{original / current:.1f}×）"
+    )
+
+
+async def _ingest_upload(element, dataframes: dict, large_tables: dict, upload_dir: str) -> dict:
+    """解析单个上传文件，每个 sheet 就绪后立即展示其预览和摘要。
+
+    超过阈值的 CSV 进入大文件模式：转存为 Parquet，只加载样本用于预览。
+    """
+    safe_filename = os.path.basename(element.name)
+    summary_lines = [f"**{safe_filename}** 加载中…\n"]
+    summary_msg = cl.Message(content="\n".join(summary_lines))
+    await summary_msg.send()
+
+    uploaded_dfs = {}
+    started = time.perf_counter()
+    try:
+        async with cl.Step(name=f"解析 {safe_filename}", type="tool") as step:
+            if is_large_file(element.path, safe_filename):
+                step.output = "文件较大，正在转换为 Parquet（数据保留在磁盘，不整体加载到内存）…"
+                await step.update()
+                table_name, info = await ingest_large_file(element.path, safe_filename, upload_dir)
+                large_tables[table_name] = info
+                await cl.Dataframe(
+                    name=f"{table_name} Preview",
+                    data=info.sample.head(5),
+                    display="inline"
+                ).send(for_id=summary_msg.id)
+                summary_lines.append(
+                    f"> **{table_name}** — {info.table.rows:,} 行 x {len(info.table.columns)} 列"
+                    f"（大文件模式，{info.source_bytes / 1024 / 1024:,.0f} MB，数据保留在磁盘）"
+                )
+                step.output = f"已转换为 Parquet：{info.table.rows:,} 行"
+            else:
+                async for df_name, df_data, from_cache, original_bytes in ingest_file(
+                    element.path, safe_filename, upload_dir
+                ):
+                    dataframes[df_name] = df_data
+                    uploaded_dfs[df_name] = df_data
+
+                    step.output = f"已解析 {len(uploaded_dfs)} 个工作表，最新：{df_name}"
+                    await step.update()
+
+                    # 预览元素单独发送，避免 message.update() 重复发送已有元素
+                    await cl.Dataframe(
+                        name=f"{df_name} Preview",
+                        data=df_data.head(5),
+                        display="inline"
+                    ).send(for_id=summary_msg.id)
+                    rows, cols = df_data.shape
+                    cache_note = "（缓存）" if from_cache else ""
+                    summary_lines.append(
+                        f"> **{df_name}** — {rows:,} 行 x {cols} 列{cache_note}，"
+                        f"{_memory_note(memory_bytes(df_data), original_bytes)}"
+                    )
+                    summary_msg.content = "\n".join(summary_lines)
+                    await summary_msg.update()
+    except Exception:
+        await summary_msg.remove()
+        raise
+    finally:
+        add_stage_time(None, "upload_parse", time.perf_counter() - started)
+
+    # Action buttons for quick operations
+    summary_lines[0] = f"**{safe_filename}** 加载成功\n"
+    if parse_cache.enabled:
+        summary_lines.append(f"\n解析缓存：命中 {parse_cache.hits} 次 / 未命中 {parse_cache.misses} 次")
+    summary_msg.content = "\n".join(summary_lines)
+    summary_msg.actions = [
+        cl.Action(
+            name="one_click_analyze",
+            payload={"action": "analyze"},
+            label="一键分析",
+            tooltip="对上传的数据进行全面分析并生成可视化图表",
+        ),
+        cl.Action(
+            name="export_results",
+            payload={"action": "export"},
+            label="导出结果",
+            tooltip="将数据导出为 Excel 文件",
+        ),
+    ]
+    await summary_msg.update()
+    return uploaded_dfs
+
+
+@cl.action_callback("rerun_query")
+async def on_rerun_query(action: cl.Action):
+    # 只有可缓存的请求才会被回放，重新运行后刷新缓存
+    await _run_agent_query(action.payload["query"], cacheable=True, use_cache=False)
 
 
 @cl.on_message
@@ -340,89 +856,45 @@ async def on_message(message: cl.Message):
     base_url = settings.get("base_url", "")
 
     dataframes = cl.user_session.get("dataframes", {})
-    agent = cl.user_session.get("agent", None)
+    large_tables = cl.user_session.get("large_tables", {})
+    agent_manager = cl.user_session.get("agent_manager", None)
+    workspace: SessionWorkspace = cl.user_session.get("workspace")
+    workspace.touch()
 
-    # Process file uploads
+    # Process file uploads (attachments are parsed concurrently off the event loop)
     if message.elements:
-        for element in message.elements:
-            if element.mime in [
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                "application/vnd.ms-excel",
-                "text/csv",
-            ]:
-                try:
-                    # Copy uploaded file to the fixed upload directory
-                    safe_filename = os.path.basename(element.name)
-                    save_path = os.path.join(UPLOAD_DIR_ABS, safe_filename)
-                    shutil.copy2(element.path, save_path)
-
-                    ext = os.path.splitext(safe_filename)[1].lower()
-
-                    uploaded_dfs = {}
-                    if ext in [".xlsx", ".xls"]:
-                        sheets = pd.read_excel(save_path, sheet_name=None)
-                        for sheet_name, df in sheets.items():
-                            df_key = f"{os.path.splitext(safe_filename)[0]}_{sheet_name}"
-                            dataframes[df_key] = df
-                            uploaded_dfs[df_key] = df
-                    elif ext == ".csv":
-                        df = pd.read_csv(save_path)
-                        df_key = os.path.splitext(safe_filename)[0]
-                        dataframes[df_key] = df
-                        uploaded_dfs[df_key] = df
-
-                    cl.user_session.set("dataframes", dataframes)
-
-                    # Merged upload message: single message with all sheet summaries
-                    summary_lines = [f"**{safe_filename}** 加载成功\n"]
-                    preview_elements = []
-                    for df_name, df_data in uploaded_dfs.items():
-                        rows, cols = df_data.shape
-                        summary_lines.append(f"> **{df_name}** — {rows:,} 行 x {cols} 列")
-                        preview_elements.append(
-                            cl.Dataframe(
-                                name=f"{df_name} Preview",
-                                data=df_data.head(5),
-                                display="inline"
-                            )
-                        )
-
-                    # Action buttons for quick operations
-                    actions = [
-                        cl.Action(
-                            name="one_click_analyze",
-                            payload={"action": "analyze"},
-                            label="一键分析",
-                            tooltip="对上传的数据进行全面分析并生成可视化图表",
-                        ),
-                        cl.Action(
-                            name="export_results",
-                            payload={"action": "export"},
-                            label="导出结果",
-                            tooltip="将数据导出为 Excel 文件",
-                        ),
-                    ]
-
-                    await cl.Message(
-                        content="\n".join(summary_lines),
-                        elements=preview_elements,
-                        actions=actions,
-                    ).send()
-
-                except Exception as e:
-                    await cl.Message(content=f"❌ 读取文件 {element.name} 失败：{str(e)}").send()
-
-        # Re-create agent if new data loaded and API key exists
-        if api_key and dataframes:
+        spreadsheets = [element for element in message.elements if element.mime in SPREADSHEET_MIMES]
+        results = await asyncio.gather(
+            *(_ingest_upload(element, dataframes, large_tables, workspace.upload_dir) for element in spreadsheets),
+            return_exceptions=True,
+        )
+        for element, result in zip(spreadsheets, results):
+            if isinstance(result, Exception):
+                await cl.Message(content=f"❌ 读取文件 {element.name} 失败：{str(result)}").send()
+        cl.user_session.set("dataframes", dataframes)
+        cl.user_session.set("large_tables", large_tables)
+
+        # Register new data with the existing agent (or create one) if API key exists
+        if api_key and (dataframes or large_tables):
             try:
-                agent = create_agent(
-                    provider_name=provider_name,
-                    api_key=api_key,
-                    model_id=model_id,
-                    base_url=base_url,
-                    dataframes=dataframes,
-                )
-                cl.user_session.set("agent", agent)
+                if agent_manager:
+                    with timed("update_agent"):
+                        agent_manager.add_large_tables(large_tables)
+                        agent_manager.add_dataframes(dataframes)
+                else:
+                    with timed("create_agent"):
+                        agent_manager = create_agent_manager(
+                            provider_name=provider_name,
+                            api_key=api_key,
+                            model_id=model_id,
+                            base_url=base_url,
+                            dataframes=dataframes,
+                            chart_dir=workspace.chart_dir,
+                            upload_dir=workspace.upload_dir,
+                            large_tables=large_tables,
+                            **_agent_session_kwargs(),
+                        )
+                    cl.user_session.set("agent_manager", agent_manager)
             except Exception as e:
                 await cl.Message(content=f"❌ 创建 Agent 失败：{str(e)}").send()
 
@@ -430,10 +902,10 @@ async def on_message(message: cl.Message):
     if not message.content.strip() and message.elements:
         return  # Only files uploaded, no text prompt
 
-    if not agent:
+    if not agent_manager:
         if not api_key:
             await cl.Message(content="⚠️ 请先在设置中配置 API Key。").send()
-        elif not dataframes:
+        elif not dataframes and not large_tables:
             await cl.Message(content="⚠️ 请先上传 Excel 或 CSV 文件作为分析数据。").send()
         else:
             await cl.Message(content="⚠️ Agent 未就绪，请检查配置和数据文件。").send()
@@ -0,0 +1,43 @@
+"""产物跟踪：记录会话 CHART_DIR 中已发送文件的 (mtime, size)，只返回新增或修改过的文件。"""
+import os
+from typing import Dict, List, Tuple
+
+Signature = Tuple[int, int]
+
+
+class ArtifactTracker:
+    def __init__(self, root: str):
+        self.root = root
+        self._sent: Dict[str, Signature] = {}
+        self._pending: Dict[str, Signature] = {}
+
+    def _snapshot(self) -> Dict[str, Signature]:
+        files = {}
+        for dirpath, _dirs, filenames in os.walk(self.root):
+            for fname in filenames:
+                path = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # 文件在扫描过程中被删除
+                files[path] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def scan(self, settle: bool = False) -> List[str]:
+        """返回自上次扫描以来新增或修改的文件，并将其标记为已发送。
+
+        settle=True 用于 Agent 运行期间的轮询：文件只有在连续两次扫描中
+        (mtime, size) 不变时才返回，避免发送尚未写完的文件。
+        """
+        current = self._snapshot()
+        changed = {path: sig for path, sig in current.items() if self._sent.get(path) != sig}
+        if settle:
+            ready = [path for path, sig in changed.items() if self._pending.get(path) == sig]
+            self._pending = changed
+        else:
+            ready = list(changed)
+            self._pending = {}
+
+        for path in ready:
+            self._sent[path] = current[path]
+        return sorted(ready)
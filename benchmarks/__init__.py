@@ -0,0 +1,4 @@
+"""离线基准测试：在模拟 LLM 上测量上传解析、Agent 创建、产物发送和端到端并发会话的性能。
+
+运行方式见 benchmarks/run.py。
+"""
@@ -0,0 +1,163 @@
+"""模拟 LLM：本地 OpenAI 兼容接口，按固定脚本返回工具调用和回答，供离线基准测试使用。
+
+脚本：
+- chart：用户提问后先调用 run_python_code 在 CHART_DIR 中生成一张 Plotly 图表，
+  收到工具结果后流式返回一段文字回答（覆盖工具执行与产物推送路径）；
+- text：直接流式返回文字回答。
+
+首 token 延迟和每个数据块的间隔可配置，用于模拟真实供应商的响应时间。
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+CHART_CODE = (
+    "import os\n"
+    "import plotly.express as px\n"
+    "fig = px.bar(x=['A', 'B', 'C'], y=[3, 1, 2], title='基准测试图表')\n"
+    "fig.write_json(os.path.join(CHART_DIR, '{name}.plotly.json'))\n"
+    "result = 'saved'\n"
+)
+ANSWER = "根据数据计算结果，各地区销售额分布较为均衡，华东地区略高。" * 4
+
+
+class MockLLM:
+    def __init__(
+        self,
+        script: str = "chart",
+        first_token_ms: float = 50,
+        chunk_ms: float = 5,
+        chunks: int = 16,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.script = script
+        self.first_token = first_token_ms / 1000
+        self.chunk_interval = chunk_ms / 1000
+        self.chunks = chunks
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLM":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockLLM":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_id(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return next(self._ids)
+
+    def _reply(self, messages: list) -> dict:
+        """返回 {"content": str} 或 {"tool_call": (name, arguments)}。"""
+        last = messages[-1] if messages else {}
+        if self.script == "chart" and last.get("role") == "user":
+            name = f"bench_chart_{self._next_id()}"
+            return {"tool_call": ("run_python_code", {"code": CHART_CODE.format(name=name), "variable_to_return": "result"})}
+        self._next_id()
+        return {"content": ANSWER}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                reply = mock._reply(body.get("messages", []))
+                prompt_tokens = sum(len(str(m.get("content") or "")) for m in body.get("messages", [])) // 2
+                time.sleep(mock.first_token)
+                if body.get("stream"):
+                    self._stream(reply, prompt_tokens)
+                else:
+                    self._complete(reply, prompt_tokens)
+
+            def _complete(self, reply: dict, prompt_tokens: int):
+                message = {"role": "assistant", "content": reply.get("content")}
+                finish = "stop"
+                if "tool_call" in reply:
+                    name, arguments = reply["tool_call"]
+                    message["tool_calls"] = [_tool_call(name, arguments)]
+                    finish = "tool_calls"
+                payload = _chunk(None, finish, usage=_usage(prompt_tokens, 20))
+                payload.update(object="chat.completion", choices=[{"index": 0, "message": message, "finish_reason": finish}])
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, reply: dict, prompt_tokens: int):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                if "tool_call" in reply:
+                    name, arguments = reply["tool_call"]
+                    call = dict(_tool_call(name, arguments), index=0)
+                    self._send(_chunk({"role": "assistant", "tool_calls": [call]}))
+                    finish, completion_tokens = "tool_calls", 40
+                else:
+                    text = reply["content"]
+                    size = -(-len(text) // mock.chunks)
+                    for i in range(0, len(text), size):
+                        self._send(_chunk({"role": "assistant", "content": text[i:i + size]}))
+                        time.sleep(mock.chunk_interval)
+                    finish, completion_tokens = "stop", len(text)
+                self._send(_chunk({}, finish))
+                self._send(_chunk(None, None, usage=_usage(prompt_tokens, completion_tokens)))
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def _send(self, payload: dict):
+                self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
+
+
+def _tool_call(name: str, arguments: dict) -> dict:
+    return {
+        "id": f"call_{time.monotonic_ns()}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)},
+    }
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _chunk(delta: Optional[dict], finish_reason: Optional[str] = None, usage: Optional[dict] = None) -> dict:
+    payload = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": "mock"}
+    payload["choices"] = [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    if usage:
+        payload["usage"] = usage
+    return payload
@@ -0,0 +1,479 @@
+"""基准测试入口：离线运行（模拟 LLM），结果保存为 JSON，可与历史结果对比发现性能回退。
+
+    python -m benchmarks.run                      # 全部测试
+    python -m benchmarks.run --quick              # 小规模数据，快速验证
+    python -m benchmarks.run --suites ingest,e2e  # 只运行部分测试
+    python -m benchmarks.run --baseline benchmarks/results/旧结果.json
+
+测试项：
+- ingest：不同行数的合成 CSV / xlsx 首次解析（冷）与命中解析缓存（热）耗时；
+- agent：create_agent_manager 的耗时、峰值与常驻内存随 DataFrame 总大小的变化，以及增量注册新表的耗时；
+- artifacts：_scan_and_send_files 的耗时随产物数量的变化，以及无新文件时的轮询开销；
+- e2e：多个并发会话经由 Chainlit 回调完成「上传 → 提问（工具调用 + 图表）」的延迟与吞吐；
+- startup：全新进程中导入 app 的耗时，以及不预热 / 后台预热完成后第一次「上传 → 提问」的延迟
+  （首次 = 打开对话并配置模型、上传、提问；关闭沙箱，代码在主进程中执行，以便测量主进程的导入与首次绘图开销）。
+
+所有缓存、会话库和工作目录都放在临时目录中，不影响本地运行数据。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+from benchmarks.mock_llm import MockLLM
+from benchmarks.synthetic import make_dataframe, write_csv, write_xlsx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+FULL = {
+    "ingest_rows": [10_000, 100_000, 500_000],
+    "agent_rows": [10_000, 100_000, 1_000_000],
+    "artifact_counts": [1, 10, 50, 200],
+    "sessions": [1, 4, 16],
+    "queries_per_session": 3,
+}
+QUICK = {
+    "ingest_rows": [1_000, 20_000],
+    "agent_rows": [1_000, 50_000],
+    "artifact_counts": [1, 20],
+    "sessions": [1, 4],
+    "queries_per_session": 2,
+}
+SUITES = ("ingest", "agent", "artifacts", "e2e", "startup")
+
+
+def _prepare_env(workdir: str):
+    """在导入项目模块前把缓存、数据库和会话目录指向临时目录，并关闭与测量无关的功能。"""
+    os.environ["PARSE_CACHE_DIR"] = os.path.join(workdir, "parse_cache")
+    os.environ["QUERY_CACHE_DIR"] = os.path.join(workdir, "query_cache")
+    os.environ["SESSION_DB_URL"] = "sqlite:///" + os.path.join(workdir, "sessions.db")
+    os.environ["SETTINGS_DB_PATH"] = os.path.join(workdir, "user_settings.db")
+    os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"] = ""
+    os.environ.setdefault("SHOW_RUN_TIMING", "0")
+
+
+def _median(values) -> float:
+    return round(statistics.median(values), 6)
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 6)
+
+
+# --- ingest ---
+
+async def _ingest_once(path: str, upload_dir: str) -> int:
+    from ingest import ingest_file
+
+    rows = 0
+    async for _name, df, _from_cache, _original in ingest_file(path, os.path.basename(path), upload_dir):
+        rows += len(df)
+    return rows
+
+
+async def bench_ingest(params: dict, repeat: int, workdir: str) -> list:
+    from config import PARSE_CACHE_DIR
+
+    data_dir = os.path.join(workdir, "ingest")
+    upload_dir = os.path.join(data_dir, "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    # 先解析一个小文件，排除进程池启动时间
+    await _ingest_once(write_csv(make_dataframe(10), os.path.join(data_dir, "warmup.csv")), upload_dir)
+
+    results = []
+    for rows in params["ingest_rows"]:
+        df = make_dataframe(rows)
+        for fmt in ("csv", "xlsx"):
+            path = os.path.join(data_dir, f"data_{rows}.{fmt}")
+            started = time.perf_counter()
+            if fmt == "csv":
+                write_csv(df, path)
+            else:
+                write_xlsx(df, path, sheets=2)
+            print(f"[基准] 生成 {os.path.basename(path)} 用时 {time.perf_counter() - started:.1f}s")
+
+            cold, warm = [], []
+            for _ in range(repeat):
+                shutil.rmtree(PARSE_CACHE_DIR, ignore_errors=True)
+                started = time.perf_counter()
+                await _ingest_once(path, upload_dir)
+                cold.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                await _ingest_once(path, upload_dir)
+                warm.append(time.perf_counter() - started)
+            results.append({
+                "suite": "ingest",
+                "case": f"{fmt}-{rows}",
+                "rows": rows,
+                "file_bytes": os.path.getsize(path),
+                "cold_seconds": _median(cold),
+                "warm_seconds": _median(warm),
+                "cold_rows_per_sec": round(rows / statistics.median(cold)),
+            })
+            print(f"[基准] ingest {results[-1]}")
+    return results
+
+
+# --- agent ---
+
+def bench_agent(params: dict, repeat: int, workdir: str, base_url: str) -> list:
+    from agent_setup import create_agent_manager
+    from dtype_optimize import memory_bytes, optimize_dtypes
+
+    chart_dir = os.path.join(workdir, "agent", "charts")
+    upload_dir = os.path.join(workdir, "agent", "uploads")
+    os.makedirs(chart_dir, exist_ok=True)
+    os.makedirs(upload_dir, exist_ok=True)
+
+    def _create(frames: dict):
+        return create_agent_manager(
+            "Kimi", "sk-bench", "moonshot-v1-8k", base_url, frames, chart_dir, upload_dir,
+            session_id="bench-agent",
+        )
+
+    # 先创建一次，排除模块首次导入和模型客户端创建的时间
+    _create({"warmup": make_dataframe(10)})
+
+    results = []
+    for rows in params["agent_rows"]:
+        df, _ = optimize_dtypes(make_dataframe(rows))
+        extra, _ = optimize_dtypes(make_dataframe(max(rows // 10, 10), seed=1))
+        frame_bytes = memory_bytes(df)
+
+        create, update = [], []
+        for _ in range(repeat):
+            # 每次使用新的 DataFrame 对象，避免命中按对象缓存的数据画像
+            manager = None
+            frames = {"订单_Sheet1": df.copy(deep=False)}
+            started = time.perf_counter()
+            manager = _create(frames)
+            create.append(time.perf_counter() - started)
+            frames["订单_Sheet2"] = extra.copy(deep=False)
+            started = time.perf_counter()
+            manager.add_dataframes(frames)
+            update.append(time.perf_counter() - started)
+        del manager
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        manager = _create({"订单_Sheet1": df.copy(deep=False)})
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del manager
+
+        results.append({
+            "suite": "agent",
+            "case": f"rows-{rows}",
+            "rows": rows,
+            "frame_bytes": frame_bytes,
+            "create_seconds": _median(create),
+            "add_dataframe_seconds": _median(update),
+            "create_peak_bytes": peak - baseline,
+            "create_retained_bytes": retained - baseline,
+        })
+        print(f"[基准] agent {results[-1]}")
+    return results
+
+
+# --- artifacts ---
+
+def _write_artifacts(chart_dir: str, count: int, templates: dict):
+    kinds = list(templates)
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        with open(os.path.join(chart_dir, f"artifact_{i:04d}{kind}"), "wb") as f:
+            f.write(templates[kind])
+
+
+async def bench_artifacts(params: dict, repeat: int, workdir: str) -> list:
+    import chainlit as cl
+    import plotly.express as px
+    from chainlit.context import init_http_context
+
+    import app
+    from artifacts import ArtifactTracker
+
+    fig = px.scatter(x=list(range(2000)), y=[i % 97 for i in range(2000)])
+    templates = {
+        ".plotly.json": fig.to_json().encode("utf-8"),
+        ".png": b"\x89PNG\r\n\x1a\n" + b"\x00" * 20_000,
+        ".csv": make_dataframe(500).to_csv(index=False).encode("utf-8"),
+    }
+
+    context = init_http_context(user=cl.User(identifier="bench-artifacts"))
+    results = []
+    for count in params["artifact_counts"]:
+        send, idle = [], []
+        for run in range(repeat):
+            chart_dir = os.path.join(workdir, "artifacts", f"{count}_{run}")
+            os.makedirs(chart_dir)
+            _write_artifacts(chart_dir, count, templates)
+            tracker = ArtifactTracker(chart_dir)
+            started = time.perf_counter()
+            sent = await app._scan_and_send_files(tracker)
+            send.append(time.perf_counter() - started)
+            assert len(sent) == count, f"expected {count} artifacts, sent {len(sent)}"
+            started = time.perf_counter()
+            await app._scan_and_send_files(tracker, settle=True)
+            idle.append(time.perf_counter() - started)
+        results.append({
+            "suite": "artifacts",
+            "case": f"files-{count}",
+            "files": count,
+            "send_seconds": _median(send),
+            "per_file_ms": round(statistics.median(send) / count * 1000, 3),
+            "idle_scan_seconds": _median(idle),
+        })
+        print(f"[基准] artifacts {results[-1]}")
+    await context.session.delete()
+    return results
+
+
+# --- e2e ---
+
+class _Upload:
+    """on_message 中附件元素所需的最小接口。"""
+
+    def __init__(self, path: str, mime: str):
+        self.name = os.path.basename(path)
+        self.path = path
+        self.mime = mime
+
+
+async def _run_session(tag: str, queries: int, csv_path: str, base_url: str) -> dict:
+    """一个完整会话：打开对话 → 配置模型 → 上传 CSV → 连续提问。每个会话在独立的 Chainlit 上下文中运行。"""
+    import chainlit as cl
+    from chainlit.context import init_http_context
+
+    import app
+
+    init_http_context(user=cl.User(identifier=f"bench-user-{tag}"))
+    try:
+        started = time.perf_counter()
+        await app.on_chat_start()
+        await app.on_settings_update({
+            "provider": "Kimi", "model_id": "moonshot-v1-8k", "api_key": "sk-bench", "base_url": base_url,
+        })
+        setup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await app.on_message(cl.Message(content="", elements=[_Upload(csv_path, "text/csv")]))
+        upload = time.perf_counter() - started
+        if not cl.user_session.get("agent_manager"):
+            raise RuntimeError(f"session {tag}: agent was not created")
+
+        latencies = []
+        for q in range(queries):
+            started = time.perf_counter()
+            # 每个问题不同，避免命中查询结果缓存
+            await app.on_message(cl.Message(content=f"会话 {tag} 第 {q} 个问题：按地区汇总销售额并画图"))
+            latencies.append(time.perf_counter() - started)
+    finally:
+        workspace = cl.user_session.get("workspace")
+        if workspace:
+            shutil.rmtree(workspace.chart_dir, ignore_errors=True)
+            shutil.rmtree(workspace.upload_dir, ignore_errors=True)
+        # 删除 Chainlit 为会话创建的 .files 目录
+        await cl.context.session.delete()
+    return {"setup": setup, "upload": upload, "latencies": latencies}
+
+
+async def bench_e2e(params: dict, workdir: str, mock: MockLLM) -> list:
+    from config import SANDBOX_ENABLED
+    from sandbox import sandbox_pool
+
+    if SANDBOX_ENABLED:
+        await asyncio.to_thread(sandbox_pool.warm)
+    csv_path = write_csv(make_dataframe(20_000), os.path.join(workdir, "e2e.csv"))
+    queries = params["queries_per_session"]
+
+    results = []
+    for sessions in params["sessions"]:
+        requests_before = mock.requests
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(_run_session(f"{sessions}-{i}", queries, csv_path, mock.base_url) for i in range(sessions))
+        )
+        wall = time.perf_counter() - started
+        latencies = [latency for outcome in outcomes for latency in outcome["latencies"]]
+        results.append({
+            "suite": "e2e",
+            "case": f"sessions-{sessions}",
+            "sessions": sessions,
+            "queries": len(latencies),
+            "llm_requests": mock.requests - requests_before,
+            "wall_seconds": round(wall, 6),
+            "queries_per_sec": round(len(latencies) / wall, 3),
+            "query_p50_seconds": _percentile(latencies, 50),
+            "query_p95_seconds": _percentile(latencies, 95),
+            "upload_p50_seconds": _percentile([o["upload"] for o in outcomes], 50),
+        })
+        print(f"[基准] e2e {results[-1]}")
+    return results
+
+
+# --- startup ---
+
+def bench_startup(repeat: int, workdir: str, base_url: str) -> list:
+    csv_path = write_csv(make_dataframe(20_000), os.path.join(workdir, "startup.csv"))
+    env = dict(os.environ, SANDBOX_ENABLED="0", PYTHONPATH=ROOT)
+    results = []
+    for case in ("lazy", "prewarm"):
+        command = [sys.executable, "-m", "benchmarks.startup_probe", "--csv", csv_path, "--base-url", base_url]
+        if case == "prewarm":
+            command.append("--prewarm")
+        runs = []
+        for _ in range(repeat):
+            completed = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, timeout=600)
+            if completed.returncode != 0:
+                raise RuntimeError(f"startup probe failed:\n{completed.stderr[-2000:]}")
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        record = {"suite": "startup", "case": case}
+        for key in runs[0]:
+            if runs[0][key] is not None:
+                record[key] = _median([r[key] for r in runs])
+        results.append(record)
+        print(f"[基准] startup {record}")
+    return results
+
+
+# --- 结果 ---
+
+def _git_revision() -> dict:
+    def _git(*args) -> str:
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=30
+            ).stdout.strip()
+        except Exception:
+            return ""
+
+    return {"commit": _git("rev-parse", "--short", "HEAD"), "dirty": bool(_git("status", "--porcelain", "-uno"))}
+
+
+# 低于该耗时（秒）的指标波动主要来自计时噪声，不参与回退判断
+MIN_COMPARE_SECONDS = 0.005
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """按 (suite, case) 对比耗时类指标，返回变慢超过 threshold 倍的条目说明。"""
+    previous = {(r["suite"], r["case"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for record in current["results"]:
+        old = previous.get((record["suite"], record["case"]))
+        if not old:
+            continue
+        for key, value in record.items():
+            if not key.endswith("seconds") or not old.get(key):
+                continue
+            ratio = value / old[key]
+            regressed = ratio > threshold and max(value, old[key]) >= MIN_COMPARE_SECONDS
+            line = f"{record['suite']}/{record['case']} {key}: {old[key]:.4f}s → {value:.4f}s ({ratio:.2f}×)"
+            print(("⚠️ " if regressed else "   ") + line)
+            if regressed:
+                regressions.append(line)
+    return regressions
+
+
+async def _run(args, params: dict, workdir: str) -> list:
+    results = []
+    with MockLLM(script="chart", first_token_ms=args.first_token_ms) as mock:
+        if "ingest" in args.suites:
+            results += await bench_ingest(params, args.repeat, workdir)
+        if "agent" in args.suites:
+            results += await asyncio.to_thread(bench_agent, params, args.repeat, workdir, mock.base_url)
+        if "artifacts" in args.suites:
+            results += await bench_artifacts(params, args.repeat, workdir)
+        if "e2e" in args.suites:
+            results += await bench_e2e(params, workdir, mock)
+        if "startup" in args.suites:
+            results += await asyncio.to_thread(bench_startup, args.repeat, workdir, mock.base_url)
+    return results
+
+
+def _shutdown():
+    from ingest import get_pool
+    from llm_pool import llm_pool
+    from sandbox import sandbox_pool
+
+    sandbox_pool.shutdown()
+    get_pool().shutdown(cancel_futures=True)
+    llm_pool.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="数据分析 Agent 离线基准测试")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"逗号分隔，可选 {', '.join(SUITES)}")
+    parser.add_argument("--quick", action="store_true", help="使用小规模数据快速运行")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例重复次数，取中位数")
+    parser.add_argument("--first-token-ms", type=float, default=50, help="模拟 LLM 的首 token 延迟（毫秒）")
+    parser.add_argument("--output", help="结果 JSON 路径，默认 benchmarks/results/<时间>-<commit>.json")
+    parser.add_argument("--baseline", help="与之对比的历史结果 JSON")
+    parser.add_argument("--threshold", type=float, default=1.2, help="耗时超过基线的倍数视为回退")
+    args = parser.parse_args(argv)
+    args.suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"未知测试项: {', '.join(sorted(unknown))}")
+    params = QUICK if args.quick else FULL
+
+    # HTTP 上下文中 ChatSettings 不需要发送到前端，Chainlit 不等待该协程
+    warnings.filterwarnings("ignore", message="coroutine 'BaseChainlitEmitter", category=RuntimeWarning)
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    _prepare_env(workdir)
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(_run(args, params, workdir))
+    finally:
+        _shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    revision = _git_revision()
+    report = {
+        "meta": {
+            **revision,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "repeat": args.repeat,
+            "first_token_ms": args.first_token_ms,
+            "total_seconds": round(time.perf_counter() - started, 3),
+        },
+        "params": params,
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{revision['commit'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[基准] 结果已保存到 {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"[基准] {len(regressions)} 项耗时超过基线 {args.threshold}×")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""冷启动探针：在全新进程中测量导入 app 的耗时和第一次「上传 → 提问」的延迟，由 run.py 的 startup 测试项调用。
+
+    python -m benchmarks.startup_probe --csv 数据.csv --base-url http://127.0.0.1:端口/v1 [--prewarm]
+
+--prewarm 时先同步完成 warmup.prewarm()，模拟用户在后台预热结束后才到达。
+结果以 JSON 输出在标准输出的最后一行。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import warnings
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", required=True)
+    parser.add_argument("--base-url", required=True)
+    parser.add_argument("--prewarm", action="store_true")
+    args = parser.parse_args(argv)
+    warnings.filterwarnings("ignore", message="coroutine 'BaseChainlitEmitter", category=RuntimeWarning)
+
+    # 与 chainlit run 一致：框架先于应用导入，不计入应用导入耗时
+    import chainlit.server  # noqa: F401
+
+    started = time.perf_counter()
+    import app  # noqa: F401
+
+    import_seconds = time.perf_counter() - started
+
+    prewarm_seconds = None
+    if args.prewarm:
+        from warmup import prewarm
+
+        prewarm_seconds = prewarm()
+
+    from benchmarks.run import _run_session, _shutdown
+
+    try:
+        # 问题中带上进程号，避免命中上一次运行写入的查询结果缓存
+        outcome = asyncio.run(_run_session(f"startup-{os.getpid()}", 1, args.csv, args.base_url))
+    finally:
+        _shutdown()
+    print(json.dumps({
+        "import_seconds": round(import_seconds, 6),
+        "prewarm_seconds": prewarm_seconds and round(prewarm_seconds, 6),
+        "first_setup_seconds": round(outcome["setup"], 6),
+        "first_upload_seconds": round(outcome["upload"], 6),
+        "first_query_seconds": round(outcome["latencies"][0], 6),
+        "first_total_seconds": round(outcome["setup"] + outcome["upload"] + outcome["latencies"][0], 6),
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""合成测试数据：固定随机种子，生成与真实业务表相近的混合类型数据（标识符、日期、分类、金额）。"""
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["华东", "华南", "华北", "西南", "西北", "东北"]
+PRODUCTS = [f"商品{i:03d}" for i in range(200)]
+
+
+def make_dataframe(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "订单编号": np.arange(rows, dtype=np.int64) + 202400000000,
+        "客户ID": rng.integers(10**9, 10**10, rows),
+        "下单日期": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+        "地区": rng.choice(CATEGORIES, rows),
+        "商品": rng.choice(PRODUCTS, rows),
+        "数量": rng.integers(1, 50, rows),
+        "单价": rng.integers(100, 100000, rows) / 100,
+        "折扣": rng.choice([1.0, 0.95, 0.9, 0.8], rows),
+        "销售额": rng.normal(5000, 1500, rows).round(2),
+        "备注": np.where(rng.random(rows) < 0.1, "加急", ""),
+    })
+
+
+def write_csv(df: pd.DataFrame, path: str) -> str:
+    df.to_csv(path, index=False, encoding="utf-8")
+    return path
+
+
+def write_xlsx(df: pd.DataFrame, path: str, sheets: int = 1) -> str:
+    """按行均分为多个 sheet 写出，用于测量多 sheet 并行解析。"""
+    chunk = -(-len(df) // sheets)
+    with pd.ExcelWriter(path, engine="xlsxwriter", engine_kwargs={"options": {"constant_memory": True}}) as writer:
+        for i in range(sheets):
+            df.iloc[i * chunk:(i + 1) * chunk].to_excel(writer, sheet_name=f"Sheet{i + 1}", index=False)
+    return path
@@ -0,0 +1,513 @@
+"""图表载荷：发送前精简 Agent 生成的 Plotly 图表，直接转发 JSON 而不重建 Figure 对象。
+
+- 折线点数超过 CHART_LINE_MAX_POINTS 时用 LTTB（Largest-Triangle-Three-Buckets）降采样，保留形状和极值；
+- 散点超过 CHART_WEBGL_POINTS 时改用 WebGL（scattergl）渲染，超过 CHART_SCATTER_MAX_POINTS 时
+  按二维分箱聚合为计数热力图（坐标非数值时改为等距抽样）；
+- 直方图、箱线图、小提琴图同样携带全部原始数据，超过 CHART_RAW_MAX_POINTS 时：直方图在服务端分箱
+  改为柱状图（支持 count / sum / avg 和 histnorm，日期坐标和累计直方图保持原样），箱线图改为预先计算的
+  四分位数和须（离群点不再逐个显示），小提琴图随机抽样（分布形状近似保留）；
+- 较长的数值数组编码为 plotly.js 类型数组（base64 + dtype），整数在无损前提下缩小位宽。
+
+只处理 JSON 字典，不经过 plotly 的 Figure 校验与重新序列化；无需改动的小图表原样转发。
+"""
+import base64
+import importlib.util
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    CHART_BINS,
+    CHART_LINE_MAX_POINTS,
+    CHART_RAW_MAX_POINTS,
+    CHART_SCATTER_MAX_POINTS,
+    CHART_WEBGL_POINTS,
+)
+
+_HAS_ORJSON = importlib.util.find_spec("orjson") is not None
+if _HAS_ORJSON:
+    import orjson
+
+# 小于该大小的图表文件不做处理直接转发
+PASSTHROUGH_BYTES = 256 * 1024
+# 短于该长度的数组保持为 JSON 列表
+TYPED_ARRAY_MIN_LENGTH = 256
+
+_DTYPES = {
+    "i1": np.int8, "u1": np.uint8, "i2": np.int16, "u2": np.uint16,
+    "i4": np.int32, "u4": np.uint32, "f4": np.float32, "f8": np.float64,
+}
+_DTYPE_CODES = {np.dtype(v): k for k, v in _DTYPES.items()}
+_INT_CODES = ("i1", "u1", "i2", "u2", "i4", "u4")
+# 与 plotly.py 一致：这些键下的数组不编码为类型数组
+_SKIP_KEYS = {"geojson", "layer", "layers", "range"}
+# 与数据点一一对应、降采样时需要同步筛选的属性
+_POINT_KEYS = ("x", "y", "text", "hovertext", "customdata", "ids")
+_MARKER_POINT_KEYS = ("color", "size", "symbol", "opacity")
+# 聚合后不再与数据点对应、需要去掉的属性
+_RAW_POINT_KEYS = ("text", "hovertext", "customdata", "ids", "selectedpoints")
+_HISTFUNCS = ("count", "sum", "avg")
+
+
+def _loads(raw: bytes):
+    return orjson.loads(raw) if _HAS_ORJSON else json.loads(raw)
+
+
+def _dumps(obj) -> str:
+    if _HAS_ORJSON:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_array(value) -> Optional[np.ndarray]:
+    """把列表或类型数组（{"dtype", "bdata"}）转为 numpy 数组；不是数组时返回 None。"""
+    if isinstance(value, dict) and "bdata" in value and value.get("dtype") in _DTYPES:
+        arr = np.frombuffer(base64.b64decode(value["bdata"]), dtype=_DTYPES[value["dtype"]])
+        shape = value.get("shape")
+        if shape:
+            dims = [int(s) for s in str(shape).split(",")] if not isinstance(shape, list) else shape
+            arr = arr.reshape(dims)
+        return arr
+    if isinstance(value, list):
+        try:
+            return np.asarray(value)
+        except ValueError:
+            # 长度不一的嵌套列表
+            return np.asarray(value, dtype=object)
+    return None
+
+
+def _numeric(arr: np.ndarray) -> bool:
+    return arr.dtype.kind in "iuf"
+
+
+def encode_array(arr: np.ndarray):
+    """把数值数组编码为类型数组（整数无损缩小位宽），其他数组（文本、日期）转为 JSON 列表。"""
+    if not _numeric(arr) or arr.size < TYPED_ARRAY_MIN_LENGTH:
+        if arr.dtype.kind == "f":
+            # NaN 在 JSON 中写为 null
+            return np.where(np.isnan(arr), None, arr).tolist()
+        return arr.tolist()
+    if arr.dtype.kind in "iu":
+        lo, hi = arr.min(), arr.max()
+        for code in _INT_CODES:
+            info = np.iinfo(_DTYPES[code])
+            if info.min <= lo and hi <= info.max:
+                arr = arr.astype(_DTYPES[code])
+                break
+        else:
+            # 超出 32 位的整数 plotly.js 不支持，转为浮点
+            arr = arr.astype(np.float64)
+    elif np.dtype(arr.dtype) not in _DTYPE_CODES:
+        arr = arr.astype(np.float64)
+    spec = {
+        "dtype": _DTYPE_CODES[np.dtype(arr.dtype)],
+        "bdata": base64.b64encode(np.ascontiguousarray(arr).tobytes()).decode("ascii"),
+    }
+    if arr.ndim > 1:
+        spec["shape"] = ",".join(str(s) for s in arr.shape)
+    return spec
+
+
+def _encode_tree(obj, key: str = ""):
+    """递归把较长的数值列表编码为类型数组，返回新的对象。"""
+    if key in _SKIP_KEYS:
+        return obj
+    if isinstance(obj, dict):
+        if "bdata" in obj:
+            return obj
+        return {k: _encode_tree(v, k) for k, v in obj.items()}
+    if isinstance(obj, list):
+        if len(obj) >= TYPED_ARRAY_MIN_LENGTH and isinstance(obj[0], (int, float)) and not isinstance(obj[0], bool):
+            arr = decode_array(obj)
+            if arr is not None and _numeric(arr):
+                return encode_array(arr)
+        return [_encode_tree(v) for v in obj]
+    return obj
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标（含首尾点）。"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        # 下一个桶的平均点
+        avg_x = x[end:next_end].mean() if next_end > end else x[n - 1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[n - 1]
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def _axis_values(arr: Optional[np.ndarray], n: int) -> np.ndarray:
+    """用于计算的坐标：数值原样，日期转为时间戳，其他（分类、缺失）用序号。"""
+    if arr is None:
+        return np.arange(n, dtype=np.float64)
+    if _numeric(arr):
+        return arr
+    try:
+        return pd.to_datetime(arr, format="ISO8601").asi8.astype(np.float64)
+    except (ValueError, TypeError, OverflowError):
+        return np.arange(n, dtype=np.float64)
+
+
+def _take_points(trace: dict, index: np.ndarray, n: int):
+    """按下标筛选与数据点一一对应的属性；未给出 x 时按 x0 / dx 补上原坐标。"""
+    if trace.get("x") is None:
+        x0, dx = trace.get("x0", 0), trace.get("dx", 1)
+        if isinstance(x0, (int, float)) and isinstance(dx, (int, float)):
+            trace.pop("x0", None)
+            trace.pop("dx", None)
+            trace["x"] = encode_array(x0 + dx * index)
+
+    def take(container: dict, key: str):
+        arr = decode_array(container.get(key))
+        if arr is not None and arr.ndim >= 1 and len(arr) == n:
+            container[key] = encode_array(arr[index])
+
+    for key in _POINT_KEYS:
+        take(trace, key)
+    marker = trace.get("marker")
+    if isinstance(marker, dict):
+        for key in _MARKER_POINT_KEYS:
+            take(marker, key)
+    trace.pop("selectedpoints", None)
+
+
+def _bin_scatter(trace: dict, x: np.ndarray, y: np.ndarray) -> dict:
+    """把散点按二维分箱聚合为计数热力图。"""
+    mask = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[mask], y[mask], bins=CHART_BINS)
+    z = counts.T
+    z[z == 0] = np.nan
+    binned = {
+        "type": "heatmap",
+        "x": encode_array((x_edges[:-1] + x_edges[1:]) / 2),
+        "y": encode_array((y_edges[:-1] + y_edges[1:]) / 2),
+        # 计数在 float32 中可无损表示，体积减半
+        "z": encode_array(z.astype(np.float32)),
+        "colorscale": "Blues",
+        "colorbar": {"title": {"text": "点数"}},
+        "hovertemplate": "x=%{x}<br>y=%{y}<br>点数=%{z}<extra></extra>",
+    }
+    for key in ("name", "xaxis", "yaxis", "legendgroup", "showlegend"):
+        if key in trace:
+            binned[key] = trace[key]
+    return binned
+
+
+def _raw_keys(trace: dict) -> Tuple[str, str]:
+    """(原始数据所在的键, 另一坐标的键)。
+
+    竖直直方图的原始数据在 x 上、高度在 y 上；竖直箱线图 / 小提琴图的原始数据在 y 上、分组在 x 上。
+    """
+    if trace.get("type") == "histogram":
+        horizontal = trace.get("orientation") == "h" or (trace.get("x") is None and trace.get("y") is not None)
+        return ("y", "x") if horizontal else ("x", "y")
+    horizontal = trace.get("orientation") == "h" or (trace.get("y") is None and trace.get("x") is not None)
+    return ("x", "y") if horizontal else ("y", "x")
+
+
+def _drop_point_keys(trace: dict):
+    for key in _RAW_POINT_KEYS:
+        trace.pop(key, None)
+    marker = trace.get("marker")
+    if isinstance(marker, dict):
+        for key in _MARKER_POINT_KEYS:
+            if isinstance(marker.get(key), (list, dict)):
+                marker.pop(key)
+
+
+def _histogram_values(trace: dict) -> Optional[np.ndarray]:
+    """需要服务端分箱的数值直方图的原始数据；不需要或不支持时返回 None。"""
+    if trace.get("type") != "histogram" or (trace.get("cumulative") or {}).get("enabled"):
+        return None
+    if trace.get("histfunc", "count") not in _HISTFUNCS:
+        return None
+    value_key, _ = _raw_keys(trace)
+    values = decode_array(trace.get(value_key))
+    if values is None or values.ndim != 1 or len(values) <= CHART_RAW_MAX_POINTS:
+        return None
+    return values
+
+
+def _shared_edges(data: list) -> Dict[tuple, np.ndarray]:
+    """同一坐标轴上的数值直方图使用同一组分箱边界，与 plotly 的 bingroup 行为一致。"""
+    groups: Dict[tuple, List[np.ndarray]] = {}
+    for trace in data:
+        if not isinstance(trace, dict) or _histogram_spec_edges(trace) is not None:
+            continue
+        values = _histogram_values(trace)
+        if values is None or not _numeric(values):
+            continue
+        values = values.astype(np.float64)
+        groups.setdefault(_bin_group(trace), []).append(values[np.isfinite(values)])
+    edges = {}
+    for key, arrays in groups.items():
+        values = np.concatenate(arrays)
+        if values.size:
+            edges[key] = _auto_edges(values, _requested_bins(data, key))
+    return edges
+
+
+def _bin_group(trace: dict) -> tuple:
+    value_key, _ = _raw_keys(trace)
+    return value_key, trace.get(f"{value_key}axis", value_key), trace.get("bingroup")
+
+
+def _requested_bins(data: list, key: tuple) -> Optional[int]:
+    for trace in data:
+        if isinstance(trace, dict) and trace.get("type") == "histogram" and _bin_group(trace) == key:
+            nbins = trace.get(f"nbins{key[0]}")
+            if isinstance(nbins, int) and nbins > 0:
+                return nbins
+    return None
+
+
+def _auto_edges(values: np.ndarray, nbins: Optional[int]) -> np.ndarray:
+    if nbins:
+        return np.histogram_bin_edges(values, bins=min(nbins, CHART_BINS))
+    edges = np.histogram_bin_edges(values, bins="auto")
+    if len(edges) - 1 > CHART_BINS:
+        edges = np.histogram_bin_edges(values, bins=CHART_BINS)
+    return edges
+
+
+def _histogram_spec_edges(trace: dict) -> Optional[np.ndarray]:
+    """trace 中显式给出的 xbins / ybins（start、end、size 均为数值时）。"""
+    value_key, _ = _raw_keys(trace)
+    spec = trace.get(f"{value_key}bins") or {}
+    start, end, size = spec.get("start"), spec.get("end"), spec.get("size")
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (start, end, size)) and size > 0:
+        return np.arange(start, end + size, size, dtype=np.float64)
+    return None
+
+
+def _bin_histogram(trace: dict, label: str, shared: Dict[tuple, np.ndarray]) -> Tuple[dict, Optional[str]]:
+    """把直方图的原始数据聚合为柱状图：数值按分箱，文本按类别。"""
+    values = _histogram_values(trace)
+    if values is None:
+        return trace, None
+    n = len(values)
+    value_key, weight_key = _raw_keys(trace)
+    histfunc = trace.get("histfunc", "count")
+    weights = decode_array(trace.get(weight_key)) if histfunc != "count" else None
+    if weights is not None and (len(weights) != n or not _numeric(weights)):
+        return trace, None
+    if weights is None:
+        histfunc = "count"
+
+    if _numeric(values):
+        values = values.astype(np.float64)
+        mask = np.isfinite(values)
+        edges = _histogram_spec_edges(trace)
+        if edges is None:
+            edges = shared.get(_bin_group(trace))
+        if edges is None:
+            return trace, None
+        counts, _ = np.histogram(values[mask], bins=edges)
+        if histfunc == "count":
+            heights = counts.astype(np.float64)
+        else:
+            sums, _ = np.histogram(values[mask], bins=edges, weights=weights[mask].astype(np.float64))
+            heights = sums
+            if histfunc == "avg":
+                heights = np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0)
+        positions = (edges[:-1] + edges[1:]) / 2
+        widths = np.diff(edges)
+    else:
+        try:
+            pd.to_datetime(values[:100], format="ISO8601")
+            # 日期坐标的分箱规则（按月、按天等）与数值不同，保持原样交给 plotly.js
+            return trace, None
+        except (ValueError, TypeError, OverflowError):
+            pass
+        series = pd.Series(np.ones(n) if weights is None else weights.astype(np.float64))
+        grouped = series.groupby(pd.Series(values.astype(object)), sort=False)
+        agg = {"count": grouped.size, "sum": grouped.sum, "avg": grouped.mean}[histfunc]()
+        positions = agg.index.to_numpy(dtype=object)
+        heights = agg.to_numpy(dtype=np.float64)
+        widths = None
+
+    norm = trace.get("histnorm") or ""
+    total = np.nansum(heights)
+    if norm in ("percent", "probability", "probability density") and total > 0:
+        heights = heights / total * (100 if norm == "percent" else 1)
+    if norm in ("density", "probability density") and widths is not None:
+        heights = heights / widths
+
+    bar = {k: v for k, v in trace.items() if k not in (
+        "x", "y", "histfunc", "histnorm", "bingroup", "nbinsx", "nbinsy", "xbins", "ybins",
+        "autobinx", "autobiny", "cumulative",
+    )}
+    bar["type"] = "bar"
+    bar[value_key] = encode_array(positions)
+    bar[weight_key] = encode_array(heights)
+    if widths is not None:
+        bar["width"] = encode_array(widths)
+    if value_key == "y":
+        bar["orientation"] = "h"
+    _drop_point_keys(bar)
+    return bar, f"{label}：直方图 {n:,} 个原始值 → 服务端聚合为 {len(heights):,} 根柱子"
+
+
+def _summarize_box(trace: dict, label: str) -> Tuple[dict, Optional[str]]:
+    """把箱线图的原始数据替换为预先计算的四分位数、中位数、均值和须（1.5×IQR 内的最远值）。"""
+    value_key, group_key = _raw_keys(trace)
+    values = decode_array(trace.get(value_key))
+    if values is None or values.ndim != 1 or not _numeric(values) or len(values) <= CHART_RAW_MAX_POINTS:
+        return trace, None
+    n = len(values)
+    groups = decode_array(trace.get(group_key))
+    if groups is not None and len(groups) != n:
+        return trace, None
+
+    values = values.astype(np.float64)
+    codes, uniques = (np.zeros(n, dtype=np.int64), None) if groups is None else pd.factorize(groups)
+    stats = {key: [] for key in ("q1", "median", "q3", "lowerfence", "upperfence", "mean")}
+    for code in range(1 if uniques is None else len(uniques)):
+        group = values[(codes == code) & np.isfinite(values)]
+        if group.size == 0:
+            group = np.array([np.nan])
+        q1, median, q3 = np.percentile(group, [25, 50, 75])
+        iqr = q3 - q1
+        inside = group[(group >= q1 - 1.5 * iqr) & (group <= q3 + 1.5 * iqr)]
+        stats["q1"].append(q1)
+        stats["median"].append(median)
+        stats["q3"].append(q3)
+        stats["lowerfence"].append(inside.min() if inside.size else q1)
+        stats["upperfence"].append(inside.max() if inside.size else q3)
+        stats["mean"].append(group.mean())
+
+    box = {k: v for k, v in trace.items() if k not in ("x", "y", "boxpoints", "jitter", "pointpos")}
+    for key, column in stats.items():
+        box[key] = encode_array(np.asarray(column, dtype=np.float64))
+    if uniques is not None:
+        box[group_key] = encode_array(np.asarray(uniques))
+    box["boxpoints"] = False
+    _drop_point_keys(box)
+    return box, f"{label}：箱线图 {n:,} 个原始值 → 服务端计算四分位数（离群点不再逐个显示）"
+
+
+def _sample_violin(trace: dict, label: str) -> Tuple[dict, Optional[str]]:
+    """小提琴图的核密度由 plotly.js 计算，没有预计算形式，随机抽样保留分布形状。"""
+    value_key, _ = _raw_keys(trace)
+    values = decode_array(trace.get(value_key))
+    if values is None or values.ndim != 1 or len(values) <= CHART_RAW_MAX_POINTS:
+        return trace, None
+    n = len(values)
+    index = np.sort(np.random.default_rng(0).choice(n, CHART_RAW_MAX_POINTS, replace=False))
+    _take_points(trace, index, n)
+    return trace, f"{label}：小提琴图 {n:,} 个原始值 → 随机抽样为 {len(index):,} 个"
+
+
+def _optimize_trace(
+    trace: dict, title: str, edges: Optional[Dict[tuple, np.ndarray]] = None
+) -> Tuple[dict, Optional[str]]:
+    """返回精简后的 trace 和处理说明（未处理时说明为 None）。"""
+    kind = trace.get("type", "scatter")
+    label = trace.get("name") or title
+    if kind == "histogram":
+        return _bin_histogram(trace, label, edges or {})
+    if kind == "box":
+        return _summarize_box(trace, label)
+    if kind == "violin":
+        return _sample_violin(trace, label)
+    if kind not in ("scatter", "scattergl"):
+        return trace, None
+    y = decode_array(trace.get("y"))
+    if y is None or y.ndim != 1 or not _numeric(y):
+        return trace, None
+    n = len(y)
+    x_raw = decode_array(trace.get("x"))
+    if x_raw is not None and len(x_raw) != n:
+        return trace, None
+    mode = trace.get("mode") or ("lines+markers" if n < 20 else "lines")
+
+    if "lines" in mode:
+        if n <= CHART_LINE_MAX_POINTS:
+            return trace, None
+        x = _axis_values(x_raw, n)
+        index = lttb(x, y, CHART_LINE_MAX_POINTS)
+        _take_points(trace, index, n)
+        return trace, f"{label}：折线 {n:,} 点 → LTTB 降采样为 {len(index):,} 点"
+
+    if n > CHART_SCATTER_MAX_POINTS:
+        x = _axis_values(x_raw, n)
+        if x_raw is None or _numeric(x_raw):
+            return _bin_scatter(trace, x.astype(np.float64), y.astype(np.float64)), (
+                f"{label}：散点 {n:,} 点 → 聚合为 {CHART_BINS}×{CHART_BINS} 分箱热力图"
+            )
+        index = np.linspace(0, n - 1, CHART_SCATTER_MAX_POINTS).astype(np.int64)
+        _take_points(trace, index, n)
+        trace["type"] = "scattergl"
+        return trace, f"{label}：散点 {n:,} 点 → 等距抽样为 {len(index):,} 点（WebGL 渲染）"
+
+    if n > CHART_WEBGL_POINTS and kind == "scatter":
+        trace["type"] = "scattergl"
+        return trace, f"{label}：散点 {n:,} 点 → WebGL 渲染"
+    return trace, None
+
+
+def _figure_title(fig: dict, default: str) -> str:
+    title = (fig.get("layout") or {}).get("title")
+    if isinstance(title, dict):
+        title = title.get("text")
+    return title if isinstance(title, str) and title else default
+
+
+def optimize_figure(fig: dict, name: str = "图表") -> List[str]:
+    """原地精简图表字典，返回处理说明。"""
+    notes = []
+    data = fig.get("data") or []
+    title = _figure_title(fig, name)
+    edges = _shared_edges(data)
+    for i, trace in enumerate(data):
+        if not isinstance(trace, dict):
+            continue
+        data[i], note = _optimize_trace(trace, title, edges)
+        if note:
+            notes.append(note)
+    fig["data"] = _encode_tree(data)
+    # 与 cl.Plotly 一致：宽度随页面自适应
+    layout = fig.setdefault("layout", {})
+    layout["autosize"] = True
+    layout.pop("width", None)
+    return notes
+
+
+def load_chart(file_path: str) -> Tuple[str, List[str]]:
+    """读取 .plotly.json 文件，返回可直接发送的 JSON 文本和处理说明。"""
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    fig = _loads(raw)
+    if not isinstance(fig, dict):
+        raise ValueError("不是有效的 Plotly 图表")
+    if len(raw) < PASSTHROUGH_BYTES:
+        layout = fig.get("layout") or {}
+        if layout.get("autosize") is True and "width" not in layout:
+            return raw.decode("utf-8"), []
+        layout["autosize"] = True
+        layout.pop("width", None)
+        fig["layout"] = layout
+        return _dumps(fig), []
+    fname = os.path.basename(file_path)
+    notes = optimize_figure(fig, fname.replace(".plotly.json", ""))
+    content = _dumps(fig)
+    print(f"[图表] {fname}: {len(raw) / 1024:.0f}KB → {len(content) / 1024:.0f}KB")
+    return content, notes
@@ -8,6 +8,117 @@ CHART_DIR_ABS = os.path.join(os.path.dirname(os.path.abspath(__file__)), CHART_D
 UPLOAD_DIR = "upload_files"
 UPLOAD_DIR_ABS = os.path.join(os.path.dirname(os.path.abspath(__file__)), UPLOAD_DIR)
 
+# 每个会话在 CHART_DIR / UPLOAD_DIR 下拥有独立子目录，超过该时长未更新的子目录会被清理
+SESSION_DIR_TTL_HOURS = float(os.environ.get("SESSION_DIR_TTL_HOURS", 24))
+
+# Agent 运行期间轮询会话 CHART_DIR 推送新产物的间隔（秒）
+ARTIFACT_POLL_INTERVAL = float(os.environ.get("ARTIFACT_POLL_INTERVAL", 1.0))
+
+# 指令中「当前可用的数据」一节的 token 预算，超出时压缩列信息，由 Agent 按需查询
+SCHEMA_TOKEN_BUDGET = int(os.environ.get("SCHEMA_TOKEN_BUDGET", 6000))
+
+# 流式输出：token 按时间/大小合并成帧发送，事件队列有界以形成背压
+STREAM_FLUSH_INTERVAL = float(os.environ.get("STREAM_FLUSH_INTERVAL_MS", 30)) / 1000
+STREAM_FLUSH_CHARS = int(os.environ.get("STREAM_FLUSH_CHARS", 512))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 256))
+
+# 工具步骤中显示的结果预览长度（字符），超出部分写入溢出文件供下载
+TOOL_PREVIEW_CHARS = int(os.environ.get("TOOL_PREVIEW_CHARS", 2000))
+
+# 上传文件解析缓存（Arrow IPC），按文件内容哈希 + sheet 名称索引，超出容量按 LRU 淘汰
+PARSE_CACHE_DIR = os.environ.get(
+    "PARSE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_cache"),
+)
+PARSE_CACHE_MAX_BYTES = int(os.environ.get("PARSE_CACHE_MAX_MB", 2048)) * 1024 * 1024
+
+# 沙箱执行池：Agent 生成的代码在预热的独立进程中执行
+SANDBOX_ENABLED = os.environ.get("SANDBOX_ENABLED", "1") not in ("0", "false", "False")
+SANDBOX_WARM_WORKERS = int(os.environ.get("SANDBOX_WARM_WORKERS", 2))
+SANDBOX_TIMEOUT = float(os.environ.get("SANDBOX_TIMEOUT", 300))
+SANDBOX_CPU_SECONDS = int(os.environ.get("SANDBOX_CPU_SECONDS", 300))
+SANDBOX_MEMORY_MB = int(os.environ.get("SANDBOX_MEMORY_MB", 8192))
+# 所有会话合计最多占用的工作进程数，达到上限时回收最久未使用的空闲进程
+SANDBOX_MAX_WORKERS = int(os.environ.get("SANDBOX_MAX_WORKERS", 8))
+# 会话的工作进程空闲超过该秒数后回收，释放进程内的数据副本（0 表示不回收）
+SANDBOX_IDLE_SECONDS = float(os.environ.get("SANDBOX_IDLE_SECONDS", 600))
+
+# 查询结果缓存：相同问题 + 相同数据 + 相同模型时直接回放结果，超出容量按 LRU 淘汰
+QUERY_CACHE_DIR = os.environ.get(
+    "QUERY_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_cache"),
+)
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_MB", 512)) * 1024 * 1024
+
+# 大文件模式：超过该大小的 CSV 转存为 Parquet 由 DuckDB 按需查询，pandas 中只加载样本
+LARGE_FILE_THRESHOLD_BYTES = int(os.environ.get("LARGE_FILE_THRESHOLD_MB", 500)) * 1024 * 1024
+LARGE_FILE_SAMPLE_ROWS = int(os.environ.get("LARGE_FILE_SAMPLE_ROWS", 10000))
+DUCKDB_MEMORY_LIMIT = os.environ.get("DUCKDB_MEMORY_LIMIT", "2GB")
+
+# SQL 工具结果预览的默认行数
+SQL_PREVIEW_ROWS = int(os.environ.get("SQL_PREVIEW_ROWS", 20))
+
+# 上传数据类型规整：唯一值占比不超过该比例的字符串列转为分类类型
+OPTIMIZE_DTYPES = os.environ.get("OPTIMIZE_DTYPES", "1") not in ("0", "false", "False")
+CATEGORY_MAX_RATIO = float(os.environ.get("CATEGORY_MAX_RATIO", 0.5))
+
+# Agent 会话存储：默认 SQLite 文件，可设为 postgresql://... 供多实例共享，或 memory 仅保存在进程内
+SESSION_DB_URL = os.environ.get(
+    "SESSION_DB_URL",
+    "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.db"),
+)
+# 上下文中保留原文的最近对话轮数；上下文超过 SESSION_COMPACT_AT_TOKENS 时更早的对话压缩为摘要（0 表示不压缩）
+SESSION_HISTORY_RUNS = int(os.environ.get("SESSION_HISTORY_RUNS", 8))
+SESSION_COMPACT_AT_TOKENS = int(os.environ.get("SESSION_COMPACT_AT_TOKENS", 48000))
+# 历史中重放的工具调用上限，避免大段工具结果反复占用上下文
+SESSION_MAX_HISTORY_TOOL_CALLS = int(os.environ.get("SESSION_MAX_HISTORY_TOOL_CALLS", 10))
+# 超过该天数未更新的会话在启动时清理
+SESSION_TTL_DAYS = float(os.environ.get("SESSION_TTL_DAYS", 30))
+
+# 用户设置数据库（每个用户一条记录）
+SETTINGS_DB_PATH = os.environ.get(
+    "SETTINGS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_settings.db"),
+)
+
+# LLM 客户端池：每个供应商的最大并发请求数、keep-alive 连接数；
+# 429 / 5xx 由 SDK 按 Retry-After 与指数退避重试 LLM_MAX_RETRIES 次，其他错误整轮重跑 LLM_RUN_RETRIES 次
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", 8))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 4))
+LLM_RUN_RETRIES = int(os.environ.get("LLM_RUN_RETRIES", 1))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 120))
+
+# Agent 运行调度：全局与单个会话（浏览器对话）的最大并发运行数，超出的请求按会话轮转排队；
+# 排队总数或单个会话的排队数超过上限时拒绝新请求。按会话计数，共用同一登录账号的会话互不限制
+RUN_MAX_CONCURRENCY = int(os.environ.get("RUN_MAX_CONCURRENCY", 8))
+RUN_MAX_PER_SESSION = int(os.environ.get("RUN_MAX_PER_SESSION", 1))
+RUN_MAX_QUEUED = int(os.environ.get("RUN_MAX_QUEUED", 64))
+RUN_MAX_QUEUED_PER_SESSION = int(os.environ.get("RUN_MAX_QUEUED_PER_SESSION", 3))
+
+# 耗时监控：Prometheus 指标路径（默认不暴露，需显式设置如 /metrics）、访问令牌（设置后请求需带
+# Authorization: Bearer <令牌>）、每轮回答后是否显示耗时明细步骤；
+# 设置 OTEL_EXPORTER_OTLP_ENDPOINT 时同时以 OpenTelemetry 导出到采集器
+METRICS_PATH = os.environ.get("METRICS_PATH", "")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+SHOW_RUN_TIMING = os.environ.get("SHOW_RUN_TIMING", "1") not in ("0", "false", "False")
+OTEL_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+
+# 图表载荷：折线超过 CHART_LINE_MAX_POINTS 点时 LTTB 降采样；散点超过 CHART_WEBGL_POINTS 点改用 WebGL 渲染，
+# 超过 CHART_SCATTER_MAX_POINTS 点时聚合为 CHART_BINS × CHART_BINS 分箱热力图
+CHART_LINE_MAX_POINTS = int(os.environ.get("CHART_LINE_MAX_POINTS", 5000))
+CHART_WEBGL_POINTS = int(os.environ.get("CHART_WEBGL_POINTS", 5000))
+CHART_SCATTER_MAX_POINTS = int(os.environ.get("CHART_SCATTER_MAX_POINTS", 200000))
+CHART_BINS = int(os.environ.get("CHART_BINS", 200))
+# 直方图、箱线图、小提琴图携带的原始数据超过该点数时在服务端聚合（直方图、箱线图）或抽样（小提琴图）
+CHART_RAW_MAX_POINTS = int(os.environ.get("CHART_RAW_MAX_POINTS", 5000))
+
+# 启动预热：服务开始监听后在后台导入 agno / OpenAI SDK / plotly 等依赖；关闭时在首次使用时才导入
+PREWARM = os.environ.get("PREWARM", "1") not in ("0", "false", "False")
+
+# 上传文件解析进程池大小
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+
 
 @dataclass
 class LLMProvider:
@@ -0,0 +1,83 @@
+"""上传数据的类型规整：标识符列转为字符串，数值列无损降精度，低基数字符串列转为分类类型。
+
+在解析进程中执行，解析结果回传主进程前就已缩小，后续的快照、画像、分析和缓存都随之受益。
+"""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import CATEGORY_MAX_RATIO
+from export import identifier_text
+from profiling import SAMPLE_ROWS, is_identifier_column, is_identifier_name, looks_like_identifier
+
+# 行数太少时转分类类型意义不大
+_CATEGORY_MIN_ROWS = 100
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def identifier_dtypes(columns) -> dict:
+    """列名提示为标识符的列，读取 CSV 时先以字符串解析，避免长数字被解析为浮点数；
+    读取后由 restore_numeric 按取值确认。"""
+    return {name: str for name in columns if is_identifier_name(name)}
+
+
+def restore_numeric(df: pd.DataFrame, columns) -> pd.DataFrame:
+    """按字符串读取的候选列若取值确认不是标识符（如含小数的「电话费」），恢复为数值。"""
+    head = df.head(SAMPLE_ROWS)
+    for name in columns:
+        if name not in df.columns or looks_like_identifier(name, head[name]):
+            continue
+        col = df[name]
+        converted = pd.to_numeric(col, errors="coerce")
+        if converted.notna().sum() == col.notna().sum():
+            df[name] = converted
+    return df
+
+
+def _downcast_numeric(col: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(col):
+        return pd.to_numeric(col, downcast="integer")
+    if pd.api.types.is_float_dtype(col) and col.dtype != np.float32:
+        # 只有 float32 能精确表示全部取值时才降精度，避免金额等数值失真
+        values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+        narrowed = values.astype(np.float32)
+        same = (narrowed.astype(np.float64) == values) | np.isnan(values)
+        if same.all():
+            return col.astype(np.float32)
+    return col
+
+
+def _maybe_category(col: pd.Series) -> pd.Series:
+    n = len(col)
+    if n < _CATEGORY_MIN_ROWS:
+        return col
+    if col.nunique(dropna=True) <= n * CATEGORY_MAX_RATIO:
+        return col.astype("category")
+    return col
+
+
+def optimize_dtypes(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """返回规整后的 DataFrame 和规整前的内存占用（字节）。按列位置处理，兼容重复列名。"""
+    before = memory_bytes(df)
+    df = df.copy(deep=False)
+    head = df.head(SAMPLE_ROWS)
+    for i, name in enumerate(df.columns):
+        col = df.iloc[:, i]
+        if pd.api.types.is_bool_dtype(col) or isinstance(col.dtype, pd.CategoricalDtype):
+            continue
+        if is_identifier_column(name, col, head.iloc[:, i]):
+            if not isinstance(col.dtype, pd.StringDtype):
+                # 先转文本再恢复缺失值，避免 pandas 2 把 NaN 变成字符串 "nan"
+                col = identifier_text(col).astype("str").where(col.notna())
+        elif pd.api.types.is_numeric_dtype(col):
+            col = _downcast_numeric(col)
+        elif isinstance(col.dtype, pd.StringDtype):
+            col = _maybe_category(col)
+        elif col.dtype == object and pd.api.types.infer_dtype(col, skipna=True) == "string":
+            col = _maybe_category(col.astype("str").where(col.notna()))
+        df.isetitem(i, col)
+    return df, before
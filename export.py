@@ -0,0 +1,211 @@
+"""数据导出：流式写出 Excel / CSV / Parquet，Agent 代码和「导出结果」按钮共用。
+
+Excel 使用 xlsxwriter 的 constant_memory 模式逐行写出，内存占用与行数无关；
+CSV 分块追加写入，Parquet 按行组写入。标识符列（卡号、身份证号、手机号等）
+统一转为文本，不依赖 Agent 是否遵守提示词。
+"""
+import datetime
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from profiling import SAMPLE_ROWS, is_identifier_column
+
+# Excel 单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1_048_576
+CHUNK_ROWS = 50_000
+
+_SHEET_NAME_INVALID = re.compile(r"[\[\]:*?/\\]")
+_TRAILING_ZEROS = re.compile(r"\.0+$")
+_EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+_EXCEL_SCALARS = (str, bool, int, float, datetime.date, datetime.time, datetime.timedelta)
+
+# 进度回调：(已写入行数, 总行数)
+ProgressCallback = Callable[[int, int], None]
+
+
+@dataclass
+class ExportResult:
+    path: str
+    rows: int
+    elapsed: float
+
+    def summary(self) -> str:
+        return f"已导出 {self.rows:,} 行到 {os.path.basename(self.path)}，用时 {self.elapsed:.1f} 秒"
+
+    __str__ = summary
+
+
+def identifier_positions(df: pd.DataFrame) -> List[int]:
+    """按列位置返回标识符列，兼容重复列名。与上传规整共用 is_identifier_column 的判断。"""
+    head = df.head(SAMPLE_ROWS)
+    return [
+        i for i, name in enumerate(df.columns)
+        if is_identifier_column(name, df.iloc[:, i], head.iloc[:, i])
+    ]
+
+
+def identifier_text(series: pd.Series) -> pd.Series:
+    """将标识符列转为文本：数值按整数格式化（不出现科学计数法和 .0），缺失值为空字符串。"""
+    out = pd.Series("", index=series.index, dtype=object)
+    mask = series.notna()
+    if not mask.any():
+        return out
+    values = series[mask]
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        if pd.api.types.is_float_dtype(values) and not (values % 1 == 0).all():
+            out[mask] = values.astype(str)
+        else:
+            out[mask] = np.char.mod("%d", values.to_numpy(dtype=np.int64))
+    else:
+        out[mask] = values.astype(str).str.replace(_TRAILING_ZEROS, "", regex=True)
+    return out
+
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    positions = identifier_positions(df)
+    if not positions:
+        return df
+    df = df.copy(deep=False)
+    for i in positions:
+        df.isetitem(i, identifier_text(df.iloc[:, i]))
+    return df
+
+
+def _sheet_names(names: List[str]) -> List[str]:
+    """Excel 工作表名称：去除非法字符、截断到 31 个字符并去重。"""
+    used = set()
+    result = []
+    for name in names:
+        base = _SHEET_NAME_INVALID.sub("_", str(name)).strip("'")[:31] or "Sheet"
+        candidate, n = base, 2
+        while candidate.lower() in used:
+            suffix = f"_{n}"
+            candidate, n = base[: 31 - len(suffix)] + suffix, n + 1
+        used.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+def _excel_serial_dates(df: pd.DataFrame) -> tuple:
+    """日期列向量化转为 Excel 序列值，配合列格式显示，避免逐个单元格转换。"""
+    positions = [i for i, dtype in enumerate(df.dtypes) if pd.api.types.is_datetime64_any_dtype(dtype)]
+    if not positions:
+        return df, positions
+    df = df.copy(deep=False)
+    for i in positions:
+        col = df.iloc[:, i]
+        if col.dt.tz is not None:
+            col = col.dt.tz_localize(None)
+        df.isetitem(i, (col - _EXCEL_EPOCH) / pd.Timedelta(days=1))
+    return df, positions
+
+
+def _excel_row(row: tuple) -> list:
+    return [v if v is None or isinstance(v, _EXCEL_SCALARS) else str(v) for v in row]
+
+
+def _write_excel(sheets: Dict[str, pd.DataFrame], path: str, progress: ProgressCallback) -> int:
+    import xlsxwriter
+
+    total = sum(len(df) for df in sheets.values())
+    written = 0
+    workbook = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "strings_to_urls": False,
+        "remove_timezone": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    try:
+        date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        names = _sheet_names(list(sheets))
+        for sheet_name, df in zip(names, sheets.values()):
+            df, date_positions = _excel_serial_dates(_prepare(df))
+            header = [str(c) for c in df.columns]
+            data_rows = EXCEL_MAX_ROWS - 1
+            # 超出 Excel 行数上限时拆分到多个工作表
+            parts = max(1, -(-len(df) // data_rows))
+            part_names = _sheet_names([sheet_name] + [f"{sheet_name}_{i}" for i in range(2, parts + 1)])
+            for part, part_name in enumerate(part_names):
+                worksheet = workbook.add_worksheet(part_name)
+                for i in date_positions:
+                    worksheet.set_column(i, i, 19, date_format)
+                worksheet.write_row(0, 0, header)
+                row_index = 1
+                start, stop = part * data_rows, min((part + 1) * data_rows, len(df))
+                for chunk_start in range(start, stop, CHUNK_ROWS):
+                    chunk = df.iloc[chunk_start:min(chunk_start + CHUNK_ROWS, stop)]
+                    values = chunk.astype(object).where(chunk.notna(), None)
+                    for row in values.itertuples(index=False, name=None):
+                        try:
+                            worksheet.write_row(row_index, 0, row)
+                        except TypeError:
+                            worksheet.write_row(row_index, 0, _excel_row(row))
+                        row_index += 1
+                    written += len(chunk)
+                    progress(written, total)
+    finally:
+        workbook.close()
+    return total
+
+
+def _write_csv(df: pd.DataFrame, path: str, progress: ProgressCallback) -> int:
+    df = _prepare(df)
+    total = len(df)
+    # utf-8-sig 带 BOM，Excel 打开时中文不乱码
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        df.head(0).to_csv(f, index=False)
+        for start in range(0, total, CHUNK_ROWS):
+            df.iloc[start:start + CHUNK_ROWS].to_csv(f, index=False, header=False)
+            progress(min(start + CHUNK_ROWS, total), total)
+    return total
+
+
+def _write_parquet(df: pd.DataFrame, path: str, progress: ProgressCallback) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(_prepare(df), preserve_index=False)
+    total = table.num_rows
+    with pq.ParquetWriter(path, table.schema) as writer:
+        for start in range(0, total, CHUNK_ROWS):
+            writer.write_table(table.slice(start, CHUNK_ROWS))
+            progress(min(start + CHUNK_ROWS, total), total)
+    return total
+
+
+def export_table(
+    data: Union[pd.DataFrame, Dict[str, pd.DataFrame]],
+    path: str,
+    progress: Optional[ProgressCallback] = None,
+) -> ExportResult:
+    """按扩展名（.xlsx / .csv / .parquet）导出数据，返回行数和耗时。
+
+    data 为 {名称: DataFrame} 时导出为多工作表 Excel；CSV / Parquet 只支持单个 DataFrame。
+    """
+    progress = progress or (lambda written, total: None)
+    ext = os.path.splitext(path)[1].lower()
+    if isinstance(data, dict):
+        if ext != ".xlsx" and len(data) == 1:
+            data = next(iter(data.values()))
+        elif ext != ".xlsx":
+            raise ValueError("多个 DataFrame 只能导出为 .xlsx 文件")
+    elif ext == ".xlsx":
+        data = {"Sheet1": data}
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    started = time.perf_counter()
+    if ext == ".xlsx":
+        rows = _write_excel(data, path, progress)
+    elif ext == ".csv":
+        rows = _write_csv(data, path, progress)
+    elif ext == ".parquet":
+        rows = _write_parquet(data, path, progress)
+    else:
+        raise ValueError(f"不支持的导出格式: {ext}（支持 .xlsx / .csv / .parquet）")
+    return ExportResult(path=path, rows=rows, elapsed=time.perf_counter() - started)
@@ -0,0 +1,157 @@
+"""上传文件解析：在进程池中并行解析 Excel/CSV，避免阻塞事件循环。"""
+import asyncio
+import importlib.util
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Optional, Tuple
+
+import pandas as pd
+
+from config import INGEST_WORKERS, LARGE_FILE_THRESHOLD_BYTES, OPTIMIZE_DTYPES
+from dtype_optimize import identifier_dtypes, memory_bytes, optimize_dtypes, restore_numeric
+from large_data import LargeTableInfo, LazyTable, convert_csv_to_parquet, read_sample
+from upload_cache import file_hash, parse_cache
+
+EXCEL_EXTS = (".xlsx", ".xls")
+CSV_EXTS = (".csv",)
+
+# 优先使用更快的解析引擎：calamine 读取 Excel，pyarrow 读取 CSV
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else None
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS)
+    return _pool
+
+
+def list_sheets(path: str) -> list:
+    with pd.ExcelFile(path, engine=EXCEL_ENGINE) as xls:
+        return xls.sheet_names
+
+
+def read_sheet(path: str, sheet_name: str) -> pd.DataFrame:
+    return pd.read_excel(path, sheet_name=sheet_name, engine=EXCEL_ENGINE)
+
+
+def read_csv(path: str) -> pd.DataFrame:
+    # 列名提示为标识符的列先按字符串读取，避免长数字先被解析为浮点数；取值确认不是标识符的再恢复为数值
+    try:
+        dtype = identifier_dtypes(pd.read_csv(path, nrows=0).columns)
+    except Exception:
+        dtype = None
+    df = None
+    if CSV_ENGINE:
+        try:
+            df = pd.read_csv(path, engine=CSV_ENGINE, dtype=dtype)
+        except Exception as e:
+            # pyarrow 不支持的格式（如非 UTF-8 编码）退回默认引擎
+            print(f"[上传解析] {CSV_ENGINE} 引擎解析失败 {path}: {e}, 改用默认引擎")
+    if df is None:
+        df = pd.read_csv(path, dtype=dtype)
+    return restore_numeric(df, dtype or ())
+
+
+def parse(func, *args) -> Tuple[pd.DataFrame, int]:
+    """在解析进程中读取并规整类型，返回 (DataFrame, 规整前的内存占用)。"""
+    df = func(*args)
+    if not OPTIMIZE_DTYPES:
+        return df, memory_bytes(df)
+    return optimize_dtypes(df)
+
+
+def _df_key(stem: str, sheet_name: str) -> str:
+    # CSV 只有一个 sheet，缓存中以空字符串作为 sheet 名称
+    return f"{stem}_{sheet_name}" if sheet_name else stem
+
+
+async def ingest_file(
+    src_path: str, filename: str, dest_dir: str
+) -> AsyncIterator[Tuple[str, pd.DataFrame, bool, Optional[int]]]:
+    """复制上传文件到 dest_dir 并解析，每个 sheet 就绪后立即产出
+    (名称, DataFrame, 是否命中缓存, 类型规整前的内存占用)。
+
+    相同内容的文件直接从解析缓存读取（缓存中已是规整后的类型，规整前占用为 None）；
+    否则多个 sheet 在进程池中并行解析并规整类型，先完成的先返回，并写入缓存供下次上传使用。
+    """
+    save_path = os.path.join(dest_dir, filename)
+    await asyncio.to_thread(shutil.copy2, src_path, save_path)
+
+    stem, ext = os.path.splitext(filename)
+    ext = ext.lower()
+    if ext not in EXCEL_EXTS + CSV_EXTS:
+        return
+
+    digest = None
+    if parse_cache.enabled:
+        digest = await asyncio.to_thread(file_hash, save_path)
+        # 缓存的是规整后的结果，开关类型规整时不能复用另一种设置下的缓存
+        if OPTIMIZE_DTYPES:
+            digest += "-opt"
+        cached = await asyncio.to_thread(parse_cache.load, digest)
+        if cached is not None:
+            for sheet_name, df in cached.items():
+                yield _df_key(stem, sheet_name), df, True, None
+            return
+
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+
+    async def _load(sheet_name, func, *args):
+        return sheet_name, await loop.run_in_executor(pool, parse, func, *args)
+
+    if ext in EXCEL_EXTS:
+        sheet_names = await loop.run_in_executor(pool, list_sheets, save_path)
+        tasks = [_load(sheet, read_sheet, save_path, sheet) for sheet in sheet_names]
+    else:
+        sheet_names = [""]
+        tasks = [_load("", read_csv, save_path)]
+
+    # 同一文件正在被其他上传写入缓存时，本次只解析不写缓存
+    claimed = digest is not None and parse_cache.begin(digest)
+    all_cached = claimed
+    committed = False
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            sheet_name, (df, original_bytes) = await next_done
+            yield _df_key(stem, sheet_name), df, False, original_bytes
+            if all_cached:
+                all_cached = await asyncio.to_thread(parse_cache.store_sheet, digest, sheet_name, df)
+
+        if all_cached:
+            await asyncio.to_thread(parse_cache.commit, digest, sheet_names)
+            committed = True
+    finally:
+        # 解析失败或中途停止读取时也要释放写入权
+        if claimed and not committed:
+            await asyncio.to_thread(parse_cache.discard, digest)
+
+
+def is_large_file(path: str, filename: str) -> bool:
+    """超过阈值的 CSV 走大文件模式；Excel 无法流式读取，仍整体解析。"""
+    ext = os.path.splitext(filename)[1].lower()
+    return ext in CSV_EXTS and os.path.getsize(path) >= LARGE_FILE_THRESHOLD_BYTES
+
+
+async def ingest_large_file(src_path: str, filename: str, dest_dir: str) -> Tuple[str, LargeTableInfo]:
+    """将大 CSV 直接流式转换为 dest_dir 下的 Parquet（不复制原文件），返回 (名称, 大表信息)。"""
+    stem = os.path.splitext(filename)[0]
+    dest_path = os.path.join(dest_dir, f"{stem}.parquet")
+    loop = asyncio.get_running_loop()
+    (rows, columns), digest = await asyncio.gather(
+        loop.run_in_executor(get_pool(), convert_csv_to_parquet, src_path, dest_path),
+        asyncio.to_thread(file_hash, src_path),
+    )
+    sample = await asyncio.to_thread(read_sample, dest_path)
+    info = LargeTableInfo(
+        table=LazyTable(stem, dest_path, rows, columns),
+        sample=sample,
+        source_bytes=os.path.getsize(src_path),
+        fingerprint=digest,
+    )
+    return stem, info
@@ -0,0 +1,140 @@
+"""大文件模式：超过阈值的 CSV 转存为 Parquet，以 DuckDB 按需查询，不整体加载到内存。
+
+转换由 DuckDB 流式完成，内存占用受 DUCKDB_MEMORY_LIMIT 限制（超出部分溢写到磁盘）；
+pandas 中只保留前若干行样本用于预览和数据描述。Agent 通过 LazyTable 过滤、聚合，
+只把结果加载为 DataFrame。
+"""
+import os
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+import pandas as pd
+
+from config import DUCKDB_MEMORY_LIMIT, LARGE_FILE_SAMPLE_ROWS
+
+LARGE_TABLE_USAGE = (
+    "  - 大表使用方式：用 `tbl_xxx.sql('SELECT ... FROM t WHERE ... GROUP BY ...')` 过滤、聚合（表名固定为 `t`），"
+    "只把结果作为 DataFrame 继续处理；也可用 `tbl_xxx.relation` 链式调用 DuckDB 关系 API。"
+    "`tbl_xxx.head(n)` 查看前几行，`tbl_xxx.export(path)` 导出 .csv / .parquet。"
+    "**不要**调用不带 columns / where 的 `tbl_xxx.to_pandas()` 加载全表"
+)
+
+_local = threading.local()
+
+
+def quote_literal(path: str) -> str:
+    return "'" + path.replace("'", "''") + "'"
+
+
+def connection():
+    """当前线程的 DuckDB 连接（DuckDB 连接不能跨线程并发使用）。"""
+    con = getattr(_local, "con", None)
+    if con is None:
+        import duckdb
+
+        con = duckdb.connect(config={"memory_limit": DUCKDB_MEMORY_LIMIT})
+        _local.con = con
+    return con
+
+
+def table_var_name(name: str) -> str:
+    """PythonTools 中大表对应的变量名。"""
+    return f"tbl_{name}".replace(" ", "_").replace("-", "_")
+
+
+class LazyTable:
+    """磁盘上的 Parquet 大表，查询时才由 DuckDB 读取所需的列和行。
+
+    只保存文件路径等元数据，可以低成本地同步到沙箱进程。
+    """
+
+    def __init__(self, name: str, path: str, rows: int, columns: List[str]):
+        self.name = name
+        self.path = path
+        self.rows = rows
+        self.columns = columns
+
+    def __repr__(self) -> str:
+        return f"LazyTable({self.name!r}, rows={self.rows:,}, columns={len(self.columns)})"
+
+    @property
+    def relation(self):
+        """DuckDB 关系对象，可链式调用 filter / aggregate / order / limit，最后用 .df() 取结果。"""
+        return connection().read_parquet(self.path)
+
+    def sql(self, query: str) -> pd.DataFrame:
+        """执行 SQL 并返回 DataFrame，查询中以 `t` 引用本表，例如 `SELECT 城市, SUM(金额) FROM t GROUP BY 1`。"""
+        return self.relation.query("t", query).df()
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return self.relation.limit(n).df()
+
+    def to_pandas(self, columns: Optional[List[str]] = None, where: Optional[str] = None) -> pd.DataFrame:
+        """加载（部分）数据到内存；请尽量通过 columns / where 缩小范围。"""
+        rel = self.relation
+        if where:
+            rel = rel.filter(where)
+        if columns:
+            rel = rel.select(*[f'"{c}"' for c in columns])
+        return rel.df()
+
+    def export(self, path: str) -> str:
+        """由 DuckDB 直接流式导出为 .csv / .parquet，不经过 pandas。"""
+        ext = os.path.splitext(path)[1].lower()
+        options = {".csv": "FORMAT csv, HEADER true", ".parquet": "FORMAT parquet"}.get(ext)
+        if options is None:
+            raise ValueError(f"大表仅支持导出为 .csv / .parquet: {path}")
+        connection().execute(
+            f"COPY (SELECT * FROM read_parquet({quote_literal(self.path)})) TO {quote_literal(path)} ({options})"
+        )
+        return path
+
+
+@dataclass
+class LargeTableInfo:
+    """会话中的大表：惰性表 + 用于预览和数据描述的样本。"""
+    table: LazyTable
+    sample: pd.DataFrame
+    source_bytes: int
+    # 源文件内容哈希，用于查询结果缓存的数据版本
+    fingerprint: str = ""
+
+
+def convert_csv_to_parquet(src_path: str, dest_path: str) -> tuple:
+    """在独立进程中调用：流式转换 CSV 为 Parquet，返回 (行数, 列名)。"""
+    import duckdb
+
+    tmp_path = dest_path + ".tmp"
+    con = duckdb.connect(config={"memory_limit": DUCKDB_MEMORY_LIMIT})
+    try:
+        con.execute(
+            f"COPY (SELECT * FROM read_csv({quote_literal(src_path)}, auto_detect=true, sample_size=-1)) "
+            f"TO {quote_literal(tmp_path)} (FORMAT parquet)"
+        )
+        described = con.execute(f"DESCRIBE SELECT * FROM read_parquet({quote_literal(tmp_path)})").fetchall()
+        rows = con.execute(f"SELECT COUNT(*) FROM read_parquet({quote_literal(tmp_path)})").fetchone()[0]
+    finally:
+        con.close()
+    os.replace(tmp_path, dest_path)
+    return rows, [r[0] for r in described]
+
+
+def read_sample(path: str, rows: int = LARGE_FILE_SAMPLE_ROWS) -> pd.DataFrame:
+    """只读取 Parquet 文件开头的若干行。"""
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    batch = next(parquet.iter_batches(batch_size=rows), None)
+    if batch is None:
+        return parquet.schema_arrow.empty_table().to_pandas()
+    return batch.to_pandas()
+
+
+def large_table_header(name: str, info: LargeTableInfo) -> str:
+    """「当前可用的数据」中大表的标题行，行数为全表行数，列信息来自样本。"""
+    return (
+        f"  - 大表（数据保留在磁盘，未加载到内存）'{name}', "
+        f"PythonTools 中的变量名: `{table_var_name(name)}`, "
+        f"行数: {info.table.rows}, 列数: {len(info.table.columns)}（列统计基于前 {len(info.sample)} 行样本）"
+    )
@@ -0,0 +1,133 @@
+"""LLM 客户端池：按 (供应商, base_url, API Key 哈希) 复用 OpenAI 兼容客户端。
+
+同一配置的所有会话共享一个客户端及其 keep-alive 连接池，重建 Agent、切换设置
+都不会重新建立 TLS 连接。每个供应商的并发请求数受信号量限制（流式响应读取完毕
+才释放）；429 / 5xx 由 OpenAI SDK 按 Retry-After 头和指数退避重试。
+"""
+import hashlib
+import threading
+from typing import TYPE_CHECKING, Dict, Tuple
+
+import httpx
+
+from config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_KEEPALIVE,
+    LLM_MAX_RETRIES,
+    LLM_TIMEOUT,
+)
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """响应体读取完毕（或被关闭）时释放并发名额。"""
+
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _LimitedTransport(httpx.BaseTransport):
+    """在 HTTP 传输层限制并发请求数，名额不足时排队等待。"""
+
+    def __init__(self, inner: httpx.BaseTransport, semaphore: threading.BoundedSemaphore):
+        self._inner = inner
+        self._semaphore = semaphore
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._semaphore.acquire()
+        released = threading.Event()
+
+        def _release():
+            if not released.is_set():
+                released.set()
+                self._semaphore.release()
+
+        try:
+            response = self._inner.handle_request(request)
+        except BaseException:
+            _release()
+            raise
+        response.stream = _ReleasingStream(response.stream, _release)
+        return response
+
+    def close(self):
+        self._inner.close()
+
+
+class LLMClientPool:
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_keepalive: int = LLM_MAX_KEEPALIVE,
+        max_retries: int = LLM_MAX_RETRIES,
+        timeout: float = LLM_TIMEOUT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_keepalive = max_keepalive
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._clients: Dict[Tuple[str, str, str], "OpenAI"] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(provider_name: str, base_url: str, api_key: str) -> Tuple[str, str, str]:
+        # 只保存 API Key 的哈希，避免明文出现在池的键中
+        return provider_name, base_url, hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    def _semaphore(self, provider_name: str) -> threading.BoundedSemaphore:
+        semaphore = self._semaphores.get(provider_name)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(self.max_concurrency)
+            self._semaphores[provider_name] = semaphore
+        return semaphore
+
+    def get_client(self, provider_name: str, base_url: str, api_key: str) -> "OpenAI":
+        """返回共享的同步 OpenAI 客户端，不存在或已关闭时创建。"""
+        # OpenAI SDK 导入较慢，首次创建客户端时才导入（启动后由 warmup 在后台预热）
+        from openai import OpenAI
+
+        key = self.key(provider_name, base_url, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None and not client.is_closed():
+                return client
+            transport = httpx.HTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_keepalive,
+                ),
+            )
+            http_client = httpx.Client(
+                transport=_LimitedTransport(transport, self._semaphore(provider_name)),
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+            )
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=self.max_retries,
+                http_client=http_client,
+            )
+            self._clients[key] = client
+            return client
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+
+llm_pool = LLMClientPool()
@@ -0,0 +1,178 @@
+"""数据画像：为每个 DataFrame 生成紧凑的列级概要，注入 Agent 指令。
+
+画像包含类型、缺失数、唯一值数、取值范围、标识符列判断和示例值，
+Agent 无需再调用 dtypes / head() / isna().sum() 做预检。每个数据版本
+（即每个上传得到的 DataFrame 对象）只计算一次，对象释放后缓存随之清除。
+"""
+import hashlib
+import re
+import uuid
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+# 中文列名包含这些完整词语时提示为标识符列（不含单独的「号」「卡」，避免误判「信号」「卡路里」）
+IDENTIFIER_TERMS = (
+    "编号", "编码", "代码", "证件号", "身份证", "卡号", "手机", "电话", "号码",
+    "工号", "学号", "账号", "帐号", "单号", "流水号",
+)
+# 英文列名按单词切分（下划线、空格、驼峰），出现这些完整单词时提示为标识符列
+IDENTIFIER_WORDS = frozenset({"id", "ids", "uuid", "no", "code", "phone", "mobile", "tel", "account"})
+_NAME_WORDS = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+# 整数形式的数字文本（允许 Excel / 浮点解析留下的 .0）
+_INTEGER_TEXT = re.compile(r"^\d+(\.0+)?$")
+_TRAILING_DECIMALS = re.compile(r"\.0+$")
+# 没有列名提示时，超过 8 位的整数视为标识符
+_IDENTIFIER_MIN_DIGITS = 9
+# 有列名提示时，取值至少 6 位、或几乎互不相同、或带前导零才确认为标识符
+_HINTED_MIN_DIGITS = 6
+_HINTED_UNIQUE_RATIO = 0.9
+
+SAMPLE_ROWS = 1000
+SAMPLE_VALUES = 3
+
+
+@dataclass
+class ColumnProfile:
+    name: str
+    dtype: str
+    nulls: int
+    unique: int
+    min: Optional[Any] = None
+    max: Optional[Any] = None
+    is_identifier: bool = False
+    samples: List[Any] = field(default_factory=list)
+
+
+@dataclass
+class DataFrameProfile:
+    rows: int
+    columns: List[ColumnProfile]
+    # 内容指纹：相同内容的数据（即使来自不同会话/上传）指纹相同
+    fingerprint: str = ""
+
+    @property
+    def identifier_columns(self) -> List[str]:
+        return [c.name for c in self.columns if c.is_identifier]
+
+
+def is_identifier_name(name: str) -> bool:
+    """列名提示：按完整词语匹配，只作为候选，还需 looks_like_identifier 用取值确认。"""
+    text = str(name)
+    if any(term in text for term in IDENTIFIER_TERMS):
+        return True
+    return any(word.lower() in IDENTIFIER_WORDS for word in _NAME_WORDS.findall(text))
+
+
+def looks_like_identifier(name: str, sample: pd.Series) -> bool:
+    """取值必须是整数形式；有列名提示时还需位数足够宽、几乎互不相同或带前导零，
+    没有提示时只认超过 8 位的整数。含小数的列（金额、余额等）一律不是标识符。"""
+    values = sample.dropna()
+    if values.empty or pd.api.types.is_bool_dtype(values):
+        return False
+    hinted = is_identifier_name(name)
+    if pd.api.types.is_numeric_dtype(values):
+        if not (values % 1 == 0).all():
+            return False
+        min_digits = len(f"{float(values.abs().min()):.0f}")
+        leading_zero = False
+    else:
+        text = values.astype(str).str.strip()
+        if not text.str.match(_INTEGER_TEXT).all():
+            # 有提示的字母数字编码（如 SO-001）本身就是文本；能解析为小数的仍视为度量值
+            return hinted and bool(pd.to_numeric(text, errors="coerce").isna().any())
+        integers = text.str.replace(_TRAILING_DECIMALS, "", regex=True)
+        min_digits = int(integers.str.len().min())
+        leading_zero = bool(((integers.str.len() > 1) & integers.str.startswith("0")).any())
+    if not hinted:
+        return min_digits >= _IDENTIFIER_MIN_DIGITS
+    distinct = len(values) > 1 and values.nunique() >= len(values) * _HINTED_UNIQUE_RATIO
+    return bool(min_digits >= _HINTED_MIN_DIGITS or distinct or leading_zero)
+
+
+def is_identifier_column(name: str, col: pd.Series, sample: Optional[pd.Series] = None) -> bool:
+    """上传规整和导出共用的整列判断：在 looks_like_identifier 基础上排除日期列，
+    并要求浮点列的全部取值（不只是样本）都是整数，避免误把度量值转为文本。"""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return False
+    if not looks_like_identifier(name, col.head(SAMPLE_ROWS) if sample is None else sample):
+        return False
+    if pd.api.types.is_float_dtype(col):
+        return bool((col.dropna() % 1 == 0).all())
+    return True
+
+
+def _short(value: Any, limit: int = 20) -> str:
+    text = f"{value:.6g}" if isinstance(value, float) else str(value)
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """基于列名、类型和逐行哈希的内容指纹；无法哈希的数据返回随机值（视为每次都不同）。"""
+    digest = hashlib.sha256()
+    digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode("utf-8"))
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    except TypeError:
+        return uuid.uuid4().hex
+    return digest.hexdigest()
+
+
+def compute_profile(df: pd.DataFrame) -> DataFrameProfile:
+    """以整表向量化运算计算缺失数、唯一值数和数值/日期列的取值范围。"""
+    nulls = df.isna().sum()
+    unique = df.nunique(dropna=True)
+    # 按位置选取数值/日期列，兼容重复列名
+    ranged_positions = [
+        i for i, dtype in enumerate(df.dtypes)
+        if (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype))
+        and not pd.api.types.is_bool_dtype(dtype)
+    ]
+    ranges = {}
+    if ranged_positions:
+        ranged = df.iloc[:, ranged_positions]
+        ranges = dict(zip(ranged_positions, zip(ranged.min().tolist(), ranged.max().tolist())))
+    head = df.head(SAMPLE_ROWS)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        sample = head.iloc[:, i]
+        columns.append(ColumnProfile(
+            name=str(name),
+            dtype=str(sample.dtype),
+            nulls=int(nulls.iloc[i]),
+            unique=int(unique.iloc[i]),
+            min=ranges.get(i, (None, None))[0],
+            max=ranges.get(i, (None, None))[1],
+            is_identifier=looks_like_identifier(name, sample),
+            samples=list(sample.dropna().unique()[:SAMPLE_VALUES]),
+        ))
+    return DataFrameProfile(rows=len(df), columns=columns, fingerprint=fingerprint(df))
+
+
+_profiles: Dict[int, DataFrameProfile] = {}
+
+
+def get_profile(df: pd.DataFrame) -> DataFrameProfile:
+    """返回 DataFrame 的画像，同一对象只计算一次。"""
+    key = id(df)
+    profile = _profiles.get(key)
+    if profile is None:
+        profile = compute_profile(df)
+        _profiles[key] = profile
+        weakref.finalize(df, _profiles.pop, key, None)
+    return profile
+
+
+def format_column(col: ColumnProfile) -> str:
+    parts = [f"{col.name}({col.dtype})", f"缺失 {col.nulls}", f"唯一 {col.unique}"]
+    if col.is_identifier:
+        # 标识符列不展示取值，既无分析意义也避免泄露卡号、手机号等信息
+        parts.append("[标识符]")
+    elif col.min is not None and not pd.isna(col.min):
+        parts.append(f"范围 [{_short(col.min)}, {_short(col.max)}]")
+    elif col.samples:
+        parts.append("示例: " + " / ".join(_short(v) for v in col.samples))
+    return ", ".join(parts)
@@ -0,0 +1,117 @@
+"""查询结果缓存：相同问题、相同数据、相同模型时直接回放上次的回答、工具步骤和产物。
+
+只缓存内容完全由数据决定的请求（一键分析的解读提示词），自由提问的回答依赖对话历史和
+会话中修改过的数据，不缓存。缓存键由规范化后的问题、各 DataFrame 的内容指纹、
+供应商/模型以及用户范围组成，不同用户之间不共享；每条缓存是一个子目录
+（entry.json + 产物副本），总大小超出上限时按 LRU 淘汰。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from config import QUERY_CACHE_DIR, QUERY_CACHE_MAX_BYTES
+from upload_cache import TEMP_SUFFIX, evict_lru
+
+_ENTRY = "entry.json"
+
+
+@dataclass
+class CachedResult:
+    query: str
+    answer: str
+    # 每个工具步骤: {"name", "input", "output", "attachment"}，attachment 为完整结果文件路径或 None
+    steps: List[Dict[str, Optional[str]]] = field(default_factory=list)
+    artifacts: List[str] = field(default_factory=list)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+def make_key(query: str, fingerprints: Dict[str, str], provider_name: str, model_id: str, scope: str) -> str:
+    """scope 为用户标识（未登录时为会话 ID），缓存结果只在该范围内回放。"""
+    payload = {
+        "scope": scope,
+        "query": normalize_query(query),
+        "data": sorted(fingerprints.items()),
+        "provider": provider_name,
+        "model": model_id,
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    def __init__(self, cache_dir: str = QUERY_CACHE_DIR, max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = max_bytes > 0
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        if not self.enabled:
+            return None
+        entry_dir = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry_dir, _ENTRY), "r", encoding="utf-8") as f:
+                result = CachedResult(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[结果缓存] 读取缓存失败 {key}: {e}")
+            return None
+
+        # 文件名相对于条目目录存储，读取时还原为绝对路径
+        result.artifacts = [os.path.join(entry_dir, name) for name in result.artifacts]
+        for step in result.steps:
+            if step.get("attachment"):
+                step["attachment"] = os.path.join(entry_dir, step["attachment"])
+        os.utime(entry_dir)
+        return result
+
+    def put(self, key: str, result: CachedResult):
+        """保存结果并复制产物文件；产物缺失时不缓存，避免回放不完整的结果。"""
+        if not self.enabled:
+            return
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 每次写入使用独立的暂存目录，并发写入同一条目时互不删除
+            tmp_dir = tempfile.mkdtemp(prefix=f"{key}.", suffix=TEMP_SUFFIX, dir=self.cache_dir)
+            stored = asdict(result)
+
+            def _copy(path: str, index: int) -> str:
+                # 每个文件放在独立编号子目录中，保留原文件名用于显示
+                name = os.path.join(f"{index:03d}", os.path.basename(path))
+                os.makedirs(os.path.join(tmp_dir, f"{index:03d}"))
+                shutil.copy2(path, os.path.join(tmp_dir, name))
+                return name
+
+            stored["artifacts"] = [_copy(path, i) for i, path in enumerate(result.artifacts)]
+            offset = len(result.artifacts)
+            for i, step in enumerate(stored["steps"]):
+                if step.get("attachment"):
+                    step["attachment"] = _copy(step["attachment"], offset + i)
+
+            with open(os.path.join(tmp_dir, _ENTRY), "w", encoding="utf-8") as f:
+                json.dump(stored, f, ensure_ascii=False)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            try:
+                os.replace(tmp_dir, entry_dir)
+            except OSError:
+                # 另一个会话刚写入了同一条目，保留对方的结果
+                if not os.path.isdir(entry_dir):
+                    raise
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception as e:
+            print(f"[结果缓存] 写入缓存失败 {key}: {e}")
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        evict_lru(self.cache_dir, self.max_bytes, "结果缓存")
+
+
+query_cache = QueryCache()
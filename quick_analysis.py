@@ -0,0 +1,148 @@
+"""一键分析：确定性地计算数据概览、描述统计、异常值和默认图表。
+
+各 sheet 在线程池中并行计算，统计量均为整表向量化运算；
+LLM 只需基于这里生成的摘要撰写分析结论，无需再逐步写代码计算。
+"""
+import asyncio
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+from profiling import get_profile
+
+MAX_DESCRIBE_COLUMNS = 30
+MAX_HISTOGRAMS = 4
+# 直方图在服务端分箱，图表中只保存各箱的计数，大小与行数无关
+MAX_HISTOGRAM_BINS = 50
+MAX_BAR_CHARTS = 2
+MAX_CATEGORIES = 50
+MAX_HEATMAP_COLUMNS = 20
+Z_THRESHOLD = 3.0
+
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+@dataclass
+class SheetReport:
+    name: str
+    summary: str
+    charts: List[str] = field(default_factory=list)
+
+
+def _safe_name(text: str) -> str:
+    return _UNSAFE_FILENAME.sub("_", str(text)).strip("_") or "sheet"
+
+
+def _write_chart(fig, chart_dir: str, filename: str) -> str:
+    path = os.path.join(chart_dir, f"{_safe_name(filename)}.plotly.json")
+    pio.write_json(fig, path)
+    return path
+
+
+def _histogram(px, values: pd.Series, title: str, x_title: str):
+    """用 np.histogram 预先分箱后以柱状图绘制；没有有限值时返回 None。"""
+    data = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    data = data[np.isfinite(data)]
+    if data.size == 0:
+        return None
+    edges = np.histogram_bin_edges(data, bins="auto")
+    if len(edges) - 1 > MAX_HISTOGRAM_BINS:
+        edges = np.histogram_bin_edges(data, bins=MAX_HISTOGRAM_BINS)
+    counts, edges = np.histogram(data, bins=edges)
+    fig = px.bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, title=title)
+    fig.update_traces(
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate="[%{customdata[0]:.4g}, %{customdata[1]:.4g})<br>频数 %{y}<extra></extra>",
+    )
+    fig.update_layout(xaxis_title=x_title, yaxis_title="频数", bargap=0)
+    return fig
+
+
+def analyze_sheet(name: str, df: pd.DataFrame, chart_dir: str) -> SheetReport:
+    """计算单个 sheet 的概览、描述统计、IQR / z-score 异常值，并生成默认图表。"""
+    import plotly.express as px
+
+    profile = get_profile(df)
+    identifiers = set(profile.identifier_columns)
+    # 重复列名无法按名称选取，只保留第一次出现的列；标识符列不参与统计
+    data = df.loc[:, ~df.columns.duplicated()]
+    data = data[[c for c in data.columns if str(c) not in identifiers]]
+    numeric = data.select_dtypes(include="number", exclude="bool")
+    categorical = [
+        c for c in data.columns
+        if c not in numeric.columns and 1 < data[c].nunique(dropna=True) <= MAX_CATEGORIES
+    ]
+
+    lines = [
+        f"### {name}",
+        f"- 行数: {len(df):,}，列数: {df.shape[1]}，重复行: {int(df.duplicated().sum()):,}，"
+        f"缺失值总数: {int(df.isna().sum().sum()):,}",
+    ]
+    if identifiers:
+        lines.append(f"- 标识符列（未参与统计）: {', '.join(sorted(identifiers))}")
+    missing = df.isna().sum()
+    missing = missing[missing > 0]
+    if not missing.empty:
+        lines.append("- 缺失值: " + ", ".join(f"{col} {int(n):,}" for col, n in missing.items()))
+
+    if not numeric.empty:
+        described = numeric.iloc[:, :MAX_DESCRIBE_COLUMNS].describe().T.round(4)
+        lines += ["", "**描述统计**", "", described.to_markdown()]
+
+        q1 = numeric.quantile(0.25)
+        q3 = numeric.quantile(0.75)
+        iqr = q3 - q1
+        iqr_outliers = ((numeric < q1 - 1.5 * iqr) | (numeric > q3 + 1.5 * iqr)).sum()
+        std = numeric.std(ddof=0).replace(0, float("nan"))
+        z_outliers = ((numeric - numeric.mean()).abs().div(std) > Z_THRESHOLD).sum()
+        outliers = pd.DataFrame({"IQR 异常值": iqr_outliers, f"z-score>{Z_THRESHOLD:g} 异常值": z_outliers})
+        outliers = outliers[(outliers > 0).any(axis=1)]
+        if outliers.empty:
+            lines += ["", "**异常值检测**: 未发现 IQR 或 z-score 异常值"]
+        else:
+            lines += ["", "**异常值检测**（1.5×IQR 与 z-score）", "", outliers.to_markdown()]
+
+    charts = []
+    for col in list(numeric.columns)[:MAX_HISTOGRAMS]:
+        fig = _histogram(px, numeric[col], f"{name} - {col} 分布", str(col))
+        if fig is not None:
+            charts.append(_write_chart(fig, chart_dir, f"{name}_{col}_分布"))
+    for col in categorical[:MAX_BAR_CHARTS]:
+        counts = data[col].value_counts().head(20)
+        fig = px.bar(x=counts.index.astype(str), y=counts.values, title=f"{name} - {col} 计数（前 20）")
+        fig.update_layout(xaxis_title=str(col), yaxis_title="计数")
+        charts.append(_write_chart(fig, chart_dir, f"{name}_{col}_计数"))
+    if numeric.shape[1] >= 2:
+        corr = numeric.iloc[:, :MAX_HEATMAP_COLUMNS].corr().round(2)
+        fig = px.imshow(corr, text_auto=True, color_continuous_scale="RdBu_r", zmin=-1, zmax=1,
+                        title=f"{name} - 数值列相关系数")
+        charts.append(_write_chart(fig, chart_dir, f"{name}_相关系数"))
+
+    return SheetReport(name=name, summary="\n".join(lines), charts=charts)
+
+
+async def analyze_all(dataframes: Dict[str, pd.DataFrame], chart_dir: str) -> List[SheetReport]:
+    """并行分析所有 sheet，保持原有顺序返回。"""
+    os.makedirs(chart_dir, exist_ok=True)
+    return list(await asyncio.gather(
+        *(asyncio.to_thread(analyze_sheet, name, df, chart_dir) for name, df in dataframes.items())
+    ))
+
+
+def build_narrative_prompt(reports: List[SheetReport]) -> str:
+    """让 LLM 基于预计算结果撰写结论的提示词。"""
+    sections = "\n\n".join(report.summary for report in reports)
+    chart_count = sum(len(report.charts) for report in reports)
+    return (
+        "以下是系统已经对全部数据完成的计算结果（数据概览、描述统计、异常值检测），"
+        f"并已生成 {chart_count} 张可视化图表展示给用户。"
+        "请直接基于这些结果撰写全面的数据分析结论：概括数据整体情况，指出值得关注的分布特征、缺失和异常值，"
+        "并给出有数据支撑的发现。不要再调用工具重复计算这些统计量，也不要再生成图表。\n\n"
+        f"{sections}"
+    )
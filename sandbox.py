@@ -0,0 +1,447 @@
+"""沙箱执行池：在预热的独立进程中执行 Agent 生成的 Python 代码。
+
+每个会话独占一个工作进程，进程启动时已导入 pandas / numpy / plotly，
+会话的 DataFrame 通过管道同步到进程中，代码对其所做的修改随结果传回。
+代码执行受 CPU 时间、内存和超时限制，超时或崩溃的进程会被终止并替换，
+不会拖慢 Chainlit 服务进程；进程总数有上限，空闲的会话进程会被回收。
+
+Agent 使用的 SandboxPythonTools 在 sandbox_tools 中，创建 Agent 时才导入，
+服务启动时只加载这里的进程池，不导入 agno 的 PythonTools。
+"""
+import builtins
+import multiprocessing as mp
+import threading
+import time
+import weakref
+from types import ModuleType
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from agno.utils.log import log_info
+
+from config import (
+    SANDBOX_CPU_SECONDS,
+    SANDBOX_IDLE_SECONDS,
+    SANDBOX_MAX_WORKERS,
+    SANDBOX_MEMORY_MB,
+    SANDBOX_WARM_WORKERS,
+)
+
+try:
+    import resource
+except ImportError:  # Windows 不支持 CPU/内存限制，仅保留超时
+    resource = None
+
+
+class SandboxError(Exception):
+    pass
+
+
+def _set_cpu_limit(cpu_seconds: int):
+    """RLIMIT_CPU 按进程累计计时，每次执行前在已用时间基础上顺延。"""
+    if resource is None or cpu_seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _set_memory_limit(memory_mb: int):
+    if resource is None or memory_mb <= 0:
+        return
+    limit = memory_mb * 1024 * 1024
+    _soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+class _ModuleRef(NamedTuple):
+    """模块不能 pickle，按名称发送到工作进程后重新导入。"""
+    name: str
+
+
+def portable_globals(safe_globals: Dict[str, Any]) -> Dict[str, Any]:
+    """把 PythonTools 的 safe_globals 转为可发送到工作进程的形式。"""
+    portable = {}
+    for name, value in safe_globals.items():
+        if value is builtins or value is builtins.__dict__:
+            portable[name] = _ModuleRef("builtins")
+        elif isinstance(value, ModuleType):
+            portable[name] = _ModuleRef(value.__name__)
+        else:
+            portable[name] = value
+    return portable
+
+
+def _frame_state(value) -> tuple:
+    """DataFrame 的结构快照，执行后据此判断是否被修改，不扫描数据。
+
+    快照保存坐标轴对象和一份浅拷贝：浅拷贝与原对象共享数据块，CoW 下对原对象的
+    任何原地写入都会先复制出新的数据块，所以坐标轴和各数据块的引用记录都未变时
+    内容一定未变，耗时与数据量无关。CoW 不可用时退化为内容指纹。
+    """
+    from snapshot import COPY_ON_WRITE
+
+    if not COPY_ON_WRITE:
+        from profiling import fingerprint
+
+        return id(value), fingerprint(value)
+    names = (tuple(value.index.names), tuple(value.columns.names))
+    return id(value), tuple(value.axes), names, value.copy(deep=False)
+
+
+def _frame_unchanged(value, state: tuple) -> bool:
+    from snapshot import COPY_ON_WRITE
+
+    if id(value) != state[0]:
+        return False
+    if not COPY_ON_WRITE:
+        from profiling import fingerprint
+
+        return fingerprint(value) == state[1]
+    _id, axes, names, reference = state
+    if any(a is not b for a, b in zip(value.axes, axes)):
+        return False
+    if (tuple(value.index.names), tuple(value.columns.names)) != names:
+        return False
+    blocks, reference_blocks = value._mgr.blocks, reference._mgr.blocks
+    return len(blocks) == len(reference_blocks) and all(
+        block.refs is ref.refs for block, ref in zip(blocks, reference_blocks)
+    )
+
+
+def _changed_frames(scope: Dict[str, Any], watched: Dict[str, tuple]) -> Dict[str, Any]:
+    """执行后检查父进程同步过来的 DataFrame，返回被原地修改或重新赋值的变量。"""
+    import pandas as pd
+
+    changed = {}
+    for name, old in watched.items():
+        value = scope.get(name)
+        if not isinstance(value, pd.DataFrame) or _frame_unchanged(value, old):
+            continue
+        changed[name] = value
+        watched[name] = _frame_state(value)
+    return changed
+
+
+def _result(scope: Dict[str, Any], variable_to_return: Optional[str], default: str) -> str:
+    if not variable_to_return:
+        return default
+    if variable_to_return not in scope:
+        return f"Variable {variable_to_return} not found"
+    return str(scope[variable_to_return])
+
+
+def _worker_main(conn, cpu_seconds: int, memory_mb: int):
+    """工作进程主循环：预先导入常用库，然后逐条处理父进程的请求。
+
+    执行代码的命名空间由父进程发送的 safe_globals 和 safe_locals 组成；
+    exec / run_file 的结果附带被修改过的会话 DataFrame，由父进程同步回其他工具。
+    """
+    import importlib
+    import runpy
+
+    import numpy as np  # noqa: F401
+    import pandas as pd
+    import plotly.express as px  # noqa: F401
+    import plotly.graph_objects as go  # noqa: F401
+    import plotly.io  # noqa: F401  预热 pio.write_json
+
+    import export  # noqa: F401
+    from warmup import warm_plotly
+
+    # 首次绘图的模板加载与校验器初始化在空闲时完成
+    warm_plotly()
+
+    namespace: Dict[str, Any] = {"__builtins__": builtins}
+    # 父进程同步过来的 DataFrame 变量名 -> 结构快照（见 _frame_state）
+    watched: Dict[str, tuple] = {}
+    _set_memory_limit(memory_mb)
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        op = request[0]
+        try:
+            if op == "globals":
+                namespace.update({
+                    name: importlib.import_module(value.name) if isinstance(value, _ModuleRef) else value
+                    for name, value in request[1].items()
+                })
+                conn.send(("ok", None))
+            elif op == "set":
+                namespace.update(request[1])
+                for name, value in request[1].items():
+                    if isinstance(value, pd.DataFrame):
+                        watched[name] = _frame_state(value)
+                    else:
+                        watched.pop(name, None)
+                conn.send(("ok", None))
+            elif op == "del":
+                for name in request[1]:
+                    namespace.pop(name, None)
+                    watched.pop(name, None)
+                conn.send(("ok", None))
+            elif op == "exec":
+                _op, code, variable_to_return = request
+                _set_cpu_limit(cpu_seconds)
+                exec(code, namespace)
+                output = _result(namespace, variable_to_return, "successfully ran python code")
+                conn.send(("ok", (output, _changed_frames(namespace, watched))))
+            elif op == "run_file":
+                _op, file_path, variable_to_return = request
+                _set_cpu_limit(cpu_seconds)
+                globals_after_run = runpy.run_path(file_path, init_globals=namespace, run_name="__main__")
+                output = _result(globals_after_run, variable_to_return, f"successfully ran {file_path}")
+                conn.send(("ok", (output, _changed_frames(globals_after_run, watched))))
+            else:
+                conn.send(("error", f"unknown request: {op}"))
+        except BaseException as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class SandboxWorker:
+    def __init__(self):
+        ctx = mp.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, SANDBOX_CPU_SECONDS, SANDBOX_MEMORY_MB),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.cancelled = False
+
+    def request(self, message: tuple, timeout: Optional[float] = None) -> Any:
+        """发送请求并等待结果；超时或进程退出时终止进程并抛出 SandboxError。"""
+        try:
+            self._conn.send(message)
+            if not self._conn.poll(timeout):
+                self.kill()
+                raise SandboxError(f"执行超时（{timeout:.0f} 秒），已终止")
+            status, payload = self._conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            exitcode = self.process.exitcode
+            self.kill()
+            if self.cancelled:
+                raise SandboxError("执行已被用户取消")
+            raise SandboxError(f"执行进程异常退出（exitcode={exitcode}），可能超出了 CPU 时间或内存限制")
+        if status == "error":
+            raise SandboxError(payload)
+        return payload
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def cancel(self):
+        """由其他线程调用：结束进程，正在等待结果的 request() 随即抛出 SandboxError。
+
+        只终止进程、不关闭管道，管道由等待中的线程在 request() 中关闭。
+        """
+        self.cancelled = True
+        if self.process.is_alive():
+            self.process.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self._conn.close()
+
+
+class WorkerHandle:
+    """会话与工作进程的绑定，由 SandboxPool 在锁内维护。
+
+    busy 表示正在执行代码，执行中的进程不会被回收；last_used 用于空闲回收和达到上限时选择回收对象。
+    """
+
+    def __init__(self):
+        self.worker: Optional[SandboxWorker] = None
+        self.busy = False
+        self.last_used = time.monotonic()
+
+
+class SandboxPool:
+    """维护若干预热的空闲工作进程，会话取走后在后台补充。
+
+    会话占用的工作进程合计不超过 max_workers，达到上限时回收最久未使用的空闲会话进程，
+    全部在执行时等待；空闲超过 idle_seconds 的会话进程由后台线程回收。被回收的会话
+    下次执行时换用新进程，会话数据重新同步。
+    """
+
+    def __init__(
+        self,
+        warm_workers: int = SANDBOX_WARM_WORKERS,
+        max_workers: int = SANDBOX_MAX_WORKERS,
+        idle_seconds: float = SANDBOX_IDLE_SECONDS,
+    ):
+        self.warm_workers = warm_workers
+        self.max_workers = max(1, max_workers)
+        self.idle_seconds = idle_seconds
+        self._spares: List[SandboxWorker] = []
+        self._lock = threading.Lock()
+        self._refilling = False
+        # 会话进程的占用情况：_handles 中绑定了进程的会话 + 正在启动的进程数
+        self._handles: "weakref.WeakSet[WorkerHandle]" = weakref.WeakSet()
+        self._starting = 0
+        self._changed = threading.Condition(self._lock)
+        self._reaper: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def warm(self):
+        """在后台线程中补足空闲进程。"""
+        with self._lock:
+            if self._refilling or len(self._spares) >= self.warm_workers:
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill, daemon=True).start()
+
+    def _refill(self):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._spares) >= self.warm_workers:
+                        return
+                worker = SandboxWorker()
+                with self._lock:
+                    self._spares.append(worker)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def acquire(self) -> SandboxWorker:
+        with self._lock:
+            while self._spares:
+                worker = self._spares.pop()
+                if worker.alive:
+                    break
+            else:
+                worker = None
+        self.warm()
+        return worker or SandboxWorker()
+
+    @property
+    def active(self) -> int:
+        """会话占用的工作进程数（不含预热的空闲进程）。"""
+        with self._lock:
+            return self._active()
+
+    def _active(self) -> int:
+        return sum(1 for handle in self._handles if handle.worker is not None) + self._starting
+
+    def _detach(self, handle: WorkerHandle) -> Optional[SandboxWorker]:
+        worker, handle.worker = handle.worker, None
+        self._changed.notify_all()
+        return worker
+
+    def checkout(self, handle: WorkerHandle, timeout: Optional[float] = None) -> SandboxWorker:
+        """标记会话开始执行并返回它的工作进程，没有可用进程时在上限内分配一个。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        victim = None
+        with self._lock:
+            self._handles.add(handle)
+            handle.busy = True
+            if handle.worker is not None and handle.worker.alive:
+                return handle.worker
+            handle.worker = None
+            while self._active() >= self.max_workers:
+                idle = [h for h in self._handles if h.worker is not None and not h.busy]
+                if idle:
+                    victim = self._detach(min(idle, key=lambda h: h.last_used))
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    handle.busy = False
+                    raise SandboxError(f"沙箱进程已达上限（{self.max_workers} 个）且都在执行中，请稍后重试")
+                self._changed.wait(remaining)
+            self._starting += 1
+        if victim is not None:
+            log_info("Sandbox worker limit reached, reclaiming the least recently used idle worker")
+            victim.kill()
+        self._start_reaper()
+        try:
+            worker = self.acquire()
+        except BaseException:
+            with self._lock:
+                self._starting -= 1
+                handle.busy = False
+                self._changed.notify_all()
+            raise
+        with self._lock:
+            self._starting -= 1
+            handle.worker = worker
+        return worker
+
+    def checkin(self, handle: WorkerHandle):
+        """标记会话执行结束；进程已退出（超时、取消、崩溃）时释放名额。"""
+        with self._lock:
+            handle.busy = False
+            handle.last_used = time.monotonic()
+            if handle.worker is not None and not handle.worker.alive:
+                handle.worker = None
+            self._changed.notify_all()
+
+    def release(self, handle: WorkerHandle):
+        """会话结束：终止它的工作进程。"""
+        with self._lock:
+            self._handles.discard(handle)
+            worker = self._detach(handle)
+        if worker is not None:
+            worker.kill()
+
+    def reclaim_idle(self) -> int:
+        """回收空闲超过 idle_seconds 的会话进程，返回回收数量。"""
+        if self.idle_seconds <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            victims = [
+                self._detach(handle) for handle in list(self._handles)
+                if handle.worker is not None and not handle.busy
+                and now - handle.last_used >= self.idle_seconds
+            ]
+        for worker in victims:
+            worker.kill()
+        if victims:
+            log_info(f"Reclaimed {len(victims)} idle sandbox worker(s)")
+        return len(victims)
+
+    def _start_reaper(self):
+        if self.idle_seconds <= 0:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, name="sandbox-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        interval = min(60.0, max(1.0, self.idle_seconds / 4))
+        while not self._stopped.wait(interval):
+            self.reclaim_idle()
+
+    def shutdown(self):
+        self._stopped.set()
+        with self._lock:
+            spares, self._spares = self._spares, []
+            spares += [self._detach(handle) for handle in list(self._handles) if handle.worker is not None]
+        for worker in spares:
+            worker.kill()
+
+
+sandbox_pool = SandboxPool()
+
+# 工作进程被替换后，下一次执行结果前附加的说明，让模型知道之前定义的变量已不存在
+STATE_RESET_NOTE = (
+    "注意：沙箱进程已重启（执行超时、被取消、崩溃或空闲回收），之前代码中定义的变量和导入已丢失，"
+    "需要时请重新计算；会话数据以及对其所做的修改仍然可用。"
+)
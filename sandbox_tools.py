@@ -0,0 +1,160 @@
+"""沙箱版 PythonTools：Agent 代码发送到 sandbox 的工作进程中执行。
+
+依赖 agno 的 PythonTools，导入较慢，由 agent_setup 在创建 Agent 时导入。
+"""
+import threading
+import weakref
+from typing import Any, Callable, Dict, Optional
+
+from agno.tools.python import PythonTools
+from agno.utils.log import log_debug, log_info, logger
+
+from config import SANDBOX_TIMEOUT
+import sandbox
+from sandbox import STATE_RESET_NOTE, SandboxError, SandboxPool, SandboxWorker, portable_globals, WorkerHandle
+
+
+class SandboxPythonTools(PythonTools):
+    """在沙箱进程中执行代码的 PythonTools。
+
+    safe_globals 在工作进程启动后发送一次，safe_locals 中的变量（会话 DataFrame、CHART_DIR 等）
+    在每次执行前同步到工作进程，只发送新增或被替换的变量。代码修改或重新赋值的会话
+    DataFrame 随执行结果传回，更新 safe_locals 并通过 on_frames_changed 通知其他工具。
+    """
+
+    def __init__(self, pool: Optional[SandboxPool] = None, timeout: float = SANDBOX_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        self._pool = pool = pool or sandbox.sandbox_pool
+        self._timeout = timeout
+        self._handle = WorkerHandle()
+        # 当前工作进程，以及已同步到其中的变量名 -> 对象
+        self._current: Optional[SandboxWorker] = None
+        self._synced: Dict[str, Any] = {}
+        # 已在错误信息中告知模型进程被重启，换用新进程时不再重复说明
+        self._reset_reported = False
+        self.on_frames_changed: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._lock = threading.Lock()
+        weakref.finalize(self, pool.release, self._handle)
+
+    def _sync(self, worker: SandboxWorker) -> str:
+        """把变量同步到工作进程；换用了新进程时返回需要告知模型的说明。"""
+        note = ""
+        if worker is not self._current:
+            if self._current is not None and not self._reset_reported:
+                note = STATE_RESET_NOTE + "\n\n"
+            self._current = worker
+            self._synced = {}
+            self._reset_reported = False
+            worker.request(("globals", portable_globals(self.safe_globals)))
+
+        changed = {
+            name: value for name, value in self.safe_locals.items()
+            if name not in self._synced or self._synced[name] is not value
+        }
+        removed = [name for name in self._synced if name not in self.safe_locals]
+        if changed:
+            worker.request(("set", changed))
+            self._synced.update(changed)
+        if removed:
+            worker.request(("del", removed))
+            for name in removed:
+                self._synced.pop(name)
+        return note
+
+    def _adopt(self, frames: Dict[str, Any]):
+        if not frames:
+            return
+        self.safe_locals.update(frames)
+        self._synced.update(frames)
+        if self.on_frames_changed is not None:
+            self.on_frames_changed(frames)
+
+    def _dispatch(self, message: tuple) -> str:
+        with self._lock:
+            worker = self._pool.checkout(self._handle, timeout=self._timeout)
+            try:
+                note = self._sync(worker)
+                output, frames = worker.request(message, timeout=self._timeout)
+                self._adopt(frames)
+                return note + output
+            except SandboxError as e:
+                if worker.alive or worker.cancelled:
+                    raise
+                self._reset_reported = True
+                raise SandboxError(f"{e}\n{STATE_RESET_NOTE}") from e
+            finally:
+                self._pool.checkin(self._handle)
+
+    def cancel(self):
+        """终止正在执行的代码（由其他线程调用），下次执行时换用新的工作进程。"""
+        worker = self._handle.worker
+        # 只在有代码正在执行时终止，空闲的工作进程保留给后续执行
+        if worker is not None and self._lock.locked():
+            worker.cancel()
+
+    def run_python_code(self, code: str, variable_to_return: Optional[str] = None) -> str:
+        """This function to runs Python code in the current environment.
+        If successful, returns the value of `variable_to_return` if provided otherwise returns a success message.
+        If failed, returns an error message.
+
+        Returns the value of `variable_to_return` if successful, otherwise returns an error message.
+
+        :param code: The code to run.
+        :param variable_to_return: The variable to return.
+        :return: value of `variable_to_return` if successful, otherwise returns an error message.
+        """
+        try:
+            log_debug(f"Running code in sandbox:\n\n{code}\n\n")
+            return self._dispatch(("exec", code, variable_to_return))
+        except Exception as e:
+            logger.warning(f"Error running python code: {e}")
+            return f"Error running python code: {e}"
+
+    def save_to_file_and_run(
+        self, file_name: str, code: str, variable_to_return: Optional[str] = None, overwrite: bool = True
+    ) -> str:
+        """This function saves Python code to a file called `file_name` and then runs it.
+        If successful, returns the value of `variable_to_return` if provided otherwise returns a success message.
+        If failed, returns an error message.
+
+        Make sure the file_name ends with `.py`
+
+        :param file_name: The name of the file the code will be saved to.
+        :param code: The code to save and run.
+        :param variable_to_return: The variable to return.
+        :param overwrite: Overwrite the file if it already exists.
+        :return: if run is successful, the value of `variable_to_return` if provided else file name.
+        """
+        try:
+            safe, file_path = self._check_path(file_name, self.base_dir, self.restrict_to_base_dir)
+            if not safe:
+                return f"Error: Path '{file_name}' is outside the allowed base directory"
+            if not file_path.parent.exists():
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+            if file_path.exists() and not overwrite:
+                return f"File {file_name} already exists"
+            file_path.write_text(code, encoding="utf-8")
+            log_info(f"Running {file_path} in sandbox")
+            return self._dispatch(("run_file", str(file_path), variable_to_return))
+        except Exception as e:
+            logger.warning(f"Error saving and running code: {e}")
+            return f"Error saving and running code: {e}"
+
+    def run_python_file_return_variable(self, file_name: str, variable_to_return: Optional[str] = None) -> str:
+        """This function runs code in a Python file.
+        If successful, returns the value of `variable_to_return` if provided otherwise returns a success message.
+        If failed, returns an error message.
+
+        :param file_name: The name of the file to run.
+        :param variable_to_return: The variable to return.
+        :return: if run is successful, the value of `variable_to_return` if provided else file name.
+        """
+        try:
+            safe, file_path = self._check_path(file_name, self.base_dir, self.restrict_to_base_dir)
+            if not safe:
+                return f"Error: Path '{file_name}' is outside the allowed base directory"
+            log_info(f"Running {file_path} in sandbox")
+            return self._dispatch(("run_file", str(file_path), variable_to_return))
+        except Exception as e:
+            logger.warning(f"Error running file: {e}")
+            return f"Error running file: {e}"
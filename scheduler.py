@@ -0,0 +1,186 @@
+"""运行调度：限制 Agent 运行的全局与单会话并发数，超出的请求排队并可随时取消。
+
+排队按会话轮转（每个会话每轮最多放行一个请求），单个会话连续提交多个请求时
+不会挤占其他会话；按会话而不是登录用户计数，共用同一账号的多个浏览器会话互不限制。
+等待中的请求可获知自己的排队位置。运行在专用线程池中执行，
+线程数等于全局并发上限，不与 asyncio.to_thread 等其他任务争用默认线程池。
+调度状态只在事件循环线程中修改，不需要加锁。
+"""
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from config import RUN_MAX_CONCURRENCY, RUN_MAX_PER_SESSION, RUN_MAX_QUEUED, RUN_MAX_QUEUED_PER_SESSION
+from telemetry import registry
+
+RUNS_QUEUED = registry.gauge("agent_runs_queued", "Agent runs waiting for a slot")
+RUNS_ACTIVE = registry.gauge("agent_runs_active", "Agent runs currently executing")
+RUNS_REJECTED = registry.counter("agent_runs_rejected_total", "Agent runs rejected by admission control", ("reason",))
+
+
+class SchedulerFull(Exception):
+    """排队已满，拒绝新的运行请求。"""
+
+
+class RunCancelled(Exception):
+    """运行在排队期间被取消。"""
+
+
+class RunTicket:
+    """一次运行请求：排队 → 运行 → 结束。运行开始后 cancel() 依次调用注册的取消回调。"""
+
+    def __init__(self, scheduler: "RunScheduler", session_id: str):
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.state = "queued"
+        self.admitted: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._cancel_callbacks: List[Callable[[], None]] = []
+        self.cancelled = False
+
+    def add_cancel_callback(self, callback: Callable[[], None]):
+        self._cancel_callbacks.append(callback)
+
+    async def wait(self, on_position: Optional[Callable[[int], Awaitable[None]]] = None):
+        """等待轮到本次运行；排队位置变化时调用 on_position（从 1 开始）。被取消时抛出 RunCancelled。"""
+        last = None
+        while not self.admitted.done():
+            position = self.scheduler.position(self)
+            if on_position is not None and position != last:
+                last = position
+                await on_position(position)
+            await asyncio.wait({self.admitted, self.scheduler.changed}, return_when=asyncio.FIRST_COMPLETED)
+        self.admitted.result()
+
+    def cancel(self):
+        """取消排队中的请求，或停止运行中的 Agent 及其工具执行。可重复调用。"""
+        if self.cancelled or self.state == "done":
+            return
+        self.cancelled = True
+        if self.state == "queued":
+            self.scheduler.release(self)
+            return
+        for callback in self._cancel_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[运行调度] 取消回调出错: {e}")
+
+
+class RunScheduler:
+    def __init__(
+        self,
+        max_concurrent: int = RUN_MAX_CONCURRENCY,
+        max_per_session: int = RUN_MAX_PER_SESSION,
+        max_queued: int = RUN_MAX_QUEUED,
+        max_queued_per_session: int = RUN_MAX_QUEUED_PER_SESSION,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.max_queued = max_queued
+        self.max_queued_per_session = max_queued_per_session
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="agent-run")
+        self._running: Dict[str, int] = {}
+        # 会话 -> 排队中的请求；键的顺序即轮转顺序
+        self._queues: "OrderedDict[str, Deque[RunTicket]]" = OrderedDict()
+        self._changed: Optional[asyncio.Future] = None
+
+    @property
+    def active(self) -> int:
+        return sum(self._running.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    @property
+    def changed(self) -> asyncio.Future:
+        """排队状态下次变化时完成的 Future，所有等待者共享。"""
+        if self._changed is None or self._changed.done():
+            self._changed = asyncio.get_running_loop().create_future()
+        return self._changed
+
+    def _notify(self):
+        if self._changed is not None and not self._changed.done():
+            self._changed.set_result(None)
+        RUNS_QUEUED.set(self.queued)
+        RUNS_ACTIVE.set(self.active)
+
+    def submit(self, session_id: str) -> RunTicket:
+        """登记一次运行请求；有空闲名额时立即放行，否则排队。排队已满时抛出 SchedulerFull。"""
+        queue = self._queues.get(session_id)
+        if self.queued >= self.max_queued:
+            RUNS_REJECTED.inc(reason="queue_full")
+            raise SchedulerFull("当前排队的任务过多，请稍后再试")
+        if queue is not None and len(queue) >= self.max_queued_per_session:
+            RUNS_REJECTED.inc(reason="session_queue_full")
+            raise SchedulerFull(f"当前对话已有 {len(queue)} 个任务在排队，请等待完成后再提交")
+
+        ticket = RunTicket(self, session_id)
+        self._queues.setdefault(session_id, deque()).append(ticket)
+        self._dispatch()
+        self._notify()
+        return ticket
+
+    def release(self, ticket: RunTicket):
+        """运行结束（或排队中取消）时调用，释放名额并放行后续请求。可重复调用。"""
+        if ticket.state == "running":
+            self._running[ticket.session_id] -= 1
+            if not self._running[ticket.session_id]:
+                del self._running[ticket.session_id]
+        elif ticket.state == "queued":
+            queue = self._queues.get(ticket.session_id)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.session_id]
+            if not ticket.admitted.done():
+                ticket.admitted.set_exception(RunCancelled())
+                # 调用方可能已不再等待，避免未取回异常的警告
+                ticket.admitted.exception()
+        else:
+            return
+        ticket.state = "done"
+        self._dispatch()
+        self._notify()
+
+    def _dispatch(self):
+        """按会话轮转放行排队请求，直到没有空闲名额或没有可放行的会话。"""
+        while self.active < self.max_concurrent:
+            session_id = next(
+                (sid for sid in self._queues if self._running.get(sid, 0) < self.max_per_session), None
+            )
+            if session_id is None:
+                return
+            queue = self._queues.pop(session_id)
+            ticket = queue.popleft()
+            if queue:
+                # 移到队尾，下一轮先轮到其他会话
+                self._queues[session_id] = queue
+            self._running[session_id] = self._running.get(session_id, 0) + 1
+            ticket.state = "running"
+            ticket.admitted.set_result(None)
+
+    def position(self, ticket: RunTicket) -> int:
+        """按轮转顺序估算的排队位置（从 1 开始）；已放行或已取消返回 0。"""
+        if ticket.state != "queued":
+            return 0
+        queue = self._queues.get(ticket.session_id)
+        if queue is None or ticket not in queue:
+            return 0
+        index = queue.index(ticket)
+        position = 0
+        # 第 r 轮依次放行每个会话的第 r 个请求
+        for r in range(index + 1):
+            for other in self._queues.values():
+                if r < len(other):
+                    position += 1
+                    if other[r] is ticket:
+                        return position
+        return position
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+run_scheduler = RunScheduler()
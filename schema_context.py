@@ -0,0 +1,164 @@
+"""数据上下文：在 token 预算内生成「当前可用的数据」一节，并提供按需查询列信息的工具。
+
+sheet 多、列多时逐级压缩：完整列画像 → 每个 sheet 一行列清单 → 截断的列清单，
+被省略的列由 Agent 通过 SchemaTools.describe_columns 按需获取。
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from agno.tools import Toolkit
+
+from config import SCHEMA_TOKEN_BUDGET
+from large_data import LARGE_TABLE_USAGE, LargeTableInfo, large_table_header
+from profiling import DataFrameProfile, format_column, get_profile
+
+_CJK = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+NO_DATA = "  暂无数据"
+TRUNCATED_NOTE = "  （部分列信息已省略，需要时调用 SchemaTools 的 `describe_columns` 查看完整列信息）"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文字符约 1 token，其余约 4 字符 1 token。"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def df_var_name(sheet_name: str) -> str:
+    """PythonTools 中 DataFrame 对应的变量名。"""
+    return f"df_{sheet_name}".replace(" ", "_").replace("-", "_")
+
+
+def _header(sheet_name: str, profile: DataFrameProfile) -> str:
+    return (
+        f"  - PandasTools 中的 DataFrame 名称: '{sheet_name}', "
+        f"PythonTools 中的变量名: `{df_var_name(sheet_name)}`, "
+        f"行数: {profile.rows}, 列数: {len(profile.columns)}"
+    )
+
+
+def _detailed(header: str, profile: DataFrameProfile) -> str:
+    lines = [header]
+    lines.extend(f"    - {format_column(col)}" for col in profile.columns)
+    return "\n".join(lines)
+
+
+def _compact(header: str, profile: DataFrameProfile, budget: Optional[int] = None) -> str:
+    """一行列清单；给定 budget 时截断列清单，标识符列始终保留。"""
+    identifiers = profile.identifier_columns
+    if identifiers:
+        header += f", 标识符列: [{', '.join(identifiers)}]"
+    names = [f"{col.name}({col.dtype})" for col in profile.columns]
+    line = f"    列: [{', '.join(names)}]"
+    if budget is None or estimate_tokens(header) + estimate_tokens(line) <= budget:
+        return f"{header}\n{line}"
+
+    remaining = budget - estimate_tokens(header)
+    kept: List[str] = []
+    for name in names:
+        remaining -= estimate_tokens(name) + 1
+        if remaining < 0:
+            break
+        kept.append(name)
+    if not kept:
+        return header
+    return f"{header}\n    列: [{', '.join(kept)}, …等共 {len(names)} 列]"
+
+
+def _entries(
+    dataframes: Dict[str, pd.DataFrame], large_tables: Dict[str, LargeTableInfo]
+) -> List[Tuple[str, DataFrameProfile]]:
+    """(标题行, 列画像)；大表的列画像来自样本。"""
+    profiles = {name: get_profile(df) for name, df in dataframes.items()}
+    entries = [(_header(name, profile), profile) for name, profile in profiles.items()]
+    entries.extend(
+        (large_table_header(name, info), get_profile(info.sample)) for name, info in large_tables.items()
+    )
+    return entries
+
+
+def build_data_context(
+    dataframes: Dict[str, pd.DataFrame],
+    budget: int = SCHEMA_TOKEN_BUDGET,
+    large_tables: Optional[Dict[str, LargeTableInfo]] = None,
+) -> str:
+    """生成不超过 budget（估算 token）的数据描述，大文件模式的表与普通 DataFrame 共用同一预算。"""
+    large_tables = large_tables or {}
+    if not dataframes and not large_tables:
+        return NO_DATA
+    entries = _entries(dataframes, large_tables)
+    notes = [LARGE_TABLE_USAGE] if large_tables else []
+    budget -= sum(estimate_tokens(note) + 1 for note in notes)
+
+    detailed = "\n".join([_detailed(h, p) for h, p in entries] + notes)
+    if estimate_tokens(detailed) <= budget:
+        return detailed
+
+    notes.append(TRUNCATED_NOTE)
+    budget -= estimate_tokens(TRUNCATED_NOTE) + 1
+    compact = "\n".join(_compact(h, p) for h, p in entries)
+    if estimate_tokens(compact) <= budget:
+        return "\n".join([compact] + notes)
+
+    # 平均分配预算截断各表的列清单；仍超出时只保留表名称
+    per_sheet = budget // len(entries)
+    sections = []
+    for header, profile in entries:
+        section = _compact(header, profile, per_sheet)
+        budget -= estimate_tokens(section) + 1
+        if budget < 0:
+            omitted = len(entries) - len(sections)
+            sections.append(f"  - …另有 {omitted} 个 DataFrame，调用 SchemaTools 的 `list_dataframes` 查看")
+            break
+        sections.append(section)
+    return "\n".join(sections + notes)
+
+
+class SchemaTools(Toolkit):
+    """按需查询 DataFrame 的完整列信息，配合压缩后的数据描述使用。"""
+
+    def __init__(
+        self,
+        dataframes: Dict[str, pd.DataFrame],
+        large_tables: Optional[Dict[str, LargeTableInfo]] = None,
+        **kwargs,
+    ):
+        self.dataframes = dataframes
+        # 大文件模式的表只有样本在内存中，列信息按样本给出
+        self.large_tables = large_tables if large_tables is not None else {}
+        super().__init__(name="schema_tools", tools=[self.list_dataframes, self.describe_columns], **kwargs)
+
+    def list_dataframes(self) -> str:
+        """Lists every available DataFrame with its PythonTools variable name, row count and column count.
+
+        :return: One line per DataFrame.
+        """
+        if not self.dataframes and not self.large_tables:
+            return NO_DATA
+        return "\n".join(header for header, _profile in _entries(self.dataframes, self.large_tables))
+
+    def describe_columns(self, dataframe_name: str, columns: Optional[List[str]] = None) -> str:
+        """Returns full column details (dtype, null count, unique count, value range, samples, identifier flag)
+        for a DataFrame. Use this when the data section of the instructions omits columns.
+
+        :param dataframe_name: The PandasTools name of the DataFrame.
+        :param columns: Column names to describe. Describes all columns if omitted.
+        :return: One line per column, or an error message.
+        """
+        df = self.dataframes.get(dataframe_name)
+        if df is None and dataframe_name in self.large_tables:
+            df = self.large_tables[dataframe_name].sample
+        if df is None:
+            available = ", ".join([*self.dataframes, *self.large_tables])
+            return f"DataFrame not found: {dataframe_name}. Available: {available}"
+        profile = get_profile(df)
+        selected = profile.columns
+        if columns:
+            wanted = {str(c) for c in columns}
+            selected = [col for col in profile.columns if col.name in wanted]
+            missing = wanted - {col.name for col in selected}
+            if missing:
+                return f"Columns not found in {dataframe_name}: {', '.join(sorted(missing))}"
+        return "\n".join(format_column(col) for col in selected)
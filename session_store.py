@@ -0,0 +1,97 @@
+"""会话存储：Agent 对话历史持久化到数据库，按用户 + 对话区分会话。
+
+默认使用 SQLite 文件，SESSION_DB_URL 指向 PostgreSQL 时多个服务实例可共享同一份历史。
+每次运行时才从数据库读取会话，进程内不常驻；上下文超过阈值时较早的对话
+被压缩为摘要，只保留最近几轮原文。
+"""
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+from config import (
+    SESSION_COMPACT_AT_TOKENS,
+    SESSION_DB_URL,
+    SESSION_HISTORY_RUNS,
+    SESSION_TTL_DAYS,
+)
+from schema_context import estimate_tokens
+
+if TYPE_CHECKING:
+    from agno.compaction.compaction import Compaction
+    from agno.db.base import BaseDb
+
+_db: Optional["BaseDb"] = None
+_lock = threading.Lock()
+
+
+def _create_db(url: str) -> "BaseDb":
+    if url == "memory":
+        from agno.db.in_memory import InMemoryDb
+
+        return InMemoryDb()
+    if url.startswith("postgresql"):
+        from agno.db.postgres import PostgresDb
+
+        return PostgresDb(db_url=url)
+    from agno.db.sqlite import SqliteDb
+
+    return SqliteDb(db_url=url)
+
+
+def get_session_db() -> "BaseDb":
+    """进程内共享的会话数据库（连接池由各会话复用）。"""
+    global _db
+    with _lock:
+        if _db is None:
+            _db = _create_db(SESSION_DB_URL)
+        return _db
+
+
+def session_id_for(user_id: Optional[str], thread_id: str) -> str:
+    return f"{user_id or 'anonymous'}:{thread_id}"
+
+
+def _count_tokens(messages, tools) -> int:
+    """与数据描述相同的粗略估算，不依赖 tiktoken / tokenizers。"""
+    total = sum(estimate_tokens(str(m.content or "")) for m in messages)
+    return total + (estimate_tokens(str(tools)) if tools else 0)
+
+
+def build_compaction() -> Optional["Compaction"]:
+    """上下文超过 SESSION_COMPACT_AT_TOKENS 时，把最近 SESSION_HISTORY_RUNS 轮之前的对话压缩为摘要。"""
+    if SESSION_COMPACT_AT_TOKENS <= 0:
+        return None
+    from agno.compaction.compaction import Compaction
+
+    return Compaction(
+        compact_at_tokens=SESSION_COMPACT_AT_TOKENS,
+        uncompacted_runs=SESSION_HISTORY_RUNS,
+        on_context_overflow=True,
+        token_counter=_count_tokens,
+    )
+
+
+def prune_stale_sessions(max_age_days: float = SESSION_TTL_DAYS) -> int:
+    """删除超过 max_age_days 未更新的会话，返回删除数量。"""
+    if max_age_days <= 0:
+        return 0
+    from agno.db.base import SessionType
+
+    db = get_session_db()
+    cutoff = int(time.time() - max_age_days * 86400)
+    try:
+        sessions, _total = db.get_sessions(
+            session_type=SessionType.AGENT, deserialize=False, include_runs=False
+        )
+        stale = [
+            s["session_id"] for s in sessions
+            if (s.get("updated_at") or s.get("created_at") or 0) < cutoff
+        ]
+        if stale:
+            db.delete_sessions(stale)
+    except Exception as e:
+        print(f"[会话存储] 清理过期会话失败: {e}")
+        return 0
+    if stale:
+        print(f"[会话存储] 已清理 {len(stale)} 个过期会话")
+    return len(stale)
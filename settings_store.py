@@ -0,0 +1,99 @@
+"""用户设置存储：每个用户一条记录保存在 SQLite 中，读写在线程中执行，不阻塞事件循环。
+
+写入按用户单条 UPSERT，并发用户之间互不覆盖；进程内缓存已读取的设置，
+同一用户再次打开对话时不需要读数据库。首次启动时自动导入旧的 user_settings.json。
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from config import SETTINGS_DB_PATH
+
+LEGACY_SETTINGS_FILE = "user_settings.json"
+
+
+class SettingsStore:
+    def __init__(self, path: str = SETTINGS_DB_PATH, legacy_file: str = LEGACY_SETTINGS_FILE):
+        self.path = path
+        self.legacy_file = legacy_file
+        self._cache: Dict[str, dict] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        # sqlite3 连接跨线程共享，所有访问串行执行
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # WAL 模式下多个服务进程可以同时读写
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_settings ("
+                "user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+            self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self):
+        if not os.path.exists(self.legacy_file):
+            return
+        # 只在数据库为空时导入一次
+        if self._conn.execute("SELECT COUNT(*) FROM user_settings").fetchone()[0]:
+            return
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO user_settings (user_id, data, updated_at) VALUES (?, ?, ?)",
+                    [(user_id, json.dumps(data, ensure_ascii=False), time.time()) for user_id, data in legacy.items()],
+                )
+            print(f"[用户设置] 已导入 {self.legacy_file} 中 {len(legacy)} 个用户的设置")
+        except Exception as e:
+            print(f"[用户设置] 导入 {self.legacy_file} 失败: {e}")
+
+    def _load(self, user_id: str) -> dict:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT data FROM user_settings WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _save(self, user_id: str, settings: dict):
+        data = json.dumps(settings, ensure_ascii=False)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO user_settings (user_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    (user_id, data, time.time()),
+                )
+
+    async def get(self, user_id: str) -> dict:
+        """返回用户设置的副本；命中进程内缓存时不访问数据库。"""
+        settings = self._cache.get(user_id)
+        if settings is None:
+            settings = await asyncio.to_thread(self._load, user_id)
+            self._cache[user_id] = settings
+        return dict(settings)
+
+    async def set(self, user_id: str, settings: dict):
+        """先更新缓存，再在线程中写入数据库。"""
+        settings = dict(settings)
+        self._cache[user_id] = settings
+        await asyncio.to_thread(self._save, user_id, settings)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+settings_store = SettingsStore()
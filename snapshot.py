@@ -0,0 +1,32 @@
+"""DataFrame 快照：基于 pandas Copy-on-Write 为 Agent 提供隔离视图。"""
+from typing import Dict
+
+import pandas as pd
+
+
+def _enable_copy_on_write() -> bool:
+    """开启 pandas Copy-on-Write，返回是否可用。
+
+    pandas >= 3.0 始终启用 CoW；pandas 2.x 需要显式打开全局选项。
+    """
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        pd.set_option("mode.copy_on_write", True)
+        return True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+COPY_ON_WRITE = _enable_copy_on_write()
+
+
+def snapshot_dataframes(dataframes: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """为每个 DataFrame 生成隔离快照，防止 Agent exec() 修改原始数据。
+
+    启用 CoW 时快照为浅拷贝，与原始数据共享内存，只有被 Agent 代码写入的列
+    才会真正复制，内存和耗时随修改量增长而不是随数据总量增长；
+    CoW 不可用时退化为深拷贝。
+    """
+    deep = not COPY_ON_WRITE
+    return {name: df.copy(deep=deep) for name, df in dataframes.items()}
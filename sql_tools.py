@@ -0,0 +1,153 @@
+"""SQL 工具：用进程内的 DuckDB 直接查询会话中的 DataFrame。
+
+DataFrame 以视图方式注册（通过 Arrow 扫描，不复制数据），多表关联、分组聚合、
+透视等由 DuckDB 向量化、多线程执行；结果默认只返回前若干行预览，
+需要继续处理时可保存为新的命名 DataFrame。
+"""
+import re
+import threading
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from agno.tools import Toolkit
+
+from config import DUCKDB_MEMORY_LIMIT, SQL_PREVIEW_ROWS
+from large_data import LargeTableInfo, quote_literal
+
+_VALID_NAME = re.compile(r"^\w+$")
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class SqlTools(Toolkit):
+    """在会话 DataFrame（及大文件模式的表）上执行 SQL 查询。"""
+
+    def __init__(
+        self,
+        dataframes: Dict[str, pd.DataFrame],
+        large_tables: Dict[str, LargeTableInfo],
+        on_materialize: Callable[[str, pd.DataFrame], str],
+        preview_rows: int = SQL_PREVIEW_ROWS,
+        **kwargs,
+    ):
+        self.dataframes = dataframes
+        self.large_tables = large_tables
+        self.on_materialize = on_materialize
+        self.preview_rows = preview_rows
+        self._con = None
+        # 视图名 -> 已注册的对象，只在 DataFrame 新增或被替换时重新注册
+        self._registered: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        super().__init__(name="sql_tools", tools=[self.list_tables, self.run_sql], **kwargs)
+
+    def _connection(self):
+        if self._con is None:
+            import duckdb
+
+            self._con = duckdb.connect(config={"memory_limit": DUCKDB_MEMORY_LIMIT})
+        return self._con
+
+    def interrupt(self):
+        """中断正在执行的查询（由其他线程调用）。"""
+        if self._con is not None:
+            self._con.interrupt()
+
+    def _drop(self, name: str):
+        # 注册的 DataFrame 会遮蔽同名视图，替换时需先按原类型删除
+        source = self._registered.pop(name)
+        if isinstance(source, pd.DataFrame):
+            self._connection().unregister(name)
+        else:
+            self._connection().execute(f"DROP VIEW IF EXISTS {quote_identifier(name)}")
+
+    def _sync_views(self):
+        con = self._connection()
+        current: Dict[str, object] = dict(self.dataframes)
+        for name, info in self.large_tables.items():
+            current.setdefault(name, info.table)
+
+        for name in [n for n in self._registered if n not in current]:
+            self._drop(name)
+        for name, source in current.items():
+            if self._registered.get(name) is source:
+                continue
+            if name in self._registered:
+                self._drop(name)
+            if isinstance(source, pd.DataFrame):
+                con.register(name, source)
+            else:
+                con.execute(
+                    f"CREATE OR REPLACE VIEW {quote_identifier(name)} AS "
+                    f"SELECT * FROM read_parquet({quote_literal(source.path)})"
+                )
+            self._registered[name] = source
+
+    def list_tables(self) -> str:
+        """Lists the tables that can be queried with run_sql, with their columns and SQL types.
+
+        :return: One line per table.
+        """
+        with self._lock:
+            self._sync_views()
+            lines = []
+            for name in self._registered:
+                rel = self._connection().sql(f"SELECT * FROM {quote_identifier(name)}")
+                columns = ", ".join(f"{c} {t}" for c, t in zip(rel.columns, rel.types))
+                lines.append(f"{quote_identifier(name)}: {columns}")
+        return "\n".join(lines) or "No tables available"
+
+    def run_sql(
+        self, query: str, limit: Optional[int] = None, save_as: Optional[str] = None, overwrite: bool = False
+    ) -> str:
+        """Runs a DuckDB SQL query over the session's DataFrames. Each DataFrame is a table named after its
+        PandasTools name; quote names with double quotes, e.g. SELECT * FROM "销售_Sheet1".
+        Prefer this for joins (VLOOKUP-style lookups), group-by aggregations and pivots on large tables.
+
+        :param query: The SQL query to run.
+        :param limit: Maximum number of result rows to return as a preview. Defaults to a small preview.
+        :param save_as: If given, also saves the full result as a new DataFrame with this name so it can be used
+            by PandasTools, PythonTools and later SQL queries. Must not be the name of an existing DataFrame.
+        :param overwrite: Set to true only when the user explicitly asks to replace the existing DataFrame named
+            save_as with the query result.
+        :return: A markdown preview of the result, or an error message.
+        """
+        limit = limit or self.preview_rows
+        if save_as:
+            if not _VALID_NAME.match(save_as):
+                return f"Invalid name for save_as: {save_as} (use letters, digits, underscores or Chinese)"
+            # 默认不覆盖已有数据，避免查询结果替换用户上传的表
+            if not overwrite and (save_as in self.dataframes or save_as in self.large_tables):
+                return (
+                    f"A DataFrame named '{save_as}' already exists. Choose another name for save_as, "
+                    f"or pass overwrite=True only if the user asked to replace it"
+                )
+        try:
+            with self._lock:
+                self._sync_views()
+                rel = self._connection().sql(query)
+                if rel is None:
+                    return "Query executed (no result set)"
+                if save_as:
+                    result = rel.df()
+                    preview = result.head(limit)
+                    total = len(result)
+                else:
+                    preview = rel.limit(limit + 1).df()
+        except Exception as e:
+            return f"Error running SQL: {e}"
+
+        if save_as:
+            variable = self.on_materialize(save_as, result)
+            header = (
+                f"Saved {total:,} rows x {result.shape[1]} columns as DataFrame '{save_as}' "
+                f"(PythonTools variable `{variable}`). First {len(preview)} rows:"
+            )
+        elif len(preview) > limit:
+            preview = preview.head(limit)
+            header = f"Showing the first {limit} rows (more rows exist; use save_as to keep the full result):"
+        else:
+            header = f"{len(preview)} rows:"
+        return f"{header}\n\n{preview.to_markdown(index=False)}"
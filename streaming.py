@@ -0,0 +1,116 @@
+"""流式输出：有界事件通道（带背压）和按时间/大小合并 token 的发送缓冲。"""
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from config import STREAM_FLUSH_CHARS, STREAM_FLUSH_INTERVAL, STREAM_QUEUE_SIZE
+
+
+class StreamMetrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.events = 0
+        self.frames = 0
+        self.chars = 0
+        self.max_queue_depth = 0
+
+    @property
+    def frames_per_sec(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"事件 {self.events}, 帧 {self.frames}, 字符 {self.chars}, "
+            f"{self.frames_per_sec:.1f} 帧/秒, 最大队列深度 {self.max_queue_depth}"
+        )
+
+
+class EventChannel:
+    """Agent 线程 → 事件循环的有界队列；队列满时阻塞 Agent 线程形成背压。
+
+    入队通过 call_soon_threadsafe 投递，不等待事件循环处理；容量由线程侧的信号量控制，
+    消费者每取出一个事件释放一个名额，只有队列真正满时 Agent 线程才会等待。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, metrics: StreamMetrics, maxsize: int = STREAM_QUEUE_SIZE):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._maxsize = maxsize
+        self._slots = threading.Semaphore(maxsize)
+        self._metrics = metrics
+        self._closed = False
+
+    def put(self, item: Any):
+        """在 Agent 线程中调用。通道关闭后直接丢弃，避免线程永久阻塞。"""
+        if self._closed:
+            return
+        self._slots.acquire()
+        if self._closed:
+            return
+        self._loop.call_soon_threadsafe(self._enqueue, item)
+
+    def _enqueue(self, item: Any):
+        if self._closed:
+            return
+        self._queue.put_nowait(item)
+        self._metrics.max_queue_depth = max(self._metrics.max_queue_depth, self._queue.qsize())
+
+    async def get(self, timeout: Optional[float] = None) -> Any:
+        """timeout 到期时抛出 asyncio.TimeoutError。"""
+        item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        self._slots.release()
+        self._metrics.events += 1
+        return item
+
+    def close(self):
+        """停止消费时调用：丢弃积压事件并释放正在等待的 Agent 线程。"""
+        self._closed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._slots.release(self._maxsize)
+
+
+class TokenBuffer:
+    """合并流式 token，累计满 flush_chars 个字符或距首个 token 超过 flush_interval 秒时发送一帧。"""
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[Any]],
+        metrics: StreamMetrics,
+        flush_interval: float = STREAM_FLUSH_INTERVAL,
+        flush_chars: int = STREAM_FLUSH_CHARS,
+    ):
+        self._send = send
+        self._metrics = metrics
+        self._flush_interval = flush_interval
+        self._flush_chars = flush_chars
+        self._parts = []
+        self._size = 0
+        self._first_at: Optional[float] = None
+
+    def time_to_flush(self) -> Optional[float]:
+        """距离下次必须发送的剩余时间；缓冲为空时返回 None（无限等待）。"""
+        if self._first_at is None:
+            return None
+        return max(0.0, self._first_at + self._flush_interval - time.monotonic())
+
+    async def add(self, text: str):
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._flush_chars or self.time_to_flush() == 0:
+            await self.flush()
+
+    async def flush(self):
+        if not self._parts:
+            return
+        frame = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._first_at = None
+        self._metrics.frames += 1
+        self._metrics.chars += len(frame)
+        await self._send(frame)
@@ -0,0 +1,405 @@
+"""耗时监控：按阶段记录 Agent 运行的耗时，汇总为 Prometheus 指标，可选导出 OpenTelemetry。
+
+每轮问答对应一个 RunTrace，记录执行器排队、每次 LLM 请求（含首 token 时间和 token 数）、
+每次工具调用、产物扫描和 WebSocket 发送等阶段；上传解析、创建 Agent 等运行之外的阶段
+用 timed() 记录。LLM 与工具事件在 Agent 线程中产生时即打点，不受事件通道背压影响。
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import OTEL_ENDPOINT
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # 标签值 -> [各桶计数..., 总和, 总数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {state[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {state[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, help_text, labels, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）。"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+STAGE_SECONDS = registry.histogram("agent_stage_seconds", "Duration of pipeline stages", ("stage",))
+RUN_SECONDS = registry.histogram("agent_run_seconds", "End-to-end duration of agent runs", ("status",))
+RUNS_TOTAL = registry.counter("agent_runs_total", "Agent runs by final status", ("status",))
+LLM_REQUEST_SECONDS = registry.histogram(
+    "llm_request_seconds", "Duration of LLM requests", ("provider", "model")
+)
+LLM_TTFT_SECONDS = registry.histogram(
+    "llm_time_to_first_token_seconds", "LLM time to first token", ("provider", "model")
+)
+LLM_TOKENS_TOTAL = registry.counter("llm_tokens_total", "LLM tokens by kind", ("provider", "model", "kind"))
+TOOL_SECONDS = registry.histogram("agent_tool_seconds", "Duration of tool calls", ("tool", "status"))
+
+
+def render_prometheus() -> str:
+    return registry.render()
+
+
+# --- OpenTelemetry（可选）---
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def _otel_tracer():
+    """设置了 OTLP 采集器地址且安装了 opentelemetry-sdk 时返回 tracer，否则返回 None。"""
+    global _tracer
+    if not OTEL_ENDPOINT:
+        return None
+    with _tracer_lock:
+        if _tracer is None:
+            try:
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            except ImportError:
+                print("[耗时监控] 未安装 opentelemetry-sdk / opentelemetry-exporter-otlp，跳过 OTLP 导出")
+                _tracer = False
+                return None
+            provider = TracerProvider(resource=Resource.create({"service.name": "data-analyst-agent"}))
+            # 采集器地址由 OTEL_EXPORTER_OTLP_ENDPOINT 环境变量指定
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            _tracer = provider.get_tracer("data-analyst-agent")
+        return _tracer or None
+
+
+def _export_spans(name: str, start_ns: int, end_ns: int, attrs: dict, children: List["SpanRecord"], origin_ns: int):
+    tracer = _otel_tracer()
+    if tracer is None:
+        return
+    from opentelemetry import trace
+
+    root = tracer.start_span(name, attributes=_otel_attrs(attrs), start_time=start_ns)
+    context = trace.set_span_in_context(root)
+    for record in children:
+        child_start = origin_ns + int(record.start * 1e9)
+        span = tracer.start_span(
+            record.name, context=context, attributes=_otel_attrs(record.attrs), start_time=child_start
+        )
+        span.end(end_time=child_start + int(record.duration * 1e9))
+    root.end(end_time=end_ns)
+
+
+def _otel_attrs(attrs: dict) -> dict:
+    return {k: v if isinstance(v, (bool, int, float, str)) else str(v) for k, v in attrs.items() if v is not None}
+
+
+@contextmanager
+def timed(stage: str, **attrs) -> Iterator[None]:
+    """记录运行之外的单个阶段（上传解析、创建 Agent 等）。"""
+    start_ns = time.time_ns()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        _export_spans(stage, start_ns, start_ns + int(elapsed * 1e9), attrs, [], start_ns)
+
+
+# --- 单轮运行 ---
+
+@dataclass
+class SpanRecord:
+    name: str
+    start: float  # 相对运行开始的秒数
+    duration: float
+    attrs: dict = field(default_factory=dict)
+
+
+_STAGE_LABELS = {
+    "queue_wait": "执行器排队",
+    "first_token": "首个 token",
+    "llm_request": "LLM 请求",
+    "tool": "工具",
+    "artifact_scan": "产物扫描",
+    "artifact_send": "产物发送",
+    "ws_send": "WebSocket 发送",
+    "cache_save": "写入结果缓存",
+}
+
+
+class RunTrace:
+    """单轮 Agent 运行的耗时记录。Agent 线程与事件循环都会写入，追加操作加锁。"""
+
+    def __init__(self, provider: str = "", model: str = "", **attrs):
+        self.provider = provider
+        self.model = model
+        self.attrs = dict(attrs, provider=provider, model=model)
+        self.spans: List[SpanRecord] = []
+        self.start_ns = time.time_ns()
+        self._origin = time.perf_counter()
+        self._open: Dict[str, Tuple[float, str, dict]] = {}
+        # 可重复发生、只需汇总的阶段（如 WebSocket 发送）：名称 -> [总耗时, 次数]
+        self._totals: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.tokens = {"input": 0, "output": 0}
+        self.first_content_at: Optional[float] = None
+        self.total: Optional[float] = None
+
+    def now(self) -> float:
+        return time.perf_counter() - self._origin
+
+    def record(self, name: str, duration: float, start: Optional[float] = None, **attrs):
+        if start is None:
+            start = self.now() - duration
+        with self._lock:
+            self.spans.append(SpanRecord(name, start, duration, attrs))
+        STAGE_SECONDS.observe(duration, stage=name)
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[None]:
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.record(name, self.now() - start, start, **attrs)
+
+    def add_time(self, name: str, duration: float):
+        """累加不单独列出的阶段耗时，结束时作为一条汇总记录。"""
+        with self._lock:
+            total = self._totals.setdefault(name, [0.0, 0])
+            total[0] += duration
+            total[1] += 1
+
+    def on_event(self, event):
+        """在 Agent 线程中对每个流式事件打点。"""
+        event_type = getattr(event, "event", "")
+        if event_type == "RunContent" and self.first_content_at is None and getattr(event, "content", None):
+            self.first_content_at = self.now()
+            self.record("first_token", self.first_content_at, 0.0)
+        elif event_type == "ModelRequestStarted":
+            self._open["llm"] = (self.now(), "llm_request", {})
+        elif event_type == "ModelRequestCompleted":
+            self._close_llm(event)
+        elif event_type == "ToolCallStarted":
+            tool = getattr(event, "tool", None)
+            if tool is not None:
+                self._open[f"tool:{tool.tool_call_id}"] = (self.now(), "tool", {"tool": tool.tool_name})
+        elif event_type in ("ToolCallCompleted", "ToolCallError"):
+            self._close_tool(event, error=event_type == "ToolCallError")
+
+    def _close_llm(self, event):
+        opened = self._open.pop("llm", None)
+        if opened is None:
+            return
+        start = opened[0]
+        duration = self.now() - start
+        input_tokens = getattr(event, "input_tokens", None) or 0
+        output_tokens = getattr(event, "output_tokens", None) or 0
+        ttft = getattr(event, "time_to_first_token", None)
+        self.tokens["input"] += input_tokens
+        self.tokens["output"] += output_tokens
+        self.record(
+            "llm_request", duration, start,
+            ttft=ttft, input_tokens=input_tokens, output_tokens=output_tokens,
+        )
+        labels = {"provider": self.provider, "model": self.model}
+        LLM_REQUEST_SECONDS.observe(duration, **labels)
+        if ttft is not None:
+            LLM_TTFT_SECONDS.observe(ttft, **labels)
+        LLM_TOKENS_TOTAL.inc(input_tokens, kind="input", **labels)
+        LLM_TOKENS_TOTAL.inc(output_tokens, kind="output", **labels)
+
+    def _close_tool(self, event, error: bool):
+        tool = getattr(event, "tool", None)
+        if tool is None:
+            return
+        opened = self._open.pop(f"tool:{tool.tool_call_id}", None)
+        if opened is None:
+            return
+        start = opened[0]
+        duration = self.now() - start
+        status = "error" if error or tool.tool_call_error else "ok"
+        self.record("tool", duration, start, tool=tool.tool_name, status=status)
+        TOOL_SECONDS.observe(duration, tool=tool.tool_name or "unknown", status=status)
+
+    def finish(self, status: str = "ok") -> float:
+        self.total = self.now()
+        with self._lock:
+            for name, (duration, count) in self._totals.items():
+                self.spans.append(SpanRecord(name, 0.0, duration, {"count": count}))
+                STAGE_SECONDS.observe(duration, stage=name)
+        RUN_SECONDS.observe(self.total, status=status)
+        RUNS_TOTAL.inc(status=status)
+        attrs = dict(self.attrs, status=status, input_tokens=self.tokens["input"], output_tokens=self.tokens["output"])
+        try:
+            _export_spans(
+                "agent_run", self.start_ns, self.start_ns + int(self.total * 1e9), attrs, self.spans, self.start_ns
+            )
+        except Exception as e:
+            print(f"[耗时监控] OTLP 导出失败: {e}")
+        return self.total
+
+    def summary(self) -> str:
+        llm = [s for s in self.spans if s.name == "llm_request"]
+        tools = [s for s in self.spans if s.name == "tool"]
+        parts = [f"总计 {self.total or self.now():.2f}s"]
+        if self.first_content_at is not None:
+            parts.append(f"首 token {self.first_content_at:.2f}s")
+        parts.append(f"LLM {len(llm)} 次 {sum(s.duration for s in llm):.2f}s")
+        parts.append(f"工具 {len(tools)} 次 {sum(s.duration for s in tools):.2f}s")
+        parts.append(f"token 输入 {self.tokens['input']:,} / 输出 {self.tokens['output']:,}")
+        return ", ".join(parts)
+
+    def to_markdown(self) -> str:
+        """耗时明细表，按开始时间排序；汇总类阶段放在最后。"""
+        lines = [
+            f"**{self.summary()}**",
+            "",
+            "| 阶段 | 开始 | 耗时 | 说明 |",
+            "| --- | ---: | ---: | --- |",
+        ]
+        timed_spans = sorted((s for s in self.spans if "count" not in s.attrs), key=lambda s: s.start)
+        totals = [s for s in self.spans if "count" in s.attrs]
+        for record in timed_spans + totals:
+            label = _STAGE_LABELS.get(record.name, record.name)
+            start = "—" if "count" in record.attrs else f"{record.start:.2f}s"
+            lines.append(f"| {label} | {start} | {record.duration:.2f}s | {_describe(record)} |")
+        return "\n".join(lines)
+
+
+def _describe(record: SpanRecord) -> str:
+    attrs = record.attrs
+    if record.name == "llm_request":
+        note = f"输入 {attrs.get('input_tokens', 0):,} / 输出 {attrs.get('output_tokens', 0):,} token"
+        if attrs.get("ttft") is not None:
+            note += f"，首 token {attrs['ttft']:.2f}s"
+        return note
+    if record.name == "tool":
+        return f"`{attrs.get('tool')}`" + ("（出错）" if attrs.get("status") == "error" else "")
+    if "count" in attrs:
+        return f"{attrs['count']} 次"
+    return "，".join(f"{k}={v}" for k, v in attrs.items())
+
+
+def add_stage_time(trace: Optional[RunTrace], stage: str, seconds: float):
+    """运行中累加到 RunTrace，运行之外直接计入阶段指标。"""
+    if trace is None:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    else:
+        trace.add_time(stage, seconds)
@@ -0,0 +1,15 @@
+"""测试公共设置：在导入项目模块前把缓存、数据库指向临时目录，不影响本地运行数据。"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_WORKDIR = tempfile.mkdtemp(prefix="tests_")
+os.environ.setdefault("PARSE_CACHE_DIR", os.path.join(_WORKDIR, "parse_cache"))
+os.environ.setdefault("QUERY_CACHE_DIR", os.path.join(_WORKDIR, "query_cache"))
+os.environ.setdefault("SESSION_DB_URL", "sqlite:///" + os.path.join(_WORKDIR, "sessions.db"))
+os.environ.setdefault("SETTINGS_DB_PATH", os.path.join(_WORKDIR, "user_settings.db"))
+os.environ.setdefault("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+os.environ.setdefault("PREWARM", "0")
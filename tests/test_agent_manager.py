@@ -0,0 +1,42 @@
+"""AgentManager：上传新数据和修改设置时原地更新 Agent，只注册新增或替换的 sheet。"""
+import pandas as pd
+import pytest
+
+from agent_setup import AgentManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    sales = pd.DataFrame({"地区": ["华东", "华南"], "销售额": [1.0, 2.0]})
+    return AgentManager(
+        "DeepSeek", "sk-test", "deepseek-chat", "", {"sales": sales},
+        str(tmp_path / "charts"), str(tmp_path / "uploads"),
+    ), sales
+
+
+def test_only_new_or_replaced_sheets_are_registered(manager):
+    manager, sales = manager
+    agent = manager.agent
+    assert manager.add_dataframes({"sales": sales}) == []
+    costs = pd.DataFrame({"成本": [0.5]})
+    assert manager.add_dataframes({"sales": sales, "costs": costs}) == ["costs"]
+    assert manager.add_dataframes({"sales": sales.copy()}) == ["sales"]
+    assert manager.agent is agent
+    assert "df_costs" in manager.python_tools.safe_locals
+    assert "costs" in str(manager.agent.instructions)
+
+
+def test_df_alias_only_for_a_single_sheet(manager):
+    manager, _sales = manager
+    assert "df" in manager.python_tools.safe_locals
+    manager.add_dataframes({"costs": pd.DataFrame({"成本": [0.5]})})
+    assert "df" not in manager.python_tools.safe_locals
+
+
+def test_model_is_replaced_only_when_settings_change(manager):
+    manager, _sales = manager
+    model = manager.agent.model
+    assert not manager.update_model("DeepSeek", "sk-test", "deepseek-chat", "")
+    assert manager.agent.model is model
+    assert manager.update_model("DeepSeek", "sk-test", "deepseek-reasoner", "")
+    assert manager.agent.model is not model and manager.model_id == "deepseek-reasoner"
@@ -0,0 +1,33 @@
+"""产物跟踪：只返回新增或修改过的文件，运行期间等文件写完再返回。"""
+import os
+
+from artifacts import ArtifactTracker
+
+
+def _write(path, text: str, mtime_ns: int):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_only_new_or_modified_files_are_returned(tmp_path):
+    tracker = ArtifactTracker(str(tmp_path))
+    chart = tmp_path / "a.plotly.json"
+    _write(chart, "{}", 1_000_000_000)
+    assert tracker.scan() == [str(chart)]
+    assert tracker.scan() == []
+    _write(chart, '{"data": []}', 2_000_000_000)
+    other = tmp_path / "b.html"
+    _write(other, "<html>", 1_000_000_000)
+    assert tracker.scan() == [str(chart), str(other)]
+
+
+def test_settle_waits_for_a_stable_file(tmp_path):
+    tracker = ArtifactTracker(str(tmp_path))
+    export = tmp_path / "导出.xlsx"
+    _write(export, "part", 1_000_000_000)
+    assert tracker.scan(settle=True) == []
+    _write(export, "partial-2", 2_000_000_000)
+    assert tracker.scan(settle=True) == []
+    assert tracker.scan(settle=True) == [str(export)]
+    assert tracker.scan(settle=True) == []
@@ -0,0 +1,32 @@
+"""基准测试：合成数据可复现，结果与基线对比时只报告明显变慢的耗时指标。"""
+import asyncio
+
+from benchmarks.run import bench_ingest, compare
+from benchmarks.synthetic import make_dataframe
+
+
+def test_synthetic_data_is_reproducible():
+    assert make_dataframe(100, seed=1).equals(make_dataframe(100, seed=1))
+    assert not make_dataframe(100, seed=1).equals(make_dataframe(100, seed=2))
+
+
+def test_compare_reports_only_real_regressions():
+    baseline = {"results": [
+        {"suite": "ingest", "case": "csv-1000", "cold_seconds": 0.1, "warm_seconds": 0.001, "rows": 1000},
+        {"suite": "agent", "case": "create-1000", "create_seconds": 0.2},
+    ]}
+    current = {"results": [
+        # warm_seconds 翻了三倍，但低于计时噪声阈值
+        {"suite": "ingest", "case": "csv-1000", "cold_seconds": 0.5, "warm_seconds": 0.003, "rows": 9000},
+        {"suite": "agent", "case": "create-1000", "create_seconds": 0.21},
+        {"suite": "agent", "case": "create-new", "create_seconds": 9.0},
+    ]}
+    regressions = compare(baseline, current, threshold=1.2)
+    assert len(regressions) == 1 and regressions[0].startswith("ingest/csv-1000 cold_seconds")
+
+
+def test_ingest_suite_reports_cold_and_warm_timings(tmp_path):
+    params = {"ingest_rows": [200]}
+    results = asyncio.run(bench_ingest(params, 1, str(tmp_path)))
+    assert [r["case"] for r in results] == ["csv-200", "xlsx-200"]
+    assert all(r["rows"] == 200 and r["cold_seconds"] > 0 and r["warm_seconds"] > 0 for r in results)
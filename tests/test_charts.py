@@ -0,0 +1,67 @@
+"""图表精简：直方图、箱线图、小提琴图的原始数据在服务端聚合或抽样。"""
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from charts import decode_array, optimize_figure
+from config import CHART_RAW_MAX_POINTS
+
+
+def _fig_dict(fig) -> dict:
+    return json.loads(fig.to_json())
+
+
+def _size(fig: dict) -> int:
+    return len(json.dumps(fig))
+
+
+def test_numeric_histogram_is_binned():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"v": rng.normal(0, 1, 100_000), "g": rng.choice(["a", "b"], 100_000)})
+    fig = _fig_dict(px.histogram(df, x="v", color="g"))
+    before = _size(fig)
+    notes = optimize_figure(fig)
+    assert len(notes) == 2 and _size(fig) < before / 20
+    a, b = fig["data"]
+    assert a["type"] == b["type"] == "bar"
+    # 同一坐标轴上的直方图共用分箱边界
+    assert np.array_equal(decode_array(a["x"]), decode_array(b["x"]))
+    total = decode_array(a["y"]).sum() + decode_array(b["y"]).sum()
+    assert total == 100_000
+
+
+def test_categorical_histogram_with_sum():
+    n = CHART_RAW_MAX_POINTS * 4
+    df = pd.DataFrame({"c": np.tile(["x", "y"], n // 2), "v": np.tile([1.0, 3.0], n // 2)})
+    fig = _fig_dict(px.histogram(df, x="c", y="v", histfunc="sum"))
+    optimize_figure(fig)
+    bar = fig["data"][0]
+    assert bar["type"] == "bar"
+    assert list(bar["x"]) == ["x", "y"]
+    assert list(decode_array(bar["y"])) == [n // 2 * 1.0, n // 2 * 3.0]
+
+
+def test_box_uses_precomputed_quartiles():
+    rng = np.random.default_rng(1)
+    values = rng.normal(10, 2, 50_000)
+    groups = np.where(np.arange(50_000) % 2 == 0, "甲", "乙")
+    fig = _fig_dict(px.box(pd.DataFrame({"g": groups, "v": values}), x="g", y="v"))
+    notes = optimize_figure(fig)
+    box = fig["data"][0]
+    assert notes and "y" not in box and box["boxpoints"] is False
+    assert list(box["x"]) == ["甲", "乙"]
+    assert np.allclose(decode_array(box["median"]), [np.median(values[::2]), np.median(values[1::2])])
+
+
+def test_violin_is_sampled():
+    values = np.random.default_rng(2).exponential(1, 40_000)
+    fig = _fig_dict(px.violin(pd.DataFrame({"v": values}), y="v"))
+    notes = optimize_figure(fig)
+    assert notes and len(decode_array(fig["data"][0]["y"])) == CHART_RAW_MAX_POINTS
+
+
+def test_small_charts_are_unchanged():
+    fig = _fig_dict(px.histogram(pd.DataFrame({"v": range(100)}), x="v"))
+    assert optimize_figure(fig) == [] and fig["data"][0]["type"] == "histogram"
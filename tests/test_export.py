@@ -0,0 +1,32 @@
+"""导出：标识符列判断与上传规整共用，度量值列原样写出。"""
+import numpy as np
+import pandas as pd
+
+from export import export_table, identifier_positions
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "卡内余额": [100.75, 20.0, 5.5],
+        "卡路里": [120, 340, 560],
+        "信号": [1, 2, 3],
+        "Paid": [12.5, 7.25, 3.0],
+        "身份证号": [110101199001011234, 110101199001015678, 110101199001019999],
+        # 列名有提示、样本像编号，但整列含小数：不应转为文本
+        "电话": [1.0, 2.0, 3.5],
+        "user_id": [123456789012.0, np.nan, 123456789013.0],
+    })
+
+
+def test_identifier_positions_use_shared_detection():
+    df = _frame()
+    names = [df.columns[i] for i in identifier_positions(df)]
+    assert names == ["身份证号", "user_id"]
+
+
+def test_csv_export_keeps_measures_numeric(tmp_path):
+    path = tmp_path / "out.csv"
+    export_table(_frame(), str(path))
+    text = path.read_text(encoding="utf-8-sig").splitlines()
+    assert text[1].split(",") == ["100.75", "120", "1", "12.5", "110101199001011234", "1.0", "123456789012"]
+    assert text[2].split(",")[-1] == ""
@@ -0,0 +1,56 @@
+"""标识符列判断：列名按完整词语提示，取值确认后才转为文本；度量值列保持数值。"""
+import numpy as np
+import pandas as pd
+
+from dtype_optimize import optimize_dtypes
+from ingest import read_csv
+from profiling import is_identifier_name, looks_like_identifier
+
+
+def test_name_hints_match_whole_words():
+    for name in ("id", "user_id", "客户ID", "userId", "订单编号", "身份证号", "手机号码", "order no"):
+        assert is_identifier_name(name), name
+    for name in ("Paid", "width", "卡内余额", "卡路里", "信号", "video", "idle"):
+        assert not is_identifier_name(name), name
+
+
+def test_hinted_name_needs_identifier_values():
+    assert looks_like_identifier("客户ID", pd.Series([310101199001011234, 310101199001015678]))
+    assert looks_like_identifier("工号", pd.Series(["00123", "00124", "00123"]))
+    assert not looks_like_identifier("电话费", pd.Series([12.5, 30.0]))
+    assert not looks_like_identifier("code", pd.Series([1, 1, 2, 2, 1, 2]))
+
+
+def test_csv_measures_stay_numeric(tmp_path):
+    path = tmp_path / "orders.csv"
+    path.write_text(
+        "Paid,width,卡内余额,电话费,身份证号\n"
+        "12.50,3,100.75,8.5,110101199001011234\n"
+        "7.25,4,20.00,9.0,110101199001015678\n",
+        encoding="utf-8",
+    )
+    df, _ = optimize_dtypes(read_csv(str(path)))
+    for name in ("Paid", "width", "卡内余额", "电话费"):
+        assert pd.api.types.is_numeric_dtype(df[name]), name
+    assert df["Paid"].tolist() == [12.5, 7.25]
+    assert df["卡内余额"].tolist() == [100.75, 20.0]
+    assert df["身份证号"].tolist() == ["110101199001011234", "110101199001015678"]
+
+
+def test_int_columns_stay_int():
+    df = pd.DataFrame({
+        "width": np.arange(200, dtype=np.int64),
+        "卡路里": np.arange(200, dtype=np.int64) * 10,
+        "信号": np.arange(200, dtype=np.int64) % 5,
+    })
+    optimized, _ = optimize_dtypes(df)
+    for name in df.columns:
+        assert pd.api.types.is_integer_dtype(optimized[name]), name
+
+
+def test_identifier_keeps_missing_values():
+    df = pd.DataFrame({"user_id": [123456789012.0, np.nan, 123456789013.0]})
+    optimized, _ = optimize_dtypes(df)
+    assert optimized["user_id"].iloc[0] == "123456789012"
+    assert pd.isna(optimized["user_id"].iloc[1])
+    assert "nan" not in optimized["user_id"].dropna().tolist()
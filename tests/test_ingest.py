@@ -0,0 +1,42 @@
+"""上传解析：多个 sheet 在进程池中并行解析，解析期间事件循环不被阻塞。"""
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+
+import ingest
+from upload_cache import UploadCache
+
+
+def test_excel_sheets_are_parsed_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "parse_cache", UploadCache(cache_dir=str(tmp_path / "cache"), max_bytes=0))
+    src = tmp_path / "book.xlsx"
+    with pd.ExcelWriter(src) as writer:
+        for name in ("一月", "二月", "三月"):
+            pd.DataFrame({"金额": np.arange(20_000) * 1.5}).to_excel(writer, sheet_name=name, index=False)
+    dest = tmp_path / "uploads"
+    os.makedirs(dest)
+
+    async def main():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        sheets = [item async for item in ingest.ingest_file(str(src), "book.xlsx", str(dest))]
+        done.set()
+        await task
+        return sheets, ticks
+
+    sheets, ticks = asyncio.run(main())
+    assert sorted(name for name, *_ in sheets) == ["book_一月", "book_三月", "book_二月"]
+    assert all(len(df) == 20_000 and cached is False for _name, df, cached, _bytes in sheets)
+    assert os.path.exists(dest / "book.xlsx")
+    # 解析在进程池中进行，事件循环持续运行
+    assert ticks > 5
@@ -0,0 +1,57 @@
+"""大文件模式：超过阈值的 CSV 转存为 Parquet，按需查询，内存中只保留样本。"""
+import asyncio
+import os
+
+import pandas as pd
+
+import ingest
+from large_data import LARGE_TABLE_USAGE, LargeTableInfo, LazyTable, table_var_name
+from schema_context import TRUNCATED_NOTE, SchemaTools, build_data_context, estimate_tokens
+
+
+def test_large_csv_is_converted_and_queried_lazily(tmp_path, monkeypatch):
+    src = tmp_path / "订单.csv"
+    pd.DataFrame({
+        "城市": ["北京", "上海", "广州", "深圳"] * 5000,
+        "金额": range(20_000),
+    }).to_csv(src, index=False)
+    monkeypatch.setattr(ingest, "LARGE_FILE_THRESHOLD_BYTES", 1024)
+    assert ingest.is_large_file(str(src), "订单.csv")
+    assert not ingest.is_large_file(str(src), "订单.xlsx")
+
+    dest = tmp_path / "uploads"
+    os.makedirs(dest)
+    name, info = asyncio.run(ingest.ingest_large_file(str(src), "订单.csv", str(dest)))
+    table = info.table
+    assert name == "订单" and table.path.endswith(".parquet")
+    assert table.rows == 20_000 and table.columns == ["城市", "金额"]
+    assert len(info.sample) < table.rows
+    assert info.fingerprint
+
+    totals = table.sql("SELECT 城市, SUM(金额) AS 合计 FROM t GROUP BY 1 ORDER BY 1")
+    assert len(totals) == 4 and totals["合计"].sum() == sum(range(20_000))
+    subset = table.to_pandas(columns=["金额"], where="城市 = '北京'")
+    assert list(subset.columns) == ["金额"] and len(subset) == 5000
+
+    exported = table.export(str(tmp_path / "out.csv"))
+    assert len(pd.read_csv(exported)) == 20_000
+
+    context = build_data_context({}, large_tables={name: info})
+    assert f"`{table_var_name(name)}`" in context and "行数: 20000" in context
+
+
+def test_large_tables_share_the_schema_budget():
+    sample = pd.DataFrame({f"指标_{i}": range(3) for i in range(300)})
+    tables = {
+        f"大表{i}": LargeTableInfo(LazyTable(f"大表{i}", f"/data/{i}.parquet", 10**7, list(sample.columns)), sample, 0)
+        for i in range(5)
+    }
+    frames = {"Sheet1": pd.DataFrame({"a": [1, 2]})}
+    for budget in (4000, 800):
+        context = build_data_context(frames, budget=budget, large_tables=tables)
+        assert estimate_tokens(context) <= budget
+        assert TRUNCATED_NOTE in context and LARGE_TABLE_USAGE in context
+    # 被省略的大表列可以按需查询
+    tools = SchemaTools(frames, tables)
+    assert "指标_299" in tools.describe_columns("大表4", ["指标_299"])
+    assert "`tbl_大表4`" in tools.list_dataframes()
@@ -0,0 +1,60 @@
+"""LLM 客户端池：同一配置复用客户端，并发请求数受每个供应商的信号量限制。"""
+import threading
+import time
+
+import httpx
+
+from llm_pool import LLMClientPool, _LimitedTransport
+
+
+class _Body(httpx.SyncByteStream):
+    """与真实传输层一样按需读取的响应体（content= 构造的响应会被提前读完）。"""
+
+    def __iter__(self):
+        yield b"ok"
+
+
+def test_clients_are_reused_per_provider_url_and_key():
+    pool = LLMClientPool()
+    client = pool.get_client("DeepSeek", "https://api.deepseek.com", "sk-a")
+    assert pool.get_client("DeepSeek", "https://api.deepseek.com", "sk-a") is client
+    assert pool.get_client("DeepSeek", "https://api.deepseek.com", "sk-b") is not client
+    assert all("sk-a" not in part for part in LLMClientPool.key("DeepSeek", "u", "sk-a"))
+
+    client.close()
+    assert pool.get_client("DeepSeek", "https://api.deepseek.com", "sk-a") is not client
+    pool.close()
+    assert pool._clients == {}
+
+
+def test_concurrency_is_limited_until_the_body_is_read():
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def handler(request):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        return httpx.Response(200, stream=_Body())
+
+    semaphore = threading.BoundedSemaphore(2)
+    client = httpx.Client(transport=_LimitedTransport(httpx.MockTransport(handler), semaphore))
+    threads = [threading.Thread(target=client.get, args=("http://llm.test/",)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak == 2
+
+    # 流式响应在读取完毕前一直占用名额
+    with client.stream("GET", "http://llm.test/") as response:
+        assert semaphore.acquire(blocking=False)
+        assert not semaphore.acquire(blocking=False)
+        semaphore.release()
+        response.read()
+    assert semaphore.acquire(blocking=False) and semaphore.acquire(blocking=False)
@@ -0,0 +1,22 @@
+"""指标端点：默认不暴露，设置令牌后需要 Bearer 认证。"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app
+
+
+def test_metrics_route_is_opt_in():
+    from chainlit.server import app as server
+
+    assert app.METRICS_PATH == ""
+    assert not [route for route in server.router.routes if getattr(route, "path", "") == "/metrics"]
+
+
+def test_metrics_token_is_required():
+    server = FastAPI()
+    app._register_metrics_route("/metrics", "s3cret", server=server)
+    client = TestClient(server)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200 and "app_" in response.text
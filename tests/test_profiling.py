@@ -0,0 +1,26 @@
+"""数据画像：一次计算列级概要并按对象缓存，内容指纹只随数据变化。"""
+import pandas as pd
+
+from profiling import fingerprint, format_column, get_profile
+
+
+def test_profile_summarizes_columns_and_is_cached():
+    df = pd.DataFrame({
+        "地区": ["华东", "华南", None],
+        "销售额": [100.5, 80.25, 60.0],
+        "身份证号": ["110101199001011234", "110101199001015678", "110101199001019999"],
+    })
+    profile = get_profile(df)
+    assert get_profile(df) is profile
+    by_name = {col.name: col for col in profile.columns}
+    assert by_name["地区"].nulls == 1 and by_name["地区"].unique == 2
+    assert (by_name["销售额"].min, by_name["销售额"].max) == (60.0, 100.5)
+    assert profile.identifier_columns == ["身份证号"]
+    # 标识符列不展示取值
+    assert "110101" not in format_column(by_name["身份证号"])
+
+
+def test_fingerprint_follows_content():
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    assert fingerprint(df) == fingerprint(df.copy())
+    assert fingerprint(df) != fingerprint(df.assign(a=[1, 2, 4]))
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import chainlit as cl
+import pandas as pd
+import pytest
+from chainlit.context import init_http_context
+
+from benchmarks.mock_llm import MockLLM
+import upload_cache
+from query_cache import CachedResult, QueryCache, make_key
+
+
+def test_key_is_scoped_per_user():
+    args = ("各地区销售额", {"Sheet1": "abc"}, "Kimi", "moonshot-v1-8k")
+    assert make_key(*args, scope="alice") == make_key(*args, scope="alice")
+    assert make_key(*args, scope="alice") != make_key(*args, scope="bob")
+    assert make_key(*args, scope="alice") != make_key("各地区利润", *args[1:], scope="alice")
+
+
+@pytest.fixture(scope="module")
+def mock_llm():
+    with MockLLM(script="text", first_token_ms=0, chunk_ms=0, chunks=2) as mock:
+        yield mock
+
+
+@pytest.fixture(scope="module")
+def csv_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("data") / "sales.csv"
+    pd.DataFrame({"地区": ["华东", "华南"], "销售额": [100.5, 80.25]}).to_csv(path, index=False)
+    return str(path)
+
+
+class _Upload:
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        self.path = path
+        self.mime = "text/csv"
+
+
+async def _open_session(user: str, csv_path: str, base_url: str):
+    import app
+
+    init_http_context(user=cl.User(identifier=user))
+    await app.on_chat_start()
+    await app.on_settings_update({
+        "provider": "Kimi", "model_id": "moonshot-v1-8k", "api_key": "sk-test", "base_url": base_url,
+    })
+    await app.on_message(cl.Message(content="", elements=[_Upload(csv_path)]))
+    assert cl.user_session.get("agent_manager") is not None
+    return app
+
+
+async def _ask(user: str, csv_path: str, base_url: str, query: str, cacheable: bool):
+    app = await _open_session(user, csv_path, base_url)
+    try:
+        await app._run_agent_query(query, cacheable=cacheable)
+        return cl.user_session.get("agent_manager")
+    finally:
+        workspace = cl.user_session.get("workspace")
+        if workspace:
+            shutil.rmtree(workspace.chart_dir, ignore_errors=True)
+            shutil.rmtree(workspace.upload_dir, ignore_errors=True)
+        await cl.context.session.delete()
+
+
+def _requests_for(mock, coro) -> int:
+    before = mock.requests
+    asyncio.run(coro)
+    return mock.requests - before
+
+
+def test_free_text_follow_up_is_never_replayed(mock_llm, csv_path):
+    """「是」这类追问依赖对话上下文，不同对话中重复出现也必须调用模型。"""
+    assert _requests_for(mock_llm, _ask("alice", csv_path, mock_llm.base_url, "是", cacheable=False)) == 1
+    assert _requests_for(mock_llm, _ask("alice", csv_path, mock_llm.base_url, "是", cacheable=False)) == 1
+
+
+def test_one_click_prompt_is_replayed_only_for_the_same_user(mock_llm, csv_path):
+    prompt = "一键分析解读：请总结以下统计结果"
+    assert _requests_for(mock_llm, _ask("alice", csv_path, mock_llm.base_url, prompt, cacheable=True)) == 1
+
+    managers = []
+
+    async def replay():
+        managers.append(await _ask("alice", csv_path, mock_llm.base_url, prompt, cacheable=True))
+
+    assert _requests_for(mock_llm, replay()) == 0
+    # 回放的结论写入 Agent 上下文，后续追问可以看到
+    assert prompt in managers[0].agent.additional_context
+
+    assert _requests_for(mock_llm, _ask("bob", csv_path, mock_llm.base_url, prompt, cacheable=True)) == 1
+
+
+def test_concurrent_puts_of_the_same_key_do_not_clobber(tmp_path):
+    cache = QueryCache(cache_dir=str(tmp_path / "cache"), max_bytes=10**9)
+    chart = tmp_path / "chart.plotly.json"
+    chart.write_text("{" + '"x": 1, ' * 20000 + '"y": 2}', encoding="utf-8")
+    result = CachedResult(query="一键分析", answer="结论", artifacts=[str(chart)])
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: cache.put("k", result), range(16)))
+
+    cached = cache.get("k")
+    assert cached.answer == "结论"
+    with open(cached.artifacts[0], encoding="utf-8") as f:
+        assert f.read() == chart.read_text(encoding="utf-8")
+    assert os.listdir(cache.cache_dir) == ["k"]
+
+
+def test_eviction_skips_in_progress_staging_dirs(tmp_path):
+    cache_dir = tmp_path / "cache"
+    staging = cache_dir / f"k.abc{upload_cache.TEMP_SUFFIX}"
+    stale = cache_dir / f"old.abc{upload_cache.TEMP_SUFFIX}"
+    for path in (staging, stale):
+        os.makedirs(path)
+        (path / "data").write_bytes(b"x" * 1000)
+    old = os.path.getmtime(stale) - upload_cache.STALE_TEMP_SECONDS - 1
+    os.utime(stale, (old, old))
+    upload_cache.evict_lru(str(cache_dir), 0, "结果缓存")
+    # 正在写入的暂存目录不计入大小也不被淘汰，中断遗留的暂存目录被清理
+    assert staging.is_dir() and not stale.exists()
@@ -0,0 +1,26 @@
+"""一键分析：直方图在服务端分箱，图表大小与行数无关。"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from charts import decode_array
+from quick_analysis import MAX_HISTOGRAM_BINS, analyze_sheet
+
+
+def test_histograms_are_pre_binned(tmp_path):
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 15, 200_000)
+    values[:10] = np.nan
+    df = pd.DataFrame({"金额": values, "数量": rng.integers(1, 6, 200_000)})
+    report = analyze_sheet("订单", df, str(tmp_path))
+
+    path = next(p for p in report.charts if "金额_分布" in p)
+    assert os.path.getsize(path) < 50_000
+    with open(path, encoding="utf-8") as f:
+        trace = json.load(f)["data"][0]
+    assert trace["type"] == "bar"
+    counts = decode_array(trace["y"])
+    assert len(counts) <= MAX_HISTOGRAM_BINS
+    assert int(np.sum(counts)) == 200_000 - 10
@@ -0,0 +1,129 @@
+"""沙箱执行池：safe_globals 生效、修改回传、重启说明、进程上限与空闲回收。"""
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sandbox
+from agent_setup import AgentManager
+from sandbox import STATE_RESET_NOTE, SandboxPool
+from sandbox_tools import SandboxPythonTools
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(warm_workers=0, max_workers=1, idle_seconds=0)
+    yield pool
+    pool.shutdown()
+
+
+def _tools(pool, **kwargs) -> SandboxPythonTools:
+    frame = pd.DataFrame({"a": [1, 2, 3]})
+    return SandboxPythonTools(
+        pool=pool,
+        safe_globals={"pd": pd, "ANSWER": 42, "__builtins__": __builtins__},
+        safe_locals={"df_sales": frame, "df": frame},
+        **kwargs,
+    )
+
+
+def test_worker_uses_safe_globals(pool):
+    tools = _tools(pool)
+    assert tools.run_python_code("x = ANSWER + len(pd.__name__)", "x") == "48"
+    # 没有放进 safe_globals 的模块不可用
+    assert "NameError" in tools.run_python_code("y = np.zeros(1)")
+
+
+def test_changes_are_synced_back(pool):
+    tools = _tools(pool)
+    seen = []
+    tools.on_frames_changed = seen.append
+    tools.run_python_code("df_sales['b'] = df_sales['a'] * 2")
+    assert list(tools.safe_locals["df_sales"].columns) == ["a", "b"]
+    # 别名与变量指向同一对象，传回后仍是同一对象
+    assert tools.safe_locals["df"] is tools.safe_locals["df_sales"]
+    assert set(seen[0]) == {"df_sales", "df"}
+    # 未修改时不再回传
+    tools.run_python_code("total = int(df_sales['b'].sum())")
+    assert len(seen) == 1
+
+
+def test_change_detection_does_not_hash_frames(monkeypatch):
+    import profiling
+
+    def _no_hash(*args, **kwargs):
+        raise AssertionError("session frames must not be hashed")
+
+    monkeypatch.setattr(profiling, "fingerprint", _no_hash)
+    monkeypatch.setattr(pd.util, "hash_pandas_object", _no_hash)
+    frame = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    scope = {"df_sales": frame, "df": frame}
+    watched = {name: sandbox._frame_state(value) for name, value in scope.items()}
+
+    exec("y = 2\ntotal = int(df_sales['a'].sum())", scope)
+    assert sandbox._changed_frames(scope, watched) == {}
+    for code in (
+        "df_sales.loc[0, 'a'] = 9",
+        "df_sales.rename(columns={'b': 'c'}, inplace=True)",
+        "df_sales.index.name = 'row'",
+        "df_sales = df_sales.head(2)",
+    ):
+        exec(code, scope)
+        assert "df_sales" in sandbox._changed_frames(scope, watched), code
+        assert sandbox._changed_frames(scope, watched) == {}
+
+
+def test_timeout_tells_model_state_was_reset(pool):
+    tools = _tools(pool, timeout=3)
+    tools.run_python_code("helper = 1")
+    result = tools.run_python_code("import time\ntime.sleep(30)")
+    assert "执行超时" in result and STATE_RESET_NOTE in result
+    # 错误信息已说明，下一次执行不再重复
+    assert tools.run_python_code("ok = 1", "ok") == "1"
+
+
+def test_worker_cap_reclaims_least_recently_used(pool):
+    first, second = _tools(pool), _tools(pool)
+    first.run_python_code("df_sales['b'] = 1\nhelper = 1")
+    second.run_python_code("z = 1")
+    assert pool.active == 1
+    result = first.run_python_code("n = len(df_sales.columns)", "n")
+    # 被回收后换用新进程：给出说明，已回传的修改仍在
+    assert result.startswith(STATE_RESET_NOTE) and result.endswith("2")
+    assert "NameError" in first.run_python_code("h = helper")
+
+
+def test_idle_workers_are_reclaimed():
+    pool = SandboxPool(warm_workers=0, max_workers=2, idle_seconds=0.2)
+    try:
+        tools = _tools(pool)
+        tools.run_python_code("x = 1")
+        assert pool.active == 1
+        # 后台线程每秒检查一次，空闲进程在几秒内被回收
+        deadline = time.monotonic() + 5
+        while pool.active and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert pool.active == 0
+        assert tools.run_python_code("x = 2", "x").startswith(STATE_RESET_NOTE)
+    finally:
+        pool.shutdown()
+
+
+def test_agent_manager_sees_sandbox_changes(tmp_path, monkeypatch):
+    pool = SandboxPool(warm_workers=0, max_workers=1, idle_seconds=0)
+    monkeypatch.setattr(sandbox, "sandbox_pool", pool)
+    try:
+        original = pd.DataFrame({"地区": ["华东", "华南"], "销售额": [100.5, 80.25]})
+        manager = AgentManager(
+            "DeepSeek", "sk-test", "deepseek-chat", "", {"sales": original},
+            str(tmp_path / "charts"), str(tmp_path / "uploads"),
+        )
+        manager.python_tools.run_python_code("df_sales['利润'] = df_sales['销售额'] * 0.1")
+        current = manager.current_dataframes()["sales"]
+        assert "利润" in current.columns and "利润" not in original.columns
+        assert "利润" in manager.sql_tools.run_sql('SELECT * FROM "sales"')
+        assert "利润" in str(manager.agent.instructions)
+        assert np.isclose(current["利润"].sum(), 18.075)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,82 @@
+import asyncio
+
+import chainlit as cl
+import pytest
+from chainlit.context import init_http_context
+
+from scheduler import RunCancelled, RunScheduler, SchedulerFull
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_per_session_cap_queues_second_run():
+    async def main():
+        scheduler = RunScheduler(max_concurrent=4, max_per_session=1, max_queued=8, max_queued_per_session=3)
+        first = scheduler.submit("a")
+        second = scheduler.submit("a")
+        other = scheduler.submit("b")
+        assert (first.state, second.state, other.state) == ("running", "queued", "running")
+        assert scheduler.position(second) == 1
+        scheduler.release(first)
+        assert second.state == "running"
+        scheduler.shutdown()
+
+    _run(main())
+
+
+def test_round_robin_between_sessions():
+    async def main():
+        scheduler = RunScheduler(max_concurrent=1, max_per_session=1, max_queued=8, max_queued_per_session=3)
+        running = scheduler.submit("a")
+        a2, a3 = scheduler.submit("a"), scheduler.submit("a")
+        b1 = scheduler.submit("b")
+        # b 的第一个请求排在 a 的第二个请求之后、第三个请求之前
+        assert [scheduler.position(t) for t in (a2, b1, a3)] == [1, 2, 3]
+        scheduler.release(running)
+        assert a2.state == "running"
+        scheduler.release(a2)
+        assert b1.state == "running" and a3.state == "queued"
+        scheduler.shutdown()
+
+    _run(main())
+
+
+def test_queue_limits_and_cancel():
+    async def main():
+        scheduler = RunScheduler(max_concurrent=1, max_per_session=1, max_queued=2, max_queued_per_session=1)
+        scheduler.submit("a")
+        queued = scheduler.submit("b")
+        with pytest.raises(SchedulerFull):
+            scheduler.submit("b")
+        scheduler.submit("c")
+        with pytest.raises(SchedulerFull):
+            scheduler.submit("d")
+
+        queued.cancel()
+        assert queued.state == "done" and scheduler.queued == 1
+        with pytest.raises(RunCancelled):
+            await queued.wait()
+        scheduler.shutdown()
+
+    _run(main())
+
+
+def test_sessions_sharing_a_login_run_concurrently():
+    """共用同一登录账号的两个会话同时提问，两个运行都应立即放行。"""
+    import app
+
+    async def session():
+        init_http_context(user=cl.User(identifier="admin"))
+        return await app._acquire_run_slot(None)
+
+    async def main():
+        tickets = await asyncio.gather(session(), session())
+        assert [t.state for t in tickets] == ["running", "running"]
+        assert app.run_scheduler.active == 2
+        for ticket in tickets:
+            app.run_scheduler.release(ticket)
+        assert app.run_scheduler.active == 0
+
+    _run(main())
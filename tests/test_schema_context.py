@@ -0,0 +1,29 @@
+"""数据上下文：超出 token 预算时逐级压缩，省略的列可通过 SchemaTools 按需查询。"""
+import pandas as pd
+
+from schema_context import TRUNCATED_NOTE, SchemaTools, build_data_context, estimate_tokens
+
+
+def _wide(columns: int) -> pd.DataFrame:
+    return pd.DataFrame({f"指标_{i}": range(3) for i in range(columns)})
+
+
+def test_small_data_gets_detailed_context():
+    context = build_data_context({"Sheet1": _wide(3)}, budget=2000)
+    assert TRUNCATED_NOTE not in context
+    assert "指标_2" in context and "`df_Sheet1`" in context
+
+
+def test_wide_data_is_compressed_within_budget():
+    frames = {f"sheet{i}": _wide(200) for i in range(3)}
+    for budget in (3000, 500, 60):
+        context = build_data_context(frames, budget=budget)
+        assert TRUNCATED_NOTE in context
+        assert estimate_tokens(context) <= budget
+
+
+def test_schema_tools_describe_omitted_columns():
+    tools = SchemaTools({"Sheet1": _wide(200)})
+    assert "指标_199" in tools.describe_columns("Sheet1", ["指标_199"])
+    assert "not found" in tools.describe_columns("Sheet1", ["缺失列"])
+    assert "not found" in tools.describe_columns("Sheet2")
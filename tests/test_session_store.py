@@ -0,0 +1,32 @@
+"""会话存储：对话历史按用户 + 对话持久化到数据库，过期会话被清理。"""
+import time
+
+from agno.db.base import SessionType
+from agno.session.agent import AgentSession
+
+import session_store
+
+
+def test_sessions_persist_per_user_and_thread_and_expire(tmp_path, monkeypatch):
+    url = "sqlite:///" + str(tmp_path / "sessions.db")
+    monkeypatch.setattr(session_store, "_db", session_store._create_db(url))
+    db = session_store.get_session_db()
+    assert session_store.get_session_db() is db
+
+    alice = session_store.session_id_for("alice", "t1")
+    anonymous = session_store.session_id_for(None, "t1")
+    assert alice != anonymous and anonymous.startswith("anonymous:")
+    for session_id, user_id in ((alice, "alice"), (anonymous, None)):
+        db.upsert_session(AgentSession(session_id=session_id, agent_id="data_analyst", user_id=user_id))
+
+    # 新的连接（例如另一个服务实例）能读到同一份会话
+    other = session_store._create_db(url)
+    assert other.get_session(alice, SessionType.AGENT, user_id="alice") is not None
+    assert other.get_session(alice, SessionType.AGENT, user_id="bob") is None
+
+    assert session_store.prune_stale_sessions(max_age_days=1) == 0
+    now = time.time()
+    monkeypatch.setattr(session_store.time, "time", lambda: now + 2 * 86400)
+    assert session_store.prune_stale_sessions(max_age_days=1) == 2
+    assert db.get_session(alice, SessionType.AGENT) is None
+    assert session_store.prune_stale_sessions(max_age_days=0) == 0
@@ -0,0 +1,40 @@
+"""用户设置存储：按用户单条写入，并发用户互不覆盖，首次启动导入旧的 JSON 设置。"""
+import asyncio
+import json
+
+from settings_store import SettingsStore
+
+
+def test_concurrent_users_do_not_overwrite_each_other(tmp_path):
+    path = str(tmp_path / "settings.db")
+    store = SettingsStore(path, legacy_file=str(tmp_path / "missing.json"))
+
+    async def main():
+        await asyncio.gather(*(store.set(f"user{i}", {"Model": f"m{i}"}) for i in range(20)))
+        copy = await store.get("user3")
+        copy["Model"] = "changed"
+        return await store.get("user3")
+
+    assert asyncio.run(main()) == {"Model": "m3"}
+    store.close()
+
+    reopened = SettingsStore(path, legacy_file=str(tmp_path / "missing.json"))
+    loaded = asyncio.run(reopened.get("user7"))
+    assert loaded == {"Model": "m7"}
+    assert asyncio.run(reopened.get("nobody")) == {}
+    reopened.close()
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "user_settings.json"
+    legacy.write_text(json.dumps({"alice": {"Provider": "DeepSeek"}}), encoding="utf-8")
+    path = str(tmp_path / "settings.db")
+    store = SettingsStore(path, legacy_file=str(legacy))
+    assert asyncio.run(store.get("alice")) == {"Provider": "DeepSeek"}
+    asyncio.run(store.set("alice", {"Provider": "OpenAI"}))
+    store.close()
+
+    # 数据库已有数据时不再导入，旧文件不会覆盖新的设置
+    reopened = SettingsStore(path, legacy_file=str(legacy))
+    assert asyncio.run(reopened.get("alice")) == {"Provider": "OpenAI"}
+    reopened.close()
@@ -0,0 +1,24 @@
+"""DataFrame 快照：Agent 对快照的修改不影响原始数据，未修改的列与原始数据共享内存。"""
+import numpy as np
+import pandas as pd
+
+from snapshot import COPY_ON_WRITE, snapshot_dataframes
+
+
+def test_snapshot_isolates_writes():
+    original = pd.DataFrame({"a": np.arange(5), "b": np.arange(5) * 1.5})
+    snapshot = snapshot_dataframes({"s": original})["s"]
+    snapshot["a"] = 0
+    snapshot.loc[0, "b"] = -1
+    assert original["a"].tolist() == [0, 1, 2, 3, 4]
+    assert original.loc[0, "b"] == 0
+
+
+def test_snapshot_shares_untouched_columns():
+    original = pd.DataFrame({"a": np.arange(1000), "b": np.arange(1000.0)})
+    snapshot = snapshot_dataframes({"s": original})["s"]
+    assert snapshot is not original
+    if COPY_ON_WRITE:
+        assert np.shares_memory(snapshot["b"].to_numpy(), original["b"].to_numpy())
+        snapshot["a"] = snapshot["a"] + 1
+        assert np.shares_memory(snapshot["b"].to_numpy(), original["b"].to_numpy())
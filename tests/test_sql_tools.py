@@ -0,0 +1,53 @@
+"""SQL 工具：在会话 DataFrame 上直接执行关联、聚合，结果可另存为新的 DataFrame。"""
+import pandas as pd
+
+from sql_tools import SqlTools
+
+
+def _tools(dataframes, saved):
+    def on_materialize(name, df):
+        dataframes[name] = df
+        saved[name] = df
+        return f"df_{name}"
+
+    return SqlTools(dataframes, {}, on_materialize, preview_rows=3)
+
+
+def test_join_and_save_as_new_dataframe():
+    dataframes = {
+        "订单": pd.DataFrame({"客户": [1, 2, 1, 3], "金额": [10, 20, 30, 40]}),
+        "客户": pd.DataFrame({"客户": [1, 2, 3], "城市": ["北京", "上海", "北京"]}),
+    }
+    saved = {}
+    tools = _tools(dataframes, saved)
+    result = tools.run_sql(
+        'SELECT c.城市, SUM(o.金额) AS 合计 FROM "订单" o JOIN "客户" c USING (客户) GROUP BY 1 ORDER BY 1',
+        save_as="城市汇总",
+    )
+    assert "Saved 2 rows" in result and "`df_城市汇总`" in result
+    assert saved["城市汇总"].set_index("城市")["合计"].to_dict() == {"上海": 20, "北京": 80}
+    # 另存的结果可以在后续查询中使用
+    assert "北京" in tools.run_sql('SELECT * FROM "城市汇总"')
+    assert '"城市汇总"' in tools.list_tables()
+
+
+def test_preview_is_limited_and_replaced_frames_are_reregistered():
+    dataframes = {"数据": pd.DataFrame({"x": range(10)})}
+    tools = _tools(dataframes, {})
+    assert "Showing the first 3 rows" in tools.run_sql('SELECT * FROM "数据"')
+    dataframes["数据"] = pd.DataFrame({"x": [42]})
+    assert tools.run_sql('SELECT * FROM "数据"').startswith("1 rows:")
+    assert tools.run_sql("SELECT * FROM 不存在").startswith("Error running SQL")
+    assert "Invalid name" in tools.run_sql('SELECT 1', save_as="bad name")
+
+
+def test_save_as_does_not_replace_existing_frames_by_default():
+    uploaded = pd.DataFrame({"x": [1, 2, 3]})
+    dataframes = {"数据": uploaded}
+    saved = {}
+    tools = _tools(dataframes, saved)
+    result = tools.run_sql('SELECT SUM(x) AS s FROM "数据"', save_as="数据")
+    assert "already exists" in result
+    assert dataframes["数据"] is uploaded and not saved
+    assert "Saved 1 rows" in tools.run_sql('SELECT SUM(x) AS s FROM "数据"', save_as="数据", overwrite=True)
+    assert list(dataframes["数据"].columns) == ["s"]
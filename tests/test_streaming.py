@@ -0,0 +1,81 @@
+"""流式输出：token 按大小 / 时间合并成帧，事件通道满时阻塞 Agent 线程。"""
+import asyncio
+import threading
+
+from streaming import EventChannel, StreamMetrics, TokenBuffer
+
+
+def test_token_buffer_merges_tokens_into_frames():
+    async def run():
+        frames = []
+
+        async def send(text):
+            frames.append(text)
+
+        metrics = StreamMetrics()
+        buffer = TokenBuffer(send, metrics, flush_interval=60, flush_chars=5)
+        for token in ["你", "好", "，世界", "！"]:
+            await buffer.add(token)
+        assert frames == ["你好，世界"]
+        assert buffer.time_to_flush() is not None
+        await buffer.flush()
+        assert buffer.time_to_flush() is None
+        return frames, metrics
+
+    frames, metrics = asyncio.run(run())
+    assert frames == ["你好，世界", "！"]
+    assert (metrics.frames, metrics.chars) == (2, 6)
+
+
+def test_token_buffer_flushes_after_interval():
+    async def run():
+        frames = []
+
+        async def send(text):
+            frames.append(text)
+
+        buffer = TokenBuffer(send, StreamMetrics(), flush_interval=0, flush_chars=1000)
+        await buffer.add("a")
+        return frames
+
+    assert asyncio.run(run()) == ["a"]
+
+
+def test_event_channel_applies_backpressure_and_releases_on_close():
+    async def run():
+        metrics = StreamMetrics()
+        channel = EventChannel(asyncio.get_running_loop(), metrics, maxsize=2)
+        done = threading.Event()
+
+        def producer():
+            for i in range(5):
+                channel.put(i)
+            done.set()
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+        assert await channel.get(timeout=5) == 0
+        await asyncio.sleep(0.1)
+        # 队列容量为 2，生产者在剩余事件上被阻塞
+        assert not done.is_set()
+        assert metrics.max_queue_depth == 2
+        channel.close()
+        await asyncio.sleep(0.1)
+        await asyncio.to_thread(thread.join, 5)
+        return done.is_set(), metrics.events
+
+    released, events = asyncio.run(run())
+    assert released and events == 1
+
+
+def test_event_channel_put_does_not_wait_for_the_loop():
+    async def run():
+        channel = EventChannel(asyncio.get_running_loop(), StreamMetrics(), maxsize=4)
+        thread = threading.Thread(target=lambda: [channel.put(i) for i in range(3)])
+        thread.start()
+        # 事件循环被占用时，队列未满的 put 也能立即返回
+        thread.join(5)
+        assert not thread.is_alive()
+        return [await channel.get(timeout=5) for _ in range(3)]
+
+    assert asyncio.run(run()) == [0, 1, 2]
@@ -0,0 +1,43 @@
+"""耗时监控：RunTrace 按阶段记录一轮运行，并汇总为 Prometheus 指标。"""
+from types import SimpleNamespace
+
+from telemetry import RunTrace, render_prometheus, timed
+
+
+def _event(name, **fields):
+    return SimpleNamespace(event=name, **fields)
+
+
+def test_run_trace_records_llm_and_tool_stages():
+    trace = RunTrace("TestProvider", "test-model")
+    tool = SimpleNamespace(tool_call_id="c1", tool_name="run_sql", tool_call_error=False)
+    trace.on_event(_event("ModelRequestStarted"))
+    trace.on_event(_event("ModelRequestCompleted", input_tokens=120, output_tokens=30, time_to_first_token=0.2))
+    trace.on_event(_event("ToolCallStarted", tool=tool))
+    trace.on_event(_event("ToolCallCompleted", tool=tool))
+    trace.on_event(_event("RunContent", content="结果"))
+    with trace.span("artifact_scan"):
+        pass
+    trace.add_time("ws_send", 0.01)
+    trace.add_time("ws_send", 0.02)
+    trace.finish()
+
+    names = [s.name for s in trace.spans]
+    assert names.count("llm_request") == 1 and names.count("tool") == 1
+    assert "first_token" in names and "artifact_scan" in names
+    ws = next(s for s in trace.spans if s.name == "ws_send")
+    assert ws.attrs["count"] == 2 and abs(ws.duration - 0.03) < 1e-9
+    assert trace.tokens == {"input": 120, "output": 30}
+    assert "LLM 1 次" in trace.summary() and "工具 1 次" in trace.summary()
+    assert "`run_sql`" in trace.to_markdown()
+
+    metrics = render_prometheus()
+    assert 'llm_tokens_total{provider="TestProvider",model="test-model",kind="input"} 120' in metrics
+    assert 'agent_tool_seconds_count{tool="run_sql",status="ok"}' in metrics
+    assert 'agent_runs_total{status="ok"}' in metrics
+
+
+def test_timed_records_stage_outside_runs():
+    with timed("upload_parse_test"):
+        pass
+    assert 'agent_stage_seconds_count{stage="upload_parse_test"} 1' in render_prometheus()
@@ -0,0 +1,36 @@
+"""工具结果渲染：预览有长度上限，完整结果写入溢出文件。"""
+import pandas as pd
+
+from tool_render import PREVIEW_ROWS, render_value, spill_result
+
+
+def test_long_text_keeps_head_and_tail():
+    text = "头" * 50 + "x" * 1000 + "尾" * 50
+    preview, truncated = render_value(text, limit=300)
+    assert truncated
+    assert preview.startswith("头") and preview.endswith("尾")
+    assert "省略" in preview and len(preview) < 400
+    assert render_value("短文本", limit=300) == ("短文本", False)
+
+
+def test_large_dataframe_previews_head_and_tail_rows():
+    df = pd.DataFrame({"序号": range(10_000)})
+    preview, truncated = render_value(df, limit=2000)
+    assert truncated
+    assert "9999" in preview and "5000" not in preview
+    assert f"仅显示首尾各 {PREVIEW_ROWS} 行" in preview
+
+
+def test_containers_are_not_fully_rendered():
+    preview, _ = render_value(list(range(100_000)), limit=500)
+    assert len(preview) <= 500 and "..." in preview
+
+
+def test_spill_result_writes_full_value(tmp_path):
+    df = pd.DataFrame({"a": range(1000)})
+    path = spill_result(df, str(tmp_path / "spill"), "run_sql")
+    assert path.endswith(".csv")
+    assert len(pd.read_csv(path, encoding="utf-8-sig")) == 1000
+    text_path = spill_result("x" * 10_000, str(tmp_path / "spill"), "run_python_code")
+    with open(text_path, encoding="utf-8") as f:
+        assert len(f.read()) == 10_000
@@ -0,0 +1,83 @@
+"""解析缓存：清单原子写入、同一文件并发上传只写一次、计数线程安全。"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import ingest
+from upload_cache import UploadCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return UploadCache(cache_dir=str(tmp_path / "cache"), max_bytes=1 << 30)
+
+
+def _frame(n: int = 10) -> pd.DataFrame:
+    return pd.DataFrame({"a": range(n), "b": [f"x{i}" for i in range(n)]})
+
+
+def test_failed_manifest_write_keeps_previous_manifest(cache, monkeypatch):
+    assert cache.begin("d1")
+    cache.store_sheet("d1", "", _frame())
+    cache.commit("d1", [""])
+
+    def broken_dump(obj, f, **kwargs):
+        f.write('{"sheets": [')
+        raise OSError("disk full")
+
+    assert cache.begin("d1")
+    monkeypatch.setattr(json, "dump", broken_dump)
+    cache.commit("d1", ["", "other"])
+    monkeypatch.undo()
+    loaded = cache.load("d1")
+    assert loaded is not None and list(loaded) == [""]
+    assert not [name for name in os.listdir(os.path.join(cache.cache_dir, "d1")) if name.endswith(".tmp")]
+
+
+def test_only_one_writer_per_digest(cache):
+    assert cache.begin("d2")
+    assert not cache.begin("d2")
+    cache.discard("d2")
+    assert cache.begin("d2")
+
+
+def test_concurrent_sheet_writes_do_not_collide(cache):
+    def write(n):
+        return cache.store_sheet("d3", "", _frame(n))
+
+    with ThreadPoolExecutor(8) as pool:
+        assert all(pool.map(write, range(100, 900, 100)))
+    cache.commit("d3", [""])
+    loaded = cache.load("d3")
+    assert loaded is not None and len(loaded[""]) in range(100, 900, 100)
+    assert not [name for name in os.listdir(os.path.join(cache.cache_dir, "d3")) if name.endswith(".tmp")]
+
+
+def test_counters_are_thread_safe(cache):
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: cache.load("missing"), range(2000)))
+    assert cache.misses == 2000 and cache.hits == 0
+
+
+def test_concurrent_uploads_of_same_file(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "parse_cache", cache)
+    src = tmp_path / "sales.csv"
+    _frame(50).to_csv(src, index=False)
+
+    async def upload(dest):
+        os.makedirs(dest, exist_ok=True)
+        return [item async for item in ingest.ingest_file(str(src), "sales.csv", dest)]
+
+    async def main():
+        return await asyncio.gather(upload(str(tmp_path / "s1")), upload(str(tmp_path / "s2")))
+
+    first, second = asyncio.run(main())
+    assert len(first[0][1]) == len(second[0][1]) == 50
+    # 两次上传结束后写入权已释放，缓存可以读取
+    third = asyncio.run(upload(str(tmp_path / "s3")))
+    assert third[0][2] is True
+    assert not cache._writing
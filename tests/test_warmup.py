@@ -0,0 +1,42 @@
+"""冷启动：导入应用时不加载重量级依赖，由后台预热提前导入，首次查询耗时只记录一次。"""
+import os
+import subprocess
+import sys
+
+import warmup
+from telemetry import render_prometheus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_app_import_defers_heavy_modules(tmp_path):
+    code = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import app; "
+        "print('loaded:' + ','.join(m for m in sys.argv[2:] if m in sys.modules))"
+    )
+    # 在临时目录中运行，Chainlit 生成的配置和翻译文件不落在仓库里
+    result = subprocess.run(
+        [sys.executable, "-c", code, ROOT, *warmup.PREWARM_MODULES],
+        cwd=tmp_path, capture_output=True, text=True, timeout=120,
+        env=dict(os.environ, PREWARM="0"),
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "loaded:"
+
+
+def test_prewarm_imports_modules_and_skips_missing(monkeypatch, capsys):
+    timer = warmup.StartupTimer()
+    monkeypatch.setattr(warmup, "startup", timer)
+    monkeypatch.setattr(warmup, "PREWARM_MODULES", ("json", "module_that_does_not_exist"))
+    seconds = warmup.prewarm()
+    assert seconds >= 0 and timer.prewarmed
+    assert "预热跳过 module_that_does_not_exist" in capsys.readouterr().out
+    assert 'app_startup_seconds{phase="prewarm"}' in render_prometheus()
+
+
+def test_first_query_is_recorded_once(capsys):
+    timer = warmup.StartupTimer()
+    timer.first_query(1.5)
+    timer.first_query(0.1)
+    assert capsys.readouterr().out.count("首次查询耗时") == 1
+    assert "app_first_query_seconds 1.5" in render_prometheus()
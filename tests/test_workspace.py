@@ -0,0 +1,52 @@
+"""会话目录清理：按活跃标记和存活会话判断，不依赖目录修改时间。"""
+import os
+import time
+
+import workspace as workspace_module
+from workspace import SessionWorkspace, prune_stale_workspaces
+
+
+def _age(path: str, hours: float):
+    stamp = time.time() - hours * 3600
+    os.utime(path, (stamp, stamp))
+
+
+def _make(session_id: str, tmp_path, monkeypatch) -> SessionWorkspace:
+    monkeypatch.setattr(workspace_module, "CHART_DIR_ABS", str(tmp_path / "charts"))
+    monkeypatch.setattr(workspace_module, "UPLOAD_DIR_ABS", str(tmp_path / "uploads"))
+    ws = SessionWorkspace(
+        chart_dir=str(tmp_path / "charts" / session_id),
+        upload_dir=str(tmp_path / "uploads" / session_id),
+    )
+    ws.ensure()
+    return ws
+
+
+def test_live_session_with_old_directories_is_kept(tmp_path, monkeypatch):
+    ws = _make("live", tmp_path, monkeypatch)
+    ws.touch()
+    # 只对话不产生文件：目录修改时间和标记都很旧，但会话仍连接着
+    for path in (ws.chart_dir, ws.upload_dir, os.path.join(ws.upload_dir, workspace_module.ACTIVE_MARKER)):
+        _age(path, 100)
+    prune_stale_workspaces(max_age_hours=24)
+    assert os.path.isdir(ws.chart_dir) and os.path.isdir(ws.upload_dir)
+    ws.release()
+
+
+def test_recent_marker_keeps_disconnected_session(tmp_path, monkeypatch):
+    ws = _make("recent", tmp_path, monkeypatch)
+    ws.touch()
+    ws.release()
+    _age(ws.chart_dir, 100)
+    _age(ws.upload_dir, 100)
+    prune_stale_workspaces(max_age_hours=24)
+    assert os.path.isdir(ws.chart_dir)
+
+
+def test_ended_session_is_pruned_after_ttl(tmp_path, monkeypatch):
+    ws = _make("ended", tmp_path, monkeypatch)
+    ws.touch()
+    ws.release()
+    _age(os.path.join(ws.upload_dir, workspace_module.ACTIVE_MARKER), 100)
+    prune_stale_workspaces(max_age_hours=24)
+    assert not os.path.exists(ws.chart_dir) and not os.path.exists(ws.upload_dir)
@@ -0,0 +1,54 @@
+"""工具结果渲染：以有限开销生成预览，完整结果写入会话目录下的溢出文件。"""
+import os
+import reprlib
+import uuid
+from typing import Any, Tuple
+
+import pandas as pd
+
+from config import TOOL_PREVIEW_CHARS
+
+PREVIEW_ROWS = 5
+
+
+def _clip(text: str, limit: int) -> Tuple[str, bool]:
+    """保留首尾内容，中间省略。"""
+    if len(text) <= limit:
+        return text, False
+    head = limit * 2 // 3
+    tail = limit - head
+    omitted = len(text) - head - tail
+    return f"{text[:head]}\n…（省略 {omitted:,} 个字符）…\n{text[-tail:]}", True
+
+
+def render_value(value: Any, limit: int = TOOL_PREVIEW_CHARS) -> Tuple[str, bool]:
+    """返回 (预览文本, 是否被截断)；不会先把整个对象转成字符串。"""
+    if value is None:
+        return "", False
+    if isinstance(value, str):
+        return _clip(value, limit)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        if len(value) > PREVIEW_ROWS * 2:
+            sample = pd.concat([value.head(PREVIEW_ROWS), value.tail(PREVIEW_ROWS)])
+            text = f"{sample.to_string()}\n[{len(value):,} 行，仅显示首尾各 {PREVIEW_ROWS} 行]"
+            return _clip(text, limit)[0], True
+        return _clip(value.to_string(), limit)
+    r = reprlib.Repr()
+    r.maxstring = limit
+    r.maxother = limit
+    r.maxlist = r.maxdict = r.maxtuple = r.maxset = 20
+    return _clip(r.repr(value), limit)
+
+
+def spill_result(value: Any, spill_dir: str, name: str) -> str:
+    """把完整结果写入溢出文件，返回文件路径。DataFrame 写为 CSV，其余写为文本。"""
+    os.makedirs(spill_dir, exist_ok=True)
+    stem = f"{name}_{uuid.uuid4().hex[:8]}"
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        path = os.path.join(spill_dir, f"{stem}.csv")
+        value.to_csv(path, encoding="utf-8-sig")
+    else:
+        path = os.path.join(spill_dir, f"{stem}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(value if isinstance(value, str) else str(value))
+    return path
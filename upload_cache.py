@@ -0,0 +1,202 @@
+"""上传文件解析缓存：按文件内容哈希 + sheet 名称将解析结果存为 Arrow IPC 文件。
+
+重复上传同一文件时直接以内存映射方式读取缓存，跳过 Excel/CSV 解析；
+缓存总大小超过上限时按最近使用时间（LRU）淘汰整个文件的缓存。
+
+同一文件同时被多个会话上传时，只有先调用 begin() 的一方写入缓存；
+sheet 文件和清单都先写入唯一的临时文件再原子替换，读取方不会看到写了一半的文件。
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from config import PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES
+
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+_MANIFEST = "manifest.json"
+# 写入中的条目目录以此结尾，不参与淘汰；超过 STALE_TEMP_SECONDS 未更新视为中断遗留，予以清理
+TEMP_SUFFIX = ".tmp"
+STALE_TEMP_SECONDS = 3600
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sheet_file(sheet_name: str) -> str:
+    return hashlib.sha1(sheet_name.encode("utf-8")).hexdigest()[:16] + ".arrow"
+
+
+def _temp_path(path: str) -> str:
+    """同目录下唯一的临时文件名，多个写入方互不覆盖。"""
+    return f"{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _dirs, filenames in os.walk(path):
+        for fname in filenames:
+            try:
+                total += os.path.getsize(os.path.join(root, fname))
+            except OSError:
+                pass
+    return total
+
+
+def evict_lru(cache_dir: str, max_bytes: int, label: str):
+    """按目录修改时间淘汰最久未使用的缓存条目（每个条目一个子目录），直到总大小不超过 max_bytes。"""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    now = time.time()
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        try:
+            if not os.path.isdir(entry_dir):
+                continue
+            mtime = os.path.getmtime(entry_dir)
+            if name.endswith(TEMP_SUFFIX):
+                if now - mtime > STALE_TEMP_SECONDS:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            entries.append((mtime, _dir_size(entry_dir), entry_dir))
+        except FileNotFoundError:
+            # 其他写入方刚刚替换或删除了该目录
+            continue
+
+    total = sum(size for _mtime, size, _path in entries)
+    for _mtime, size, entry_dir in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        print(f"[{label}] 淘汰 {os.path.basename(entry_dir)}, 释放 {size / 1024 / 1024:.1f} MB")
+
+
+class UploadCache:
+    def __init__(self, cache_dir: str = PARSE_CACHE_DIR, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = _HAS_PYARROW and max_bytes > 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 正在写入缓存的文件哈希
+        self._writing = set()
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def begin(self, digest: str) -> bool:
+        """申请写入 digest 的缓存；其他上传正在写入同一文件时返回 False，本次不写缓存。"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if digest in self._writing:
+                return False
+            self._writing.add(digest)
+            return True
+
+    def _finish(self, digest: str):
+        with self._lock:
+            self._writing.discard(digest)
+
+    def load(self, digest: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """读取整个文件的缓存，返回 {sheet 名称: DataFrame}；未命中返回 None。"""
+        if not self.enabled:
+            return None
+        entry_dir = os.path.join(self.cache_dir, digest)
+        try:
+            with open(os.path.join(entry_dir, _MANIFEST), "r", encoding="utf-8") as f:
+                sheet_names = json.load(f)["sheets"]
+
+            from pyarrow import feather
+
+            sheets = {}
+            for sheet_name in sheet_names:
+                table = feather.read_table(os.path.join(entry_dir, _sheet_file(sheet_name)), memory_map=True)
+                sheets[sheet_name] = table.to_pandas()
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        except Exception as e:
+            print(f"[解析缓存] 读取缓存失败 {digest}: {e}")
+            self._count(hit=False)
+            return None
+
+        # 更新目录时间戳作为 LRU 依据
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        self._count(hit=True)
+        return sheets
+
+    def store_sheet(self, digest: str, sheet_name: str, df: pd.DataFrame) -> bool:
+        """缓存单个 sheet（需先由 begin() 取得写入权）；无法转换为 Arrow 的数据（如混合类型列）不缓存。"""
+        if not self.enabled:
+            return False
+        entry_dir = os.path.join(self.cache_dir, digest)
+        os.makedirs(entry_dir, exist_ok=True)
+        path = os.path.join(entry_dir, _sheet_file(sheet_name))
+        tmp_path = _temp_path(path)
+        try:
+            from pyarrow import feather
+
+            # 不压缩，以便读取时内存映射
+            feather.write_feather(df, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            print(f"[解析缓存] 跳过缓存 {sheet_name}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def commit(self, digest: str, sheet_names: List[str]):
+        """所有 sheet 写入成功后写入清单使缓存生效，并按 LRU 淘汰超出容量的缓存。"""
+        if not self.enabled:
+            return
+        path = os.path.join(self.cache_dir, digest, _MANIFEST)
+        tmp_path = _temp_path(path)
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"sheets": sheet_names}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # 原有清单（如有）保持完整；条目目录可能已被其他进程淘汰，本次不缓存
+            print(f"[解析缓存] 写入清单失败 {digest}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._finish(digest)
+        self.evict()
+
+    def discard(self, digest: str):
+        """放弃写入：删除未生效的缓存并释放写入权。"""
+        try:
+            shutil.rmtree(os.path.join(self.cache_dir, digest), ignore_errors=True)
+        finally:
+            self._finish(digest)
+
+    def evict(self):
+        evict_lru(self.cache_dir, self.max_bytes, "解析缓存")
+
+
+parse_cache = UploadCache()
@@ -0,0 +1,107 @@
+"""启动预热：agno、OpenAI SDK、plotly.express 等重量级依赖在首次使用时才导入，
+服务开始监听后由后台线程提前导入并完成首次绘图的初始化。
+
+冷启动不再等待这些导入，首次查询也不必承担导入开销；启动各阶段和首次查询的耗时
+记入指标并打印到日志，便于比较开启 / 关闭预热的效果。
+"""
+import importlib
+import socket
+import threading
+import time
+from typing import Optional
+
+from telemetry import registry
+
+# Agent 创建、模型请求、会话存储、SQL 查询和绘图用到的重量级依赖
+PREWARM_MODULES = (
+    "openai",
+    "agno.agent",
+    "agno.models.deepseek",
+    "agno.models.openai.like",
+    "agno.tools.pandas",
+    "agno.tools.python",
+    "sandbox_tools",
+    "agno.tools.reasoning",
+    "agno.compaction.compaction",
+    "agno.db.sqlite",
+    "duckdb",
+    "plotly.express",
+)
+
+STARTUP_SECONDS = registry.gauge("app_startup_seconds", "Startup phase durations", ("phase",))
+FIRST_QUERY_SECONDS = registry.gauge("app_first_query_seconds", "Duration of the first agent run after startup")
+
+
+class StartupTimer:
+    """从应用模块开始导入计时：ready（启动回调）、listening（端口可连接）、prewarm（后台预热用时）。"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.prewarmed = False
+        self._first_query_done = False
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> float:
+        seconds = time.perf_counter() - self.started
+        STARTUP_SECONDS.set(seconds, phase=phase)
+        return seconds
+
+    def first_query(self, seconds: float):
+        """只记录进程内第一次 Agent 运行的耗时。"""
+        with self._lock:
+            if self._first_query_done:
+                return
+            self._first_query_done = True
+        FIRST_QUERY_SECONDS.set(seconds)
+        state = "预热已完成" if self.prewarmed else "预热未完成"
+        print(f"[启动] 首次查询耗时 {seconds:.2f}s（{state}）")
+
+
+startup = StartupTimer()
+
+
+def warm_plotly():
+    """首次构建 plotly.express 图表需要加载模板和属性校验器，提前用一个小图表完成。"""
+    import plotly.express as px
+    import plotly.io as pio
+
+    pio.to_json(px.bar(x=["a"], y=[1]))
+
+
+def _wait_until_listening(host: str, port: int, timeout: float = 30.0) -> bool:
+    if host in ("0.0.0.0", "::", ""):
+        host = "127.0.0.1"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def prewarm(host: Optional[str] = None, port: Optional[int] = None) -> float:
+    """等服务开始监听后依次导入 PREWARM_MODULES 并预热绘图，返回预热用时。"""
+    if port is not None:
+        if _wait_until_listening(host or "127.0.0.1", port):
+            print(f"[启动] 开始监听 {startup.mark('listening'):.2f}s")
+    started = time.perf_counter()
+    for name in PREWARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"[启动] 预热跳过 {name}: {e}")
+    try:
+        warm_plotly()
+    except Exception as e:
+        print(f"[启动] 绘图预热失败: {e}")
+    seconds = time.perf_counter() - started
+    STARTUP_SECONDS.set(seconds, phase="prewarm")
+    startup.prewarmed = True
+    print(f"[启动] 后台预热完成 {seconds:.2f}s")
+    return seconds
+
+
+def start_prewarm(host: Optional[str] = None, port: Optional[int] = None):
+    threading.Thread(target=prewarm, args=(host, port), name="prewarm", daemon=True).start()
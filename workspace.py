@@ -0,0 +1,92 @@
+"""会话工作目录：每个会话独立的图表/导出目录和上传目录。
+
+目录路径显式传给 PythonTools 和 Agent 代码中的 CHART_DIR / UPLOAD_DIR 变量，
+不再修改进程级工作目录，不同会话的 Agent 可以真正并行执行且互不删除文件。
+"""
+import os
+import shutil
+import time
+from dataclasses import dataclass
+
+from config import CHART_DIR_ABS, UPLOAD_DIR_ABS, SESSION_DIR_TTL_HOURS
+
+# 上传目录中的活跃标记，会话每次有操作时更新其修改时间
+ACTIVE_MARKER = ".active"
+
+# 本进程中仍连接着的会话，清理时一律跳过
+_live_sessions = set()
+
+
+@dataclass
+class SessionWorkspace:
+    chart_dir: str
+    upload_dir: str
+
+    @classmethod
+    def for_session(cls, session_id: str) -> "SessionWorkspace":
+        return cls(
+            chart_dir=os.path.join(CHART_DIR_ABS, session_id),
+            upload_dir=os.path.join(UPLOAD_DIR_ABS, session_id),
+        )
+
+    @property
+    def session_id(self) -> str:
+        return os.path.basename(self.chart_dir)
+
+    @property
+    def spill_dir(self) -> str:
+        """过长工具结果的完整内容存放目录（不在 CHART_DIR 中，避免被当作产物推送）。"""
+        return os.path.join(self.upload_dir, "tool_results")
+
+    def ensure(self):
+        for d in (self.chart_dir, self.upload_dir):
+            os.makedirs(d, exist_ok=True)
+
+    def reset(self):
+        for d in (self.chart_dir, self.upload_dir):
+            if os.path.exists(d):
+                shutil.rmtree(d, ignore_errors=True)
+        self.ensure()
+
+    def touch(self):
+        """记录会话活动：登记为存活并更新活跃标记，目录内容不变的长对话也不会被当作过期。"""
+        _live_sessions.add(self.session_id)
+        os.makedirs(self.upload_dir, exist_ok=True)
+        with open(os.path.join(self.upload_dir, ACTIVE_MARKER), "a"):
+            pass
+        os.utime(os.path.join(self.upload_dir, ACTIVE_MARKER))
+
+    def release(self):
+        """会话结束：不再视为存活，目录在过期后由 prune_stale_workspaces 清理。"""
+        _live_sessions.discard(self.session_id)
+
+
+def _last_active(root: str, name: str) -> float:
+    """会话最近一次活动的时间：优先取活跃标记，没有标记的旧目录取目录修改时间。"""
+    try:
+        return os.path.getmtime(os.path.join(UPLOAD_DIR_ABS, name, ACTIVE_MARKER))
+    except OSError:
+        return os.path.getmtime(os.path.join(root, name))
+
+
+def prune_stale_workspaces(max_age_hours: float = SESSION_DIR_TTL_HOURS):
+    """清理长时间没有活动的会话目录（已结束的会话）。
+
+    仍连接着的会话一律跳过；其他会话按活跃标记判断，不依赖目录修改时间
+    （目录的修改时间只在增删文件时更新，长时间只对话的会话也可能很旧）。
+    """
+    cutoff = time.time() - max_age_hours * 3600
+    live = set(_live_sessions)
+    for root in (CHART_DIR_ABS, UPLOAD_DIR_ABS):
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            if name in live:
+                continue
+            path = os.path.join(root, name)
+            try:
+                if os.path.isdir(path) and _last_active(root, name) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+                    print(f"[会话目录] 清理过期目录: {path}")
+            except OSError:
+                pass